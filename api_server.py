@@ -3,7 +3,7 @@ from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import uvicorn
-from rembg import remove
+from rembg.server import InferenceEngine
 from PIL import Image
 import io
 import base64
@@ -17,6 +17,17 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# 推理引擎：启动时预加载并预热模型，推理在线程池中执行，不阻塞事件循环
+engine = InferenceEngine.from_env()
+
+@app.on_event("startup")
+async def startup():
+    await engine.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await engine.stop()
+
 # API Key配置
 API_KEY = os.environ.get("API_KEY", "your-secret-api-key-here")  # 从环境变量获取API Key
 security = HTTPBearer()
@@ -101,7 +112,7 @@ async def remove_background_file(
         image_data = await file.read()
         
         # 使用rembg去除背景
-        output_data = remove(image_data)
+        output_data = await engine.remove(image_data)
         
         # 返回处理后的图片
         return Response(
@@ -152,7 +163,7 @@ async def remove_background_base64(
             raise HTTPException(status_code=400, detail="无效的base64图片数据")
         
         # 使用rembg去除背景
-        output_data = remove(image_data)
+        output_data = await engine.remove(image_data)
         
         # 将结果编码为base64
         result_base64 = base64.b64encode(output_data).decode('utf-8')
@@ -200,7 +211,7 @@ async def remove_background_batch(
             
             # 读取和处理图片
             image_data = await file.read()
-            output_data = remove(image_data)
+            output_data = await engine.remove(image_data)
             result_base64 = base64.b64encode(output_data).decode('utf-8')
             
             results.append({
@@ -3,7 +3,7 @@ from fastapi.responses import Response, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
-from rembg import remove
+from rembg.server import InferenceEngine
 from PIL import Image
 import io
 import base64
@@ -21,6 +21,17 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# 推理引擎：启动时预加载并预热模型，推理在线程池中执行，不阻塞事件循环
+engine = InferenceEngine.from_env()
+
+@app.on_event("startup")
+async def startup():
+    await engine.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await engine.stop()
+
 # 添加CORS中间件 - 允许bolt.new访问
 app.add_middleware(
     CORSMiddleware,
@@ -101,7 +112,7 @@ async def remove_background_for_bolt(file: UploadFile = File(...)):
         logger.info(f"Processing image: {file.filename}, size: {len(contents)} bytes")
         
         # 使用rembg去除背景
-        output_data = remove(contents)
+        output_data = await engine.remove(contents)
         
         logger.info(f"Background removal completed for: {file.filename}")
         
@@ -167,7 +178,7 @@ async def remove_background_base64_for_bolt(request_data: dict):
         logger.info(f"Processing base64 image, size: {len(image_data)} bytes")
         
         # 使用rembg去除背景
-        output_data = remove(image_data)
+        output_data = await engine.remove(image_data)
         
         # 将结果编码为base64
         result_base64 = base64.b64encode(output_data).decode('utf-8')
@@ -1,17 +1,22 @@
 # -*- mode: python ; coding: utf-8 -*-
-from PyInstaller.utils.hooks import collect_data_files
+from PyInstaller.utils.hooks import collect_data_files, collect_submodules
 
 datas = []
 datas += collect_data_files('gradio_client')
 datas += collect_data_files('gradio')
 datas += collect_data_files('onnxruntime')
 
+# The commands and the sessions are imported lazily, by name
+hiddenimports = []
+hiddenimports += collect_submodules('rembg.commands')
+hiddenimports += collect_submodules('rembg.sessions')
+
 a = Analysis(
     ['rembg.py'],
     pathex=[],
     binaries=[],
     datas=datas,
-    hiddenimports=[],
+    hiddenimports=hiddenimports,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,6 +1,14 @@
-from . import _version
+from typing import Any
 
-__version__ = _version.get_versions()["version"]
+from .bg import remove, remove_batch, remove_iter
+from .session_factory import get_session, new_session
 
-from .bg import remove
-from .session_factory import new_session
+
+def __getattr__(name: str) -> Any:
+    # The version is computed on first access, as it may run git
+    if name == "__version__":
+        from . import _version
+
+        return _version.get_versions()["version"]
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,137 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent requests into batches.
+
+    Items submitted under the same key are queued until `max_batch_size` of them are waiting or the oldest has waited `max_wait` seconds. The queued items are then run as one batch in a worker thread and the results are handed back to each awaiting caller.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 8,
+        max_wait: float = 0.01,
+        executor: Optional[Executor] = None,
+    ):
+        """
+        Initialize an instance of the MicroBatcher class.
+
+        Parameters:
+            max_batch_size (int, optional): The maximum number of items per batch. Defaults to 8.
+            max_wait (float, optional): The maximum number of seconds an item waits for a batch to fill up. Defaults to 0.01.
+            executor (Optional[Executor], optional): The executor running the batches. Defaults to the event loop's default executor.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be greater than 0")
+
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor
+        self.pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self.runs: Dict[Hashable, Callable[[List[Any]], List[Any]]] = {}
+        self.timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self.batch_sizes: Counter = Counter()
+
+    async def submit(
+        self, key: Hashable, item: Any, run: Callable[[List[Any]], List[Any]]
+    ) -> Any:
+        """
+        Queue an item and wait for the result of its batch.
+
+        Parameters:
+            key (Hashable): The key of the items that can share a batch with this one.
+            item (Any): The item.
+            run (Callable[[List[Any]], List[Any]]): The function computing the results of a batch of items, in order. The function of the first item queued for a batch runs the batch.
+
+        Returns:
+            Any: The result for the item.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self.pending.setdefault(key, [])
+        batch.append((item, future))
+        self.runs.setdefault(key, run)
+
+        if len(batch) >= self.max_batch_size:
+            self.flush(key)
+        elif key not in self.timers:
+            self.timers[key] = loop.call_later(self.max_wait, self.flush, key)
+
+        return await future
+
+    def flush(self, key: Hashable) -> None:
+        """
+        Start running the items queued under a key, with the function of the first of them.
+
+        Parameters:
+            key (Hashable): The key of the items.
+        """
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self.pending.pop(key, [])
+        run = self.runs.pop(key, None)
+        if len(batch) == 0 or run is None:
+            return
+
+        self.batch_sizes[len(batch)] += 1
+
+        task = asyncio.get_running_loop().create_task(self.run_batch(batch, run))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run_batch(
+        self,
+        batch: List[Tuple[Any, asyncio.Future]],
+        run: Callable[[List[Any]], List[Any]],
+    ) -> None:
+        """
+        Run a batch in the executor and resolve the futures of its items.
+
+        Parameters:
+            batch (List[Tuple[Any, asyncio.Future]]): The items and their futures.
+            run (Callable[[List[Any]], List[Any]]): The function computing the results of the batch.
+        """
+        items = [item for item, _ in batch]
+
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, run, items
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the sizes of the batches run so far.
+
+        Returns:
+            Dict[str, Any]: The number of batches and items, the mean batch size and the number of batches of each size.
+        """
+        batches = sum(self.batch_sizes.values())
+        items = sum(size * count for size, count in self.batch_sizes.items())
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait": self.max_wait,
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "batch_sizes": {
+                str(size): count for size, count in sorted(self.batch_sizes.items())
+            },
+        }
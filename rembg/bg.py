@@ -1,32 +1,58 @@
 import io
+import math
 import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from contextvars import copy_context
 from enum import Enum
-from typing import Any, List, Optional, Tuple, Union, cast
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
 import numpy as np
 import onnxruntime as ort
 from cv2 import (
-    BORDER_DEFAULT,
-    MORPH_ELLIPSE,
-    MORPH_OPEN,
-    GaussianBlur,
+    BORDER_CONSTANT,
+    INTER_AREA,
+    INTER_LINEAR,
+    MORPH_CROSS,
+    MORPH_RECT,
+    blur,
+    boxFilter,
+    dilate,
+    erode,
     getStructuringElement,
-    morphologyEx,
+    resize,
 )
 from PIL import Image, ImageOps
 from PIL.Image import Image as PILImage
-from pymatting.alpha.estimate_alpha_cf import estimate_alpha_cf
-from pymatting.foreground.estimate_foreground_ml import estimate_foreground_ml
-from pymatting.util.util import stack_images
-from scipy.ndimage import binary_erosion
 
-from .session_factory import new_session
+from .postprocessing import kernel, post_process
+from .profiling import Profiler, profile, stage
+from .session_factory import get_session
 from .sessions import sessions, sessions_names
 from .sessions.base import BaseSession
 
 ort.set_default_logger_severity(3)
 
-kernel = getStructuringElement(MORPH_ELLIPSE, (3, 3))
+# Alpha matting solves the unknown pixels of the trimap region by region, each
+# padded by a margin of neighboring pixels. The closed-form solver couples pixels
+# at most 2 pixels apart, the rest of the margin gives context to the foreground
+# estimation, which runs over tiles of the regions.
+matting_tile_size = 512
+matting_margin = 16
 
 
 class ReturnType(Enum):
@@ -41,6 +67,7 @@ def alpha_matting_cutout(
     foreground_threshold: int,
     background_threshold: int,
     erode_structure_size: int,
+    max_megapixels: Optional[float] = None,
 ) -> PILImage:
     """
     Perform alpha matting on an image using a given mask and threshold values.
@@ -50,42 +77,514 @@ def alpha_matting_cutout(
     foreground and background pixels. The `erode_structure_size` parameter specifies
     the size of the erosion structure to be applied to the mask.
 
+    Only the unknown pixels of the trimap are estimated: the alpha is solved over the
+    bounding box of each group of nearby unknown pixels, and the foreground over
+    padded tiles of that box. This approximates solving the whole image, as the
+    pixels further than the margin around a box do not contribute to its solution,
+    and stays within a few levels of the whole image alpha in practice. The known
+    pixels are copied from the image and the trimap.
+
+    If the image is larger than `max_megapixels` millions of pixels, the alpha is
+    solved on a copy of the image downscaled to that size and upsampled with a
+    guided filter against the full resolution image, so that the solving time does
+    not grow with the size of the image.
+
     The function returns a PIL image representing the cutout of the foreground object
     from the original image.
     """
-    if img.mode == "RGBA" or img.mode == "CMYK":
+    # Imported on first use, as importing pymatting compiles its numba functions
+    from pymatting.foreground.estimate_foreground_ml import estimate_foreground_ml
+
+    if img.mode != "RGB":
         img = img.convert("RGB")
 
     img_array = np.asarray(img)
     mask_array = np.asarray(mask)
 
-    is_foreground = mask_array > foreground_threshold
-    is_background = mask_array < background_threshold
+    trimap = matting_trimap(
+        mask_array, foreground_threshold, background_threshold, erode_structure_size
+    )
+    regions, bounds = unknown_regions(trimap)
+
+    height, width = mask_array.shape
+    scale = 1.0
+
+    if max_megapixels is not None:
+        scale = min(math.sqrt(max_megapixels * 1e6 / (height * width)), 1.0)
+
+    if scale < 1.0:
+        size = (max(round(width * scale), 1), max(round(height * scale), 1))
+        small_img_array = resize(img_array, size, interpolation=INTER_AREA)
+        small_trimap = matting_trimap(
+            resize(mask_array, size, interpolation=INTER_AREA),
+            foreground_threshold,
+            background_threshold,
+            (
+                max(round(erode_structure_size * scale), 1)
+                if erode_structure_size > 0
+                else 0
+            ),
+        )
+
+        alpha = guided_upsample(
+            img_array,
+            small_img_array,
+            solve_alpha(small_img_array, small_trimap, *unknown_regions(small_trimap)),
+        )
+        alpha[trimap == 255] = 1.0
+        alpha[trimap == 0] = 0.0
+    else:
+        alpha = solve_alpha(img_array, trimap, regions, bounds)
+
+    cutout = np.empty((height, width, 4), dtype=np.uint8)
+    cutout[..., :3] = img_array
+    cutout[..., 3] = np.clip(alpha * 255, 0, 255)
+
+    is_unknown = trimap == 128
+
+    for index, region_bounds in enumerate(bounds, start=1):
+        if region_bounds is None:
+            continue
+
+        for top in range(
+            region_bounds[0].start, region_bounds[0].stop, matting_tile_size
+        ):
+            for left in range(
+                region_bounds[1].start, region_bounds[1].stop, matting_tile_size
+            ):
+                core = (
+                    slice(top, min(top + matting_tile_size, region_bounds[0].stop)),
+                    slice(left, min(left + matting_tile_size, region_bounds[1].stop)),
+                )
+                tile = pad_slices(core, matting_margin, trimap.shape)
+
+                is_core = np.zeros(trimap[tile].shape, dtype=bool)
+                is_core[
+                    core[0].start - tile[0].start : core[0].stop - tile[0].start,
+                    core[1].start - tile[1].start : core[1].stop - tile[1].start,
+                ] = True
+                is_core &= is_unknown[tile] & (regions[tile] == index)
+
+                if not is_core.any():
+                    continue
+
+                foreground = estimate_foreground_ml(
+                    img_array[tile] / 255.0, alpha[tile]
+                )
+                cutout[tile][is_core, :3] = np.clip(foreground[is_core] * 255, 0, 255)
+
+    return Image.fromarray(cutout)
+
+
+def matting_trimap(
+    mask: np.ndarray,
+    foreground_threshold: int,
+    background_threshold: int,
+    erode_structure_size: int,
+) -> np.ndarray:
+    """
+    Build the trimap of a mask for alpha matting.
+
+    Args:
+        mask (np.ndarray): The mask.
+        foreground_threshold (int): The value above which a pixel of the mask is foreground.
+        background_threshold (int): The value below which a pixel of the mask is background.
+        erode_structure_size (int): The size of the erosion structure applied to the foreground and the background.
+
+    Raises:
+        ValueError: If the trimap has no foreground or no background pixels.
+
+    Returns:
+        np.ndarray: The trimap, with 255 for the foreground, 0 for the background and 128 for the unknown pixels.
+    """
+    structure: np.ndarray
 
-    structure = None
     if erode_structure_size > 0:
         structure = np.ones(
             (erode_structure_size, erode_structure_size), dtype=np.uint8
         )
-
-    is_foreground = binary_erosion(is_foreground, structure=structure)
-    is_background = binary_erosion(is_background, structure=structure, border_value=1)
-
-    trimap = np.full(mask_array.shape, dtype=np.uint8, fill_value=128)
+    else:
+        structure = getStructuringElement(MORPH_CROSS, (3, 3))
+
+    is_foreground = erode(
+        (mask > foreground_threshold).view(np.uint8),
+        structure,
+        borderType=BORDER_CONSTANT,
+        borderValue=0,
+    ).view(bool)
+    is_background = erode(
+        (mask < background_threshold).view(np.uint8),
+        structure,
+        borderType=BORDER_CONSTANT,
+        borderValue=1,
+    ).view(bool)
+
+    if not is_background.any():
+        raise ValueError("Trimap did not contain background values")
+
+    if not is_foreground.any():
+        raise ValueError("Trimap did not contain foreground values")
+
+    trimap = np.full(mask.shape, dtype=np.uint8, fill_value=128)
     trimap[is_foreground] = 255
     trimap[is_background] = 0
 
-    img_normalized = img_array / 255.0
-    trimap_normalized = trimap / 255.0
+    return trimap
 
-    alpha = estimate_alpha_cf(img_normalized, trimap_normalized)
-    foreground = estimate_foreground_ml(img_normalized, alpha)
-    cutout = stack_images(foreground, alpha)
 
-    cutout = np.clip(cutout * 255, 0, 255).astype(np.uint8)
-    cutout = Image.fromarray(cutout)
+def unknown_regions(
+    trimap: np.ndarray,
+) -> Tuple[np.ndarray, List[Optional[Tuple[slice, slice]]]]:
+    """
+    Group the unknown pixels of a trimap into regions.
 
-    return cutout
+    Unknown pixels closer than `matting_margin` end up in the same region, so that regions can be solved independently of each other.
+
+    Args:
+        trimap (np.ndarray): The trimap.
+
+    Returns:
+        Tuple[np.ndarray, List[Optional[Tuple[slice, slice]]]]: The region index of each unknown pixel, 0 elsewhere, and the bounding box of each region.
+    """
+    from scipy.ndimage import find_objects, label
+
+    is_unknown = trimap == 128
+
+    regions, _ = label(
+        dilate(
+            is_unknown.view(np.uint8),
+            getStructuringElement(
+                MORPH_RECT, (2 * matting_margin + 1, 2 * matting_margin + 1)
+            ),
+        )
+    )
+    regions[~is_unknown] = 0
+
+    return regions, find_objects(regions)
+
+
+def solve_alpha(
+    img_array: np.ndarray,
+    trimap: np.ndarray,
+    regions: np.ndarray,
+    bounds: List[Optional[Tuple[slice, slice]]],
+) -> np.ndarray:
+    """
+    Estimate the alpha of the unknown pixels of a trimap with closed-form matting.
+
+    Args:
+        img_array (np.ndarray): The image.
+        trimap (np.ndarray): The trimap.
+        regions (np.ndarray): The regions of the unknown pixels, as returned by `unknown_regions`.
+        bounds (List[Optional[Tuple[slice, slice]]]): The bounding boxes of the regions, as returned by `unknown_regions`.
+
+    Returns:
+        np.ndarray: The alpha, between 0 and 1.
+    """
+    from pymatting.alpha.estimate_alpha_cf import estimate_alpha_cf
+
+    is_foreground = trimap == 255
+    is_unknown = trimap == 128
+    alpha = trimap / 255.0
+
+    for index, region_bounds in enumerate(bounds, start=1):
+        if region_bounds is None:
+            continue
+
+        box = pad_slices(region_bounds, matting_margin, trimap.shape)
+        is_region = regions[box] == index
+
+        trimap_normalized = trimap[box] / 255.0
+        trimap_normalized[is_unknown[box] & ~is_region] = 0
+
+        try:
+            region_alpha = estimate_alpha_cf(img_array[box] / 255.0, trimap_normalized)
+        except ValueError:
+            # Only one kind of known pixels around the region, which
+            # the closed-form solution fills with that value.
+            region_alpha = trimap_normalized
+            region_alpha[is_region] = 1.0 if is_foreground[box].any() else 0.0
+
+        alpha[box][is_region] = region_alpha[is_region]
+
+    return alpha
+
+
+def guided_upsample(
+    guide: np.ndarray,
+    small_guide: np.ndarray,
+    small_src: np.ndarray,
+    radius: int = 2,
+    eps: float = 1e-4,
+) -> np.ndarray:
+    """
+    Upsample an image with a guided filter, so that its edges follow the ones of a guide image.
+
+    The linear coefficients of the color guided filter are computed at low resolution, upsampled and applied to the full resolution guide, as in the fast guided filter (He and Sun, 2015).
+
+    Args:
+        guide (np.ndarray): The full resolution RGB guide image.
+        small_guide (np.ndarray): The guide image, at the resolution of `small_src`.
+        small_src (np.ndarray): The single channel image to upsample, with values between 0 and 1.
+        radius (int, optional): The radius of the filter at low resolution. Defaults to 2.
+        eps (float, optional): The regularization of the filter, lower values follow the guide edges more closely. Defaults to 1e-4.
+
+    Returns:
+        np.ndarray: The upsampled image, at the resolution of `guide`, with values between 0 and 1.
+    """
+    ksize = (2 * radius + 1, 2 * radius + 1)
+
+    i = small_guide.astype(np.float32) / 255
+    p = small_src.astype(np.float32)
+
+    mean_i = boxFilter(i, -1, ksize)
+    mean_p = boxFilter(p, -1, ksize)
+    cov_ip = boxFilter(i * p[..., None], -1, ksize) - mean_i * mean_p[..., None]
+
+    var_i = np.empty((*p.shape, 3, 3), dtype=np.float32)
+    for c1 in range(3):
+        for c2 in range(c1, 3):
+            var_i[..., c1, c2] = var_i[..., c2, c1] = (
+                boxFilter(i[..., c1] * i[..., c2], -1, ksize)
+                - mean_i[..., c1] * mean_i[..., c2]
+            )
+    var_i += eps * np.eye(3, dtype=np.float32)
+
+    a = np.linalg.solve(var_i, cov_ip[..., None])[..., 0]
+    b = mean_p - (a * mean_i).sum(axis=-1)
+
+    height, width = guide.shape[:2]
+    mean_a = resize(
+        boxFilter(a, -1, ksize), (width, height), interpolation=INTER_LINEAR
+    )
+    mean_b = resize(
+        boxFilter(b, -1, ksize), (width, height), interpolation=INTER_LINEAR
+    )
+
+    return np.clip(
+        (mean_a * (guide.astype(np.float32) / 255)).sum(axis=-1) + mean_b, 0, 1
+    )
+
+
+def pad_slices(
+    slices: Tuple[slice, slice], padding: int, shape: Tuple[int, ...]
+) -> Tuple[slice, slice]:
+    """
+    Grow a rectangle of an image by the same number of pixels on each side.
+
+    Args:
+        slices (Tuple[slice, slice]): The rows and columns of the rectangle.
+        padding (int): The number of pixels to grow the rectangle by.
+        shape (Tuple[int, ...]): The shape of the image, which bounds the grown rectangle.
+
+    Returns:
+        Tuple[slice, slice]: The rows and columns of the grown rectangle.
+    """
+    return (
+        slice(
+            max(slices[0].start - padding, 0), min(slices[0].stop + padding, shape[0])
+        ),
+        slice(
+            max(slices[1].start - padding, 0), min(slices[1].stop + padding, shape[1])
+        ),
+    )
+
+
+def estimate_foreground_blur(
+    img_array: np.ndarray, alpha: np.ndarray, radii: Tuple[int, ...] = (90, 6)
+) -> np.ndarray:
+    """
+    Estimate the foreground colors of an image from its alpha with blur fusion.
+
+    This is the approximate fast foreground colour estimation of Forte and Pitié (2021), which only needs box filters.
+
+    Args:
+        img_array (np.ndarray): The RGB image.
+        alpha (np.ndarray): The alpha, with values between 0 and 1.
+        radii (Tuple[int, ...], optional): The sizes of the box filters of each iteration. Defaults to (90, 6).
+
+    Returns:
+        np.ndarray: The foreground colors, with values between 0 and 1.
+    """
+    image = img_array.astype(np.float32) / 255
+    alpha = alpha.astype(np.float32)
+    alpha3 = alpha[..., None]
+
+    foreground = background = image
+
+    for radius in radii:
+        blurred_alpha = blur(alpha, (radius, radius))[..., None]
+        blurred_foreground = blur(foreground * alpha3, (radius, radius)) / (
+            blurred_alpha + 1e-5
+        )
+        background = blur(background * (1 - alpha3), (radius, radius)) / (
+            1 - blurred_alpha + 1e-5
+        )
+        foreground = np.clip(
+            blurred_foreground
+            + alpha3
+            * (image - alpha3 * blurred_foreground - (1 - alpha3) * background),
+            0,
+            1,
+        )
+
+    return foreground
+
+
+class MattingEngine:
+    """
+    This is a base class for the alpha matting engines.
+
+    An engine refines a mask predicted for an image into the alpha of the image and estimates the colors of its foreground. Engines are registered in `matting_engines` under their name, which is the value of the `alpha_matting_method` argument of `remove` selecting them.
+    """
+
+    def cutout(
+        self,
+        img: PILImage,
+        mask: PILImage,
+        foreground_threshold: int,
+        background_threshold: int,
+        erode_structure_size: int,
+        max_megapixels: Optional[float] = None,
+    ) -> PILImage:
+        """
+        Cut out the foreground of an image.
+
+        Args:
+            img (PILImage): The image.
+            mask (PILImage): The mask predicted for the image.
+            foreground_threshold (int): The value above which a pixel of the mask is foreground.
+            background_threshold (int): The value below which a pixel of the mask is background.
+            erode_structure_size (int): The size of the erosion structure applied to the foreground and the background.
+            max_megapixels (Optional[float], optional): The size in millions of pixels above which the alpha is estimated at a reduced resolution. Defaults to None.
+
+        Raises:
+            ValueError: If the mask has no foreground or no background pixels.
+
+        Returns:
+            PILImage: The RGBA cutout.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def name(cls) -> str:
+        raise NotImplementedError
+
+
+class ClosedFormMatting(MattingEngine):
+    """
+    Closed-form alpha matting (Levin et al., 2008) with a machine learning foreground estimation, solved by pymatting.
+
+    The most accurate engine, and by far the slowest, see `alpha_matting_cutout`.
+    """
+
+    def cutout(
+        self,
+        img: PILImage,
+        mask: PILImage,
+        foreground_threshold: int,
+        background_threshold: int,
+        erode_structure_size: int,
+        max_megapixels: Optional[float] = None,
+    ) -> PILImage:
+        return alpha_matting_cutout(
+            img,
+            mask,
+            foreground_threshold,
+            background_threshold,
+            erode_structure_size,
+            max_megapixels,
+        )
+
+    @classmethod
+    def name(cls) -> str:
+        return "cf"
+
+
+class GuidedFilterMatting(MattingEngine):
+    """
+    Alpha matting by refining the mask with a color guided filter, and blur fusion foreground estimation.
+
+    Both run in linear time with box filters: the filter is computed on the image downscaled to `megapixels` millions of pixels, so that its radius follows the resolution of the masks predicted by the models, and upsampled, which adds little to the time spent in inference.
+    """
+
+    def __init__(self, megapixels: float = 0.1, radius: int = 8, eps: float = 1e-4):
+        """
+        Initialize an instance of the GuidedFilterMatting class.
+
+        Args:
+            megapixels (float, optional): The size in millions of pixels the guided filter is computed at. Defaults to 0.1.
+            radius (int, optional): The radius of the guided filter at that size. Defaults to 8.
+            eps (float, optional): The regularization of the guided filter. Defaults to 1e-4.
+        """
+        self.megapixels = megapixels
+        self.radius = radius
+        self.eps = eps
+
+    def cutout(
+        self,
+        img: PILImage,
+        mask: PILImage,
+        foreground_threshold: int,
+        background_threshold: int,
+        erode_structure_size: int,
+        max_megapixels: Optional[float] = None,
+    ) -> PILImage:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+        img_array = np.asarray(img)
+        mask_array = np.asarray(mask)
+
+        trimap = matting_trimap(
+            mask_array,
+            foreground_threshold,
+            background_threshold,
+            erode_structure_size,
+        )
+
+        height, width = mask_array.shape
+        megapixels = self.megapixels
+
+        if max_megapixels is not None:
+            megapixels = min(megapixels, max_megapixels)
+
+        scale = min(math.sqrt(megapixels * 1e6 / (height * width)), 1.0)
+
+        if scale < 1.0:
+            size = (max(round(width * scale), 1), max(round(height * scale), 1))
+            small_img_array = resize(img_array, size, interpolation=INTER_AREA)
+            small_mask_array = resize(mask_array, size, interpolation=INTER_AREA)
+        else:
+            small_img_array = img_array
+            small_mask_array = mask_array
+
+        alpha = guided_upsample(
+            img_array,
+            small_img_array,
+            small_mask_array.astype(np.float32) / 255,
+            self.radius,
+            self.eps,
+        )
+        alpha[trimap == 255] = 1.0
+        alpha[trimap == 0] = 0.0
+
+        cutout = np.empty((height, width, 4), dtype=np.uint8)
+        cutout[..., :3] = np.clip(
+            estimate_foreground_blur(img_array, alpha) * 255, 0, 255
+        )
+        cutout[..., 3] = np.clip(alpha * 255, 0, 255)
+
+        return Image.fromarray(cutout)
+
+    @classmethod
+    def name(cls) -> str:
+        return "guided"
+
+
+matting_engines: Dict[str, MattingEngine] = {
+    engine.name(): engine for engine in (ClosedFormMatting(), GuidedFilterMatting())
+}
 
 
 def naive_cutout(img: PILImage, mask: PILImage) -> PILImage:
@@ -152,19 +651,6 @@ def get_concat_v(img1: PILImage, img2: PILImage) -> PILImage:
     return dst
 
 
-def post_process(mask: np.ndarray) -> np.ndarray:
-    """
-    Post Process the mask for a smooth boundary by applying Morphological Operations
-    Research based on paper: https://www.sciencedirect.com/science/article/pii/S2352914821000757
-    args:
-        mask: Binary Numpy Mask
-    """
-    mask = morphologyEx(mask, MORPH_OPEN, kernel)
-    mask = GaussianBlur(mask, (5, 5), sigmaX=2, sigmaY=2, borderType=BORDER_DEFAULT)
-    mask = np.where(mask < 127, 0, 255).astype(np.uint8)  # type: ignore
-    return mask
-
-
 def apply_background_color(img: PILImage, color: Tuple[int, int, int, int]) -> PILImage:
     """
     Apply the specified background color to the image.
@@ -195,125 +681,170 @@ def fix_image_orientation(img: PILImage) -> PILImage:
     return cast(PILImage, ImageOps.exif_transpose(img))
 
 
-def download_models(models: tuple[str, ...]) -> None:
+def download_models(
+    models: tuple[str, ...], verify: bool = False, workers: int = 4
+) -> None:
     """
     Download models for image processing.
+
+    Up to `workers` models are downloaded at once, and interrupted downloads are resumed. Models are only hashed once after they are downloaded. With `verify`, the models already downloaded are hashed again, and downloaded again if they do not match.
     """
     if len(models) == 0:
         print("No models specified, downloading all models")
         models = tuple(sessions_names)
 
     for model in models:
-        session = sessions.get(model)
-        if session is None:
+        if model not in sessions:
             print(f"Error: no model found: {model}")
             sys.exit(1)
+
+    def download(model: str) -> None:
+        print(f"Downloading model: {model}")
+        try:
+            sessions[model].download_models(verify=verify)
+        except Exception as e:
+            print(f"Error downloading model {model}: {e}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(download, models))
+
+
+def load_image(
+    data: Union[bytes, PILImage, np.ndarray], force_return_bytes: bool = False
+) -> Tuple[PILImage, ReturnType]:
+    """
+    Load the input data as a PIL image with its orientation fixed.
+
+    Parameters:
+        data (Union[bytes, PILImage, np.ndarray]): The input image data.
+        force_return_bytes (bool, optional): Flag indicating whether the result should be returned as bytes. Defaults to False.
+
+    Raises:
+        ValueError: If the type of the input data is not supported.
+
+    Returns:
+        Tuple[PILImage, ReturnType]: The loaded image and the type the result should be returned as.
+    """
+    with stage("decode"):
+        if isinstance(data, bytes) or force_return_bytes:
+            return_type = ReturnType.BYTES
+            img = cast(PILImage, Image.open(io.BytesIO(cast(bytes, data))))
+            # Pillow decodes lazily, load now so that decoding is not
+            # accounted to the stages that first touch the pixels.
+            img.load()
+        elif isinstance(data, PILImage):
+            return_type = ReturnType.PILLOW
+            img = cast(PILImage, data)
+        elif isinstance(data, np.ndarray):
+            return_type = ReturnType.NDARRAY
+            img = cast(PILImage, Image.fromarray(data))
         else:
-            print(f"Downloading model: {model}")
-            try:
-                session.download_models()
-            except Exception as e:
-                print(f"Error downloading model: {e}")
+            raise ValueError(
+                "Input type {} is not supported. Try using force_return_bytes=True to force python bytes output".format(
+                    type(data)
+                )
+            )
 
+    # Fix image orientation
+    with stage("orientation"):
+        img = fix_image_orientation(img)
 
-def remove(
-    data: Union[bytes, PILImage, np.ndarray],
+    return img, return_type
+
+
+def apply_masks(
+    img: PILImage,
+    masks: List[PILImage],
+    return_type: ReturnType,
     alpha_matting: bool = False,
     alpha_matting_foreground_threshold: int = 240,
     alpha_matting_background_threshold: int = 10,
     alpha_matting_erode_size: int = 10,
-    session: Optional[BaseSession] = None,
     only_mask: bool = False,
     post_process_mask: bool = False,
     bgcolor: Optional[Tuple[int, int, int, int]] = None,
-    force_return_bytes: bool = False,
-    *args: Optional[Any],
-    **kwargs: Optional[Any],
+    putalpha: bool = False,
+    alpha_matting_max_megapixels: Optional[float] = None,
+    alpha_matting_method: str = "cf",
 ) -> Union[bytes, PILImage, np.ndarray]:
     """
-    Remove the background from an input image.
-
-    This function takes in various parameters and returns a modified version of the input image with the background removed. The function can handle input data in the form of bytes, a PIL image, or a numpy array. The function first checks the type of the input data and converts it to a PIL image if necessary. It then fixes the orientation of the image and proceeds to perform background removal using the 'u2net' model. The result is a list of binary masks representing the foreground objects in the image. These masks are post-processed and combined to create a final cutout image. If a background color is provided, it is applied to the cutout image. The function returns the resulting cutout image in the format specified by the input 'return_type' parameter or as python bytes if force_return_bytes is true.
+    Cut out an image with the masks predicted for it and encode the result.
 
     Parameters:
-        data (Union[bytes, PILImage, np.ndarray]): The input image data.
+        img (PILImage): The input image.
+        masks (List[PILImage]): The masks predicted for the image.
+        return_type (ReturnType): The type the result should be returned as.
         alpha_matting (bool, optional): Flag indicating whether to use alpha matting. Defaults to False.
         alpha_matting_foreground_threshold (int, optional): Foreground threshold for alpha matting. Defaults to 240.
         alpha_matting_background_threshold (int, optional): Background threshold for alpha matting. Defaults to 10.
         alpha_matting_erode_size (int, optional): Erosion size for alpha matting. Defaults to 10.
-        session (Optional[BaseSession], optional): A session object for the 'u2net' model. Defaults to None.
         only_mask (bool, optional): Flag indicating whether to return only the binary masks. Defaults to False.
         post_process_mask (bool, optional): Flag indicating whether to post-process the masks. Defaults to False.
         bgcolor (Optional[Tuple[int, int, int, int]], optional): Background color for the cutout image. Defaults to None.
-        force_return_bytes (bool, optional): Flag indicating whether to return the cutout image as bytes. Defaults to False.
-        *args (Optional[Any]): Additional positional arguments.
-        **kwargs (Optional[Any]): Additional keyword arguments.
+        putalpha (bool, optional): Flag indicating whether to apply the masks as the alpha channel of the image. Defaults to False.
+        alpha_matting_max_megapixels (Optional[float], optional): The size in millions of pixels above which alpha matting is solved at a reduced resolution. Defaults to None.
+        alpha_matting_method (str, optional): The name of the alpha matting engine, see `matting_engines`. Defaults to "cf".
+
+    Raises:
+        ValueError: If no alpha matting engine is named `alpha_matting_method`.
 
     Returns:
         Union[bytes, PILImage, np.ndarray]: The cutout image with the background removed.
     """
-    if isinstance(data, bytes) or force_return_bytes:
-        return_type = ReturnType.BYTES
-        img = cast(PILImage, Image.open(io.BytesIO(cast(bytes, data))))
-    elif isinstance(data, PILImage):
-        return_type = ReturnType.PILLOW
-        img = cast(PILImage, data)
-    elif isinstance(data, np.ndarray):
-        return_type = ReturnType.NDARRAY
-        img = cast(PILImage, Image.fromarray(data))
-    else:
-        raise ValueError(
-            "Input type {} is not supported. Try using force_return_bytes=True to force python bytes output".format(
-                type(data)
-            )
-        )
+    matting = None
 
-    putalpha = kwargs.pop("putalpha", False)
+    if alpha_matting:
+        matting = matting_engines.get(alpha_matting_method)
 
-    # Fix image orientation
-    img = fix_image_orientation(img)
-
-    if session is None:
-        session = new_session("u2net", *args, **kwargs)
+        if matting is None:
+            raise ValueError(
+                f"No matting engine found for method '{alpha_matting_method}'"
+            )
 
-    masks = session.predict(img, *args, **kwargs)
     cutouts = []
 
     for mask in masks:
-        if post_process_mask:
-            mask = Image.fromarray(post_process(np.array(mask)))
+        if post_process_mask and not mask.info.get("post_processed", False):
+            with stage("post_process"):
+                mask = Image.fromarray(post_process(np.array(mask)))
 
         if only_mask:
             cutout = mask
 
-        elif alpha_matting:
+        elif matting is not None:
             try:
-                cutout = alpha_matting_cutout(
-                    img,
-                    mask,
-                    alpha_matting_foreground_threshold,
-                    alpha_matting_background_threshold,
-                    alpha_matting_erode_size,
-                )
+                with stage("alpha_matting"):
+                    cutout = matting.cutout(
+                        img,
+                        mask,
+                        alpha_matting_foreground_threshold,
+                        alpha_matting_background_threshold,
+                        alpha_matting_erode_size,
+                        alpha_matting_max_megapixels,
+                    )
             except ValueError:
+                with stage("cutout"):
+                    if putalpha:
+                        cutout = putalpha_cutout(img, mask)
+                    else:
+                        cutout = naive_cutout(img, mask)
+        else:
+            with stage("cutout"):
                 if putalpha:
                     cutout = putalpha_cutout(img, mask)
                 else:
                     cutout = naive_cutout(img, mask)
-        else:
-            if putalpha:
-                cutout = putalpha_cutout(img, mask)
-            else:
-                cutout = naive_cutout(img, mask)
 
         cutouts.append(cutout)
 
     cutout = img
     if len(cutouts) > 0:
-        cutout = get_concat_v_multi(cutouts)
+        with stage("concat"):
+            cutout = get_concat_v_multi(cutouts)
 
     if bgcolor is not None and not only_mask:
-        cutout = apply_background_color(cutout, bgcolor)
+        with stage("background_color"):
+            cutout = apply_background_color(cutout, bgcolor)
 
     if ReturnType.PILLOW == return_type:
         return cutout
@@ -321,8 +852,321 @@ def remove(
     if ReturnType.NDARRAY == return_type:
         return np.asarray(cutout)
 
-    bio = io.BytesIO()
-    cutout.save(bio, "PNG")
-    bio.seek(0)
+    with stage("encode"):
+        bio = io.BytesIO()
+        cutout.save(bio, "PNG")
+        bio.seek(0)
+
+        return bio.read()
+
+
+def remove(
+    data: Union[bytes, PILImage, np.ndarray],
+    alpha_matting: bool = False,
+    alpha_matting_foreground_threshold: int = 240,
+    alpha_matting_background_threshold: int = 10,
+    alpha_matting_erode_size: int = 10,
+    session: Optional[BaseSession] = None,
+    only_mask: bool = False,
+    post_process_mask: bool = False,
+    bgcolor: Optional[Tuple[int, int, int, int]] = None,
+    force_return_bytes: bool = False,
+    profiler: Optional[Profiler] = None,
+    on_stage: Optional[Callable[[Dict[str, Any]], None]] = None,
+    alpha_matting_max_megapixels: Optional[float] = None,
+    alpha_matting_method: str = "cf",
+    *args: Optional[Any],
+    **kwargs: Optional[Any],
+) -> Union[bytes, PILImage, np.ndarray]:
+    """
+    Remove the background from an input image.
+
+    This function takes in various parameters and returns a modified version of the input image with the background removed. The function can handle input data in the form of bytes, a PIL image, or a numpy array. The function first checks the type of the input data and converts it to a PIL image if necessary. It then fixes the orientation of the image and proceeds to perform background removal using the 'u2net' model. The result is a list of binary masks representing the foreground objects in the image. These masks are post-processed and combined to create a final cutout image. If a background color is provided, it is applied to the cutout image. The function returns the resulting cutout image in the format specified by the input 'return_type' parameter or as python bytes if force_return_bytes is true.
+
+    Parameters:
+        data (Union[bytes, PILImage, np.ndarray]): The input image data.
+        alpha_matting (bool, optional): Flag indicating whether to use alpha matting. Defaults to False.
+        alpha_matting_foreground_threshold (int, optional): Foreground threshold for alpha matting. Defaults to 240.
+        alpha_matting_background_threshold (int, optional): Background threshold for alpha matting. Defaults to 10.
+        alpha_matting_erode_size (int, optional): Erosion size for alpha matting. Defaults to 10.
+        session (Optional[BaseSession], optional): The session to use. Defaults to the cached session of the 'u2net' model.
+        only_mask (bool, optional): Flag indicating whether to return only the binary masks. Defaults to False.
+        post_process_mask (bool, optional): Flag indicating whether to post-process the masks. Defaults to False.
+        bgcolor (Optional[Tuple[int, int, int, int]], optional): Background color for the cutout image. Defaults to None.
+        force_return_bytes (bool, optional): Flag indicating whether to return the cutout image as bytes. Defaults to False.
+        profiler (Optional[Profiler], optional): A profiler recording the time spent in each stage of the removal. Defaults to the active profiler, if any.
+        on_stage (Optional[Callable[[Dict[str, Any]], None]], optional): A function called with the record of each stage of the removal, when no profiler is given. Defaults to None.
+        alpha_matting_max_megapixels (Optional[float], optional): The size in millions of pixels above which alpha matting is solved on a downscaled image, whose alpha is then upsampled with a guided filter. Defaults to None, always solving at full resolution.
+        alpha_matting_method (str, optional): The name of the alpha matting engine: "cf" for closed-form matting, or "guided" for a much faster guided filter refinement of the mask, see `matting_engines`. Defaults to "cf".
+        *args (Optional[Any]): Additional positional arguments.
+        **kwargs (Optional[Any]): Additional keyword arguments.
+
+    Returns:
+        Union[bytes, PILImage, np.ndarray]: The cutout image with the background removed.
+    """
+    if profiler is None and on_stage is not None:
+        profiler = Profiler(on_stage=on_stage)
+
+    with profile(profiler) if profiler is not None else nullcontext():
+        img, return_type = load_image(data, force_return_bytes)
+        putalpha = cast(bool, kwargs.pop("putalpha", False))
+
+        if session is None:
+            session = get_session("u2net", *args, **kwargs)
+
+        masks = session.predict(
+            img, *args, post_process_mask=post_process_mask, **kwargs
+        )
 
-    return bio.read()
+        return apply_masks(
+            img,
+            masks,
+            return_type,
+            alpha_matting,
+            alpha_matting_foreground_threshold,
+            alpha_matting_background_threshold,
+            alpha_matting_erode_size,
+            only_mask,
+            post_process_mask,
+            bgcolor,
+            putalpha,
+            alpha_matting_max_megapixels,
+            alpha_matting_method,
+        )
+
+
+def remove_batch(
+    data: List[Union[bytes, PILImage, np.ndarray]],
+    alpha_matting: bool = False,
+    alpha_matting_foreground_threshold: int = 240,
+    alpha_matting_background_threshold: int = 10,
+    alpha_matting_erode_size: int = 10,
+    session: Optional[BaseSession] = None,
+    only_mask: bool = False,
+    post_process_mask: bool = False,
+    bgcolor: Optional[Tuple[int, int, int, int]] = None,
+    force_return_bytes: bool = False,
+    batch_size: int = 8,
+    profiler: Optional[Profiler] = None,
+    on_stage: Optional[Callable[[Dict[str, Any]], None]] = None,
+    alpha_matting_max_megapixels: Optional[float] = None,
+    alpha_matting_method: str = "cf",
+    *args: Optional[Any],
+    **kwargs: Optional[Any],
+) -> List[Union[bytes, PILImage, np.ndarray]]:
+    """
+    Remove the background from a list of input images.
+
+    This function works like `remove`, but predicts the masks of up to `batch_size` images with a single inference. Every model resizes its input to a fixed size, so images of any original size can share a batch. Models whose batch axis is fixed fall back to one inference per image.
+
+    Parameters:
+        data (List[Union[bytes, PILImage, np.ndarray]]): The input images data.
+        alpha_matting (bool, optional): Flag indicating whether to use alpha matting. Defaults to False.
+        alpha_matting_foreground_threshold (int, optional): Foreground threshold for alpha matting. Defaults to 240.
+        alpha_matting_background_threshold (int, optional): Background threshold for alpha matting. Defaults to 10.
+        alpha_matting_erode_size (int, optional): Erosion size for alpha matting. Defaults to 10.
+        session (Optional[BaseSession], optional): The session to use. Defaults to the cached session of the 'u2net' model.
+        only_mask (bool, optional): Flag indicating whether to return only the binary masks. Defaults to False.
+        post_process_mask (bool, optional): Flag indicating whether to post-process the masks. Defaults to False.
+        bgcolor (Optional[Tuple[int, int, int, int]], optional): Background color for the cutout images. Defaults to None.
+        force_return_bytes (bool, optional): Flag indicating whether to return the cutout images as bytes. Defaults to False.
+        batch_size (int, optional): The maximum number of images per inference. Defaults to 8.
+        profiler (Optional[Profiler], optional): A profiler recording the time spent in each stage of the removal. Defaults to the active profiler, if any.
+        on_stage (Optional[Callable[[Dict[str, Any]], None]], optional): A function called with the record of each stage of the removal, when no profiler is given. Defaults to None.
+        alpha_matting_max_megapixels (Optional[float], optional): The size in millions of pixels above which alpha matting is solved on a downscaled image, whose alpha is then upsampled with a guided filter. Defaults to None, always solving at full resolution.
+        alpha_matting_method (str, optional): The name of the alpha matting engine: "cf" for closed-form matting, or "guided" for a much faster guided filter refinement of the mask, see `matting_engines`. Defaults to "cf".
+        *args (Optional[Any]): Additional positional arguments.
+        **kwargs (Optional[Any]): Additional keyword arguments.
+
+    Returns:
+        List[Union[bytes, PILImage, np.ndarray]]: The cutout images with the background removed, in the order of the inputs.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be greater than 0")
+
+    if profiler is None and on_stage is not None:
+        profiler = Profiler(on_stage=on_stage)
+
+    with profile(profiler) if profiler is not None else nullcontext():
+        putalpha = cast(bool, kwargs.pop("putalpha", False))
+
+        if session is None:
+            session = get_session("u2net", *args, **kwargs)
+
+        cutouts = []
+
+        for start in range(0, len(data), batch_size):
+            images = [
+                load_image(each_data, force_return_bytes)
+                for each_data in data[start : start + batch_size]
+            ]
+            batch_masks = session.predict_batch(
+                [img for img, _ in images],
+                *args,
+                post_process_mask=post_process_mask,
+                **kwargs,
+            )
+
+            for (img, return_type), masks in zip(images, batch_masks):
+                cutouts.append(
+                    apply_masks(
+                        img,
+                        masks,
+                        return_type,
+                        alpha_matting,
+                        alpha_matting_foreground_threshold,
+                        alpha_matting_background_threshold,
+                        alpha_matting_erode_size,
+                        only_mask,
+                        post_process_mask,
+                        bgcolor,
+                        putalpha,
+                        alpha_matting_max_megapixels,
+                        alpha_matting_method,
+                    )
+                )
+
+        return cutouts
+
+
+def remove_iter(
+    data: Iterable[Union[bytes, PILImage, np.ndarray]],
+    alpha_matting: bool = False,
+    alpha_matting_foreground_threshold: int = 240,
+    alpha_matting_background_threshold: int = 10,
+    alpha_matting_erode_size: int = 10,
+    session: Optional[BaseSession] = None,
+    only_mask: bool = False,
+    post_process_mask: bool = False,
+    bgcolor: Optional[Tuple[int, int, int, int]] = None,
+    force_return_bytes: bool = False,
+    workers: int = 2,
+    profiler: Optional[Profiler] = None,
+    on_stage: Optional[Callable[[Dict[str, Any]], None]] = None,
+    alpha_matting_max_megapixels: Optional[float] = None,
+    alpha_matting_method: str = "cf",
+    *args: Optional[Any],
+    **kwargs: Optional[Any],
+) -> Iterator[Union[bytes, PILImage, np.ndarray]]:
+    """
+    Remove the background from a stream of input images, overlapping their decoding, inference and encoding.
+
+    This function works like `remove`, but while the session predicts the masks of an image, `workers` threads decode the next images and cut out and encode the previous ones. The inputs are consumed lazily, at most `workers` images ahead of the inference, and the cutouts are yielded in the order of the inputs, so that a long stream of images is processed with a bounded number of images in memory.
+
+    Parameters:
+        data (Iterable[Union[bytes, PILImage, np.ndarray]]): The input images data.
+        alpha_matting (bool, optional): Flag indicating whether to use alpha matting. Defaults to False.
+        alpha_matting_foreground_threshold (int, optional): Foreground threshold for alpha matting. Defaults to 240.
+        alpha_matting_background_threshold (int, optional): Background threshold for alpha matting. Defaults to 10.
+        alpha_matting_erode_size (int, optional): Erosion size for alpha matting. Defaults to 10.
+        session (Optional[BaseSession], optional): The session to use. Defaults to the cached session of the 'u2net' model.
+        only_mask (bool, optional): Flag indicating whether to return only the binary masks. Defaults to False.
+        post_process_mask (bool, optional): Flag indicating whether to post-process the masks. Defaults to False.
+        bgcolor (Optional[Tuple[int, int, int, int]], optional): Background color for the cutout images. Defaults to None.
+        force_return_bytes (bool, optional): Flag indicating whether to return the cutout images as bytes. Defaults to False.
+        workers (int, optional): The number of threads decoding and encoding the images. Defaults to 2.
+        profiler (Optional[Profiler], optional): A profiler recording the time spent in each stage of the removal. Defaults to the active profiler, if any.
+        on_stage (Optional[Callable[[Dict[str, Any]], None]], optional): A function called with the record of each stage of the removal, when no profiler is given. Defaults to None.
+        alpha_matting_max_megapixels (Optional[float], optional): The size in millions of pixels above which alpha matting is solved on a downscaled image, whose alpha is then upsampled with a guided filter. Defaults to None, always solving at full resolution.
+        alpha_matting_method (str, optional): The name of the alpha matting engine: "cf" for closed-form matting, or "guided" for a much faster guided filter refinement of the mask, see `matting_engines`. Defaults to "cf".
+        *args (Optional[Any]): Additional positional arguments.
+        **kwargs (Optional[Any]): Additional keyword arguments.
+
+    Raises:
+        ValueError: If `workers` is less than 1.
+
+    Returns:
+        Iterator[Union[bytes, PILImage, np.ndarray]]: The cutout images with the background removed, in the order of the inputs.
+    """
+    if workers < 1:
+        raise ValueError("workers must be greater than 0")
+
+    if profiler is None and on_stage is not None:
+        profiler = Profiler(on_stage=on_stage)
+
+    def profiled() -> ContextManager:
+        # Active around the work on each image only, and not around the whole
+        # generator, as the caller runs in its own context between the images
+        return profile(profiler) if profiler is not None else nullcontext()
+
+    putalpha = cast(bool, kwargs.pop("putalpha", False))
+
+    if session is None:
+        with profiled():
+            session = get_session("u2net", *args, **kwargs)
+
+    inputs = iter(data)
+    decoding: Deque[Future] = deque()
+    encoding: Deque[Future] = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit(fn: Callable, *fn_args: Any) -> Future:
+            # Run in a copy of the current context, so that the active
+            # profiler records the stages run by the threads as well
+            return executor.submit(copy_context().run, fn, *fn_args)
+
+        def decode_ahead() -> None:
+            while len(decoding) < workers:
+                try:
+                    each_data = next(inputs)
+                except StopIteration:
+                    return
+                except Exception as e:
+                    # Raised in turn, once the previous images are yielded
+                    failed: Future = Future()
+                    failed.set_exception(e)
+                    decoding.append(failed)
+                    return
+
+                decoding.append(submit(load_image, each_data, force_return_bytes))
+
+        try:
+            with profiled():
+                decode_ahead()
+
+            while decoding:
+                try:
+                    with profiled():
+                        img, return_type = decoding.popleft().result()
+                        decode_ahead()
+
+                        masks = session.predict(
+                            img, *args, post_process_mask=post_process_mask, **kwargs
+                        )
+                except Exception:
+                    # Yield the previous images first, so that errors are
+                    # raised in the order of the inputs
+                    while encoding:
+                        yield encoding.popleft().result()
+
+                    raise
+
+                with profiled():
+                    encoding.append(
+                        submit(
+                            apply_masks,
+                            img,
+                            masks,
+                            return_type,
+                            alpha_matting,
+                            alpha_matting_foreground_threshold,
+                            alpha_matting_background_threshold,
+                            alpha_matting_erode_size,
+                            only_mask,
+                            post_process_mask,
+                            bgcolor,
+                            putalpha,
+                            alpha_matting_max_megapixels,
+                            alpha_matting_method,
+                        )
+                    )
+
+                while encoding and (encoding[0].done() or len(encoding) > workers):
+                    yield encoding.popleft().result()
+
+            while encoding:
+                yield encoding.popleft().result()
+        finally:
+            for future in (*decoding, *encoding):
+                future.cancel()
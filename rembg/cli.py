@@ -1,16 +1,83 @@
+import importlib
+from typing import Any, List, Optional
+
 import click
 
-from . import _version
-from .commands import command_functions
+from .commands import command_modules
 
 
-@click.group()
-@click.version_option(version=_version.get_versions()["version"])
-def _main() -> None:
-    pass
+class LazyGroup(click.Group):
+    """
+    A group of commands which imports the module of a command only when the command is invoked.
+    """
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        """
+        List the names of the commands.
+
+        Parameters:
+            ctx (click.Context): The context.
+
+        Returns:
+            List[str]: The names of the commands.
+        """
+        return sorted(command_modules)
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        """
+        Import a command.
+
+        Parameters:
+            ctx (click.Context): The context.
+            cmd_name (str): The name of the command.
+
+        Returns:
+            Optional[click.Command]: The command, or None if there is no command with this name.
+        """
+        if cmd_name not in command_modules:
+            return None
+
+        module_name = command_modules[cmd_name]
+        module = importlib.import_module(f".commands.{module_name}", __package__)
 
+        return getattr(module, module_name)
+
+
+def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> None:
+    """
+    Print the version and exit, computing it only when it is asked for.
+
+    Parameters:
+        ctx (click.Context): The context.
+        param (click.Parameter): The version option.
+        value (bool): Flag indicating whether the version was asked for.
+
+    Returns:
+        None
+    """
+    if not value or ctx.resilient_parsing:
+        return
+
+    from . import _version
+
+    click.echo(
+        f"{ctx.find_root().info_name}, version {_version.get_versions()['version']}"
+    )
+    ctx.exit()
+
+
+@click.group(cls=LazyGroup)
+@click.option(
+    "--version",
+    is_flag=True,
+    expose_value=False,
+    is_eager=True,
+    callback=print_version,
+    help="Show the version and exit.",
+)
+def main() -> None:
+    pass
 
-for command in command_functions:
-    _main.add_command(command)
 
-_main()
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
-command_functions = []
-
-from .b_command import b_command
-from .d_command import d_command
-from .i_command import i_command
-from .p_command import p_command
-from .s_command import s_command
-
-command_functions.append(b_command)
-command_functions.append(d_command)
-command_functions.append(i_command)
-command_functions.append(p_command)
-command_functions.append(s_command)
+import importlib
+from typing import Any, Dict
+
+# The modules of the commands, by command name. The command of a module is the
+# function named after it, imported only when the command is invoked, as some
+# commands pull in heavy dependencies.
+command_modules: Dict[str, str] = {
+    "b": "b_command",
+    "bench": "bench_command",
+    "d": "d_command",
+    "daemon": "daemon_command",
+    "i": "i_command",
+    "optimize": "optimize_command",
+    "p": "p_command",
+    "prune": "prune_command",
+    "quantize": "quantize_command",
+    "s": "s_command",
+    "tune": "tune_command",
+}
+
+
+def __getattr__(name: str) -> Any:
+    # The list of all the commands imports all their modules on first access
+    if name == "command_functions":
+        functions = [
+            getattr(importlib.import_module(f".{module_name}", __name__), module_name)
+            for module_name in command_modules.values()
+        ]
+        globals()[name] = functions
+
+        return functions
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
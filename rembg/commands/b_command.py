@@ -3,12 +3,14 @@ import io
 import json
 import os
 import sys
-from typing import IO
+from typing import IO, Optional, cast
 
 import click
 import PIL
 
-from ..bg import remove
+from ..bg import matting_engines, remove
+from ..profiling import Profiler
+from ..quantization import precisions
 from ..session_factory import new_session
 from ..sessions import sessions_names
 
@@ -57,6 +59,21 @@ from ..sessions import sessions_names
     show_default=True,
     help="erode size",
 )
+@click.option(
+    "-amp",
+    "--alpha-matting-max-megapixels",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="solve alpha matting on the image downscaled to this many megapixels",
+)
+@click.option(
+    "-amm",
+    "--alpha-matting-method",
+    default="cf",
+    type=click.Choice(list(matting_engines)),
+    show_default=True,
+    help="alpha matting engine, guided is much faster than closed-form (cf)",
+)
 @click.option(
     "-om",
     "--only-mask",
@@ -79,7 +96,22 @@ from ..sessions import sessions_names
     nargs=4,
     help="Background color (R G B A) to replace the removed background with",
 )
+@click.option(
+    "-pr",
+    "--precision",
+    default="fp32",
+    type=click.Choice(list(precisions)),
+    show_default=True,
+    help="precision of the model, int8 loads the version created by `rembg quantize`",
+)
 @click.option("-x", "--extras", type=str)
+@click.option(
+    "-pf",
+    "--profile",
+    "profile_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="write the time spent in each stage as JSON to this file",
+)
 @click.option(
     "-o",
     "--output_specifier",
@@ -100,6 +132,7 @@ def b_command(
     image_width: int,
     image_height: int,
     output_specifier: str,
+    profile_path: Optional[str],
     **kwargs
 ) -> None:
     """
@@ -113,6 +146,7 @@ def b_command(
         image_width (int): The width of the input images in pixels.
         image_height (int): The height of the input images in pixels.
         output_specifier (str): A printf-style specifier for the output filenames. If specified, the processed images will be saved to the specified output directory with filenames generated using the specifier.
+        profile_path (Optional[str]): The file to write the time spent in each stage to.
         **kwargs: Additional keyword arguments that can be used to customize the background removal process.
 
     Returns:
@@ -125,6 +159,7 @@ def b_command(
             raise click.BadParameter("extras must be a valid JSON string")
 
     session = new_session(model, **kwargs)
+    profiler = Profiler() if profile_path is not None else None
     bytes_per_img = image_width * image_height * 3
 
     if output_specifier:
@@ -164,7 +199,7 @@ def b_command(
                     break
 
                 img = PIL.Image.frombytes("RGB", (image_width, image_height), img_bytes)
-                output = remove(img, session=session, **kwargs)
+                output = remove(img, session=session, profiler=profiler, **kwargs)
 
                 if output_specifier:
                     output.save((output_specifier % idx), format="PNG")
@@ -176,3 +211,6 @@ def b_command(
                 break
 
     asyncio.run(main())
+
+    if profiler is not None:
+        profiler.dump(cast(str, profile_path))
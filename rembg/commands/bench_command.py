@@ -0,0 +1,373 @@
+import io
+import json
+import math
+import multiprocessing
+import os
+import pathlib
+import platform
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+import numpy as np
+import onnxruntime as ort
+from PIL import Image
+
+from .._version import get_versions
+from ..bg import remove
+from ..profiling import Profiler
+from ..quantization import quantized_model_path
+from ..session_factory import new_session
+from ..sessions import sessions, sessions_names
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore
+
+
+def model_files(model: str, **kwargs) -> List[str]:
+    """
+    Get the paths of the files a model loads, without downloading them.
+
+    Parameters:
+        model (str): The name of the model.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        List[str]: The paths of the model files.
+    """
+    if kwargs.get("model_path") is not None:
+        return [os.path.abspath(os.path.expanduser(str(kwargs["model_path"])))]
+
+    home = sessions[model].u2net_home()
+
+    if model == "sam":
+        sam_model = kwargs.get("sam_model", "sam_vit_b_01ec64")
+        suffix = (
+            ".quant.onnx"
+            if kwargs.get("sam_quant", False) or kwargs.get("precision") == "int8"
+            else ".onnx"
+        )
+
+        return [
+            os.path.join(home, f"{sam_model}.encoder{suffix}"),
+            os.path.join(home, f"{sam_model}.decoder{suffix}"),
+        ]
+
+    path = os.path.join(home, f"{model}.onnx")
+
+    if kwargs.get("precision") == "int8":
+        return [quantized_model_path(path)]
+
+    return [path]
+
+
+def synthetic_image(megapixels: float) -> Tuple[str, bytes]:
+    """
+    Create a JPEG image of a given size, with a 4:3 aspect ratio.
+
+    The image is a colored blob over a gradient, so that it is not trivially compressible and every model finds some foreground in it.
+
+    Parameters:
+        megapixels (float): The size of the image in millions of pixels.
+
+    Returns:
+        Tuple[str, bytes]: The name and the encoded data of the image.
+    """
+    width = max(int(math.sqrt(megapixels * 1e6 * 4 / 3)), 1)
+    height = max(int(width * 3 / 4), 1)
+
+    y, x = np.ogrid[:height, :width]
+    cx, cy = width / 2, height / 2
+    blob = ((x - cx) / (width / 4)) ** 2 + ((y - cy) / (height / 3)) ** 2 < 1
+
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[..., 0] = (x * 255 // max(width - 1, 1)).astype(np.uint8)
+    img[..., 1] = (y * 255 // max(height - 1, 1)).astype(np.uint8)
+    img[..., 2] = 128
+    img[blob] = (230, 40, 40)
+
+    bio = io.BytesIO()
+    Image.fromarray(img).save(bio, "JPEG", quality=90)
+
+    return f"synthetic-{megapixels:g}mp.jpg", bio.getvalue()
+
+
+def peak_rss() -> Optional[int]:
+    """
+    Get the peak resident set size of the process.
+
+    Returns:
+        Optional[int]: The peak resident set size in bytes, or None if it is not available on this platform.
+    """
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def latency_stats(latencies: List[float]) -> Dict[str, float]:
+    """
+    Summarize a list of latencies.
+
+    Parameters:
+        latencies (List[float]): The latencies in seconds.
+
+    Returns:
+        Dict[str, float]: The mean, p50, p95 and p99 latencies in seconds.
+    """
+    return {
+        "mean": float(np.mean(latencies)),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "p99": float(np.percentile(latencies, 99)),
+    }
+
+
+def bench_model(
+    model: str,
+    images: List[Tuple[str, bytes]],
+    repeat: int,
+    warmup: int,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Benchmark one model over a list of images.
+
+    This runs in a process of its own, so that the peak resident set size is the one of this model alone.
+
+    Parameters:
+        model (str): The name of the model.
+        images (List[Tuple[str, bytes]]): The names and the encoded data of the images.
+        repeat (int): The number of timed runs per image.
+        warmup (int): The number of untimed runs before the timed ones.
+        **kwargs: Additional keyword arguments, passed to the session and to `remove`.
+
+    Returns:
+        Dict[str, Any]: The results of the model.
+    """
+    start = time.perf_counter()
+    session = new_session(model, **kwargs)
+    load_time = time.perf_counter() - start
+
+    for _ in range(warmup):
+        remove(images[0][1], session=session, **kwargs)
+
+    profiler = Profiler(keep_records=False)
+    results = []
+    latencies = []
+    megapixels = 0.0
+
+    for name, data in images:
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+
+        image_latencies = []
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            remove(data, session=session, profiler=profiler, **kwargs)
+            image_latencies.append(time.perf_counter() - start)
+
+        latencies.extend(image_latencies)
+        megapixels += width * height / 1e6 * repeat
+
+        results.append(
+            {
+                "name": name,
+                "width": width,
+                "height": height,
+                "latencies": image_latencies,
+                **latency_stats(image_latencies),
+            }
+        )
+
+    total = sum(latencies)
+
+    return {
+        "model": model,
+        "status": "ok",
+        "load_time": load_time,
+        "runs": len(latencies),
+        "throughput": len(latencies) / total,
+        "megapixels_per_second": megapixels / total,
+        **latency_stats(latencies),
+        "peak_rss": peak_rss(),
+        "stages": profiler.summary(),
+        "images": results,
+    }
+
+
+@click.command(  # type: ignore
+    name="bench",
+    help="benchmark the models",
+)
+@click.option(
+    "-m",
+    "--model",
+    "models",
+    multiple=True,
+    type=click.Choice(sessions_names),
+    show_choices=True,
+    help="model name, can be repeated (default: all the downloaded models)",
+)
+@click.option(
+    "-f",
+    "--fixtures",
+    default=os.path.join("tests", "fixtures"),
+    type=click.Path(path_type=pathlib.Path),
+    show_default=True,
+    help="folder of images to run the models on",
+)
+@click.option(
+    "-s",
+    "--size",
+    "sizes",
+    multiple=True,
+    default=(0.3, 2.0, 12.0),
+    type=click.FloatRange(min=0, min_open=True),
+    show_default=True,
+    help="size in megapixels of a synthetic image to run the models on, can be repeated",
+)
+@click.option(
+    "-r",
+    "--repeat",
+    default=3,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="number of timed runs per image",
+)
+@click.option(
+    "-w",
+    "--warmup",
+    default=1,
+    type=click.IntRange(min=0),
+    show_default=True,
+    help="number of untimed runs per model",
+)
+@click.option(
+    "-o",
+    "--output",
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help="write the results as JSON to this file",
+)
+@click.option("-x", "--extras", type=str)
+def bench_command(
+    models: Tuple[str, ...],
+    fixtures: pathlib.Path,
+    sizes: Tuple[float, ...],
+    repeat: int,
+    warmup: int,
+    output: Optional[str],
+    extras: Optional[str],
+) -> None:
+    """
+    Command-line interface for benchmarking the models.
+
+    Each model runs over the images of the fixtures folder and over synthetic images of the given sizes. The command reports, per model, the load time, the throughput, the p50, p95 and p99 latencies, the time spent in each stage and the peak resident set size. Each model runs in a process of its own, so that its peak resident set size does not include the ones of the models before it.
+
+    The command works offline: models whose files are not in `U2NET_HOME` are skipped instead of downloaded.
+
+    Parameters:
+        models (Tuple[str, ...]): The names of the models to benchmark.
+        fixtures (pathlib.Path): The folder of images to run the models on.
+        sizes (Tuple[float, ...]): The sizes in megapixels of the synthetic images to run the models on.
+        repeat (int): The number of timed runs per image.
+        warmup (int): The number of untimed runs per model.
+        output (Optional[str]): The file to write the results to.
+        extras (Optional[str]): Additional options in JSON format.
+
+    Returns:
+        None
+    """
+    kwargs: Dict[str, Any] = {}
+
+    if extras:
+        try:
+            kwargs.update(json.loads(extras))
+        except Exception:
+            raise click.BadParameter("extras must be a valid JSON string")
+
+    images = []
+
+    if fixtures.is_dir():
+        for path in sorted(fixtures.iterdir()):
+            if path.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"):
+                images.append((path.name, path.read_bytes()))
+
+    images.extend(synthetic_image(size) for size in sizes)
+
+    if len(images) == 0:
+        raise click.UsageError("no images to run the models on")
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+
+    for model in models or sessions_names:
+        files = model_files(model, **kwargs)
+        missing = [path for path in files if not os.path.exists(path)]
+
+        if len(missing) > 0:
+            click.echo(f"{model}: skipped, not downloaded", err=True)
+            results.append({"model": model, "status": "skipped", "missing": missing})
+            continue
+
+        try:
+            with context.Pool(1) as pool:
+                result = pool.apply(
+                    bench_model, (model, images, repeat, warmup), kwargs
+                )
+        except Exception as e:
+            click.echo(f"{model}: failed, {e}", err=True)
+            results.append({"model": model, "status": "error", "error": str(e)})
+            continue
+
+        results.append(result)
+
+        rss = result["peak_rss"]
+        click.echo(
+            f"{model}: load {result['load_time']:.2f}s"
+            f", {result['throughput']:.2f} img/s"
+            f", p50 {result['p50'] * 1000:.0f}ms"
+            f", p95 {result['p95'] * 1000:.0f}ms"
+            f", p99 {result['p99'] * 1000:.0f}ms"
+            + (f", peak rss {rss / 1024 / 1024:.0f}MB" if rss is not None else "")
+        )
+
+        for stage in sorted(result["stages"], key=lambda s: -s["wall"]):
+            click.echo(
+                f"  {stage['stage']:<16} {stage['mean_wall'] * 1000:9.1f}ms"
+                f" {stage['wall'] / (result['runs'] * result['mean']):6.1%}"
+            )
+
+    if not any(result["status"] == "ok" for result in results):
+        click.echo(
+            "No model was benchmarked, download them first with `rembg d`", err=True
+        )
+
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(
+                {
+                    "version": get_versions()["version"],
+                    "onnxruntime": ort.__version__,
+                    "providers": ort.get_available_providers(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "processor": platform.processor(),
+                    "cpu_count": os.cpu_count(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "repeat": repeat,
+                    "warmup": warmup,
+                    "images": [name for name, _ in images],
+                    "models": results,
+                },
+                f,
+                indent=2,
+            )
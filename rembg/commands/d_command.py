@@ -7,9 +7,22 @@ from ..bg import download_models
     name="d",
     help="download models",
 )
+@click.option(
+    "--verify",
+    is_flag=True,
+    help="hash the models already downloaded again, and download them again if they do not match",
+)
+@click.option(
+    "-w",
+    "--workers",
+    default=4,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="number of models downloaded at once",
+)
 @click.argument("models", nargs=-1)
-def d_command(models: tuple[str, ...]) -> None:
+def d_command(models: tuple[str, ...], verify: bool, workers: int) -> None:
     """
     Download models
     """
-    download_models(models)
+    download_models(models, verify, workers)
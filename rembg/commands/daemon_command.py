@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+
+import click
+
+from ..daemon import DaemonRunningError, serve, socket_path
+from ..server import InferenceEngine
+from ..sessions import sessions_names
+
+
+@click.command(  # type: ignore
+    name="daemon",
+    help="keep models loaded for the `i` and `p` commands",
+)
+@click.option(
+    "-s",
+    "--socket",
+    "path",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="path of the Unix domain socket to listen on (default: $REMBG_DAEMON_SOCKET, or daemon.sock in U2NET_HOME)",
+)
+@click.option(
+    "-m",
+    "--model",
+    "models",
+    multiple=True,
+    default=("u2net",),
+    type=click.Choice(sessions_names),
+    show_default=True,
+    show_choices=True,
+    help="model loaded at startup, can be repeated, other models are loaded on their first request",
+)
+@click.option(
+    "-t",
+    "--threads",
+    default=None,
+    type=click.IntRange(min=1),
+    help="number of worker threads (default: $REMBG_WORKERS, or 2)",
+)
+@click.option(
+    "-ms",
+    "--max_sessions",
+    default=None,
+    type=int,
+    help="maximum number of models kept loaded",
+)
+def daemon_command(
+    path: Optional[str],
+    models: Tuple[str, ...],
+    threads: Optional[int],
+    max_sessions: Optional[int],
+) -> None:
+    """
+    Command-line interface for running the rembg daemon.
+
+    The daemon loads the models once and keeps them loaded, listening on a Unix domain socket. While it runs, the `i` and `p` commands send it their images instead of loading the model themselves, which saves them the time to load the model on each call. The daemon is configured by the same environment variables as the engine of the server, see `InferenceEngine.from_env`.
+
+    Parameters:
+        path (Optional[str]): The path of the socket.
+        models (Tuple[str, ...]): The names of the models to load at startup.
+        threads (Optional[int]): The number of worker threads.
+        max_sessions (Optional[int]): The maximum number of loaded models.
+
+    Returns:
+        None
+    """
+    kwargs: Dict[str, Any] = {"models": models, "max_sessions": max_sessions}
+
+    if threads is not None:
+        kwargs["workers"] = threads
+
+    engine = InferenceEngine.from_env(**kwargs)
+    path = path or socket_path()
+    click.echo(f"Starting the rembg daemon on {path}", err=True)
+
+    try:
+        asyncio.run(serve(engine, path))
+    except DaemonRunningError as e:
+        raise click.ClickException(str(e))
+    except KeyboardInterrupt:
+        pass
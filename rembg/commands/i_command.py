@@ -1,14 +1,64 @@
+import glob
+import itertools
 import json
+import os
 import sys
-from typing import IO
+from typing import IO, Any, Iterator, List, Optional, Tuple, cast
 
 import click
+from tqdm import tqdm
 
-from ..bg import remove
+from ..bg import matting_engines, remove_iter
+from ..daemon import DaemonClient
+from ..profiling import Profiler
+from ..quantization import precisions
 from ..session_factory import new_session
 from ..sessions import sessions_names
 
 
+def expand_inputs(paths: List[str]) -> List[str]:
+    """
+    Expand the glob patterns among input paths, for shells that do not expand them, or paths listed in a file.
+
+    Parameters:
+        paths (List[str]): The input paths and patterns.
+
+    Returns:
+        List[str]: The input paths, the matches of each pattern sorted by name.
+    """
+    inputs = []
+
+    for path in paths:
+        if any(c in path for c in "*?[") and not os.path.exists(path):
+            inputs.extend(sorted(glob.glob(path, recursive=True)))
+        else:
+            inputs.append(path)
+
+    return inputs
+
+
+def output_path(template: str, input_path: str) -> str:
+    """
+    Get the output path of an input path.
+
+    Parameters:
+        input_path (str): The input path.
+        template (str): The output template, where {name}, {stem}, {suffix} and {parent} are replaced by the file name of the input, its name without suffix, its suffix and its directory.
+
+    Returns:
+        str: The output path.
+    """
+    name = os.path.basename(input_path)
+    stem, suffix = os.path.splitext(name)
+
+    return template.format(
+        name=name,
+        stem=stem,
+        suffix=suffix,
+        parent=os.path.dirname(input_path) or ".",
+    )
+
+
 @click.command(  # type: ignore
     name="i",
     help="for a file as input",
@@ -53,6 +103,21 @@ from ..sessions import sessions_names
     show_default=True,
     help="erode size",
 )
+@click.option(
+    "-amp",
+    "--alpha-matting-max-megapixels",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="solve alpha matting on the image downscaled to this many megapixels",
+)
+@click.option(
+    "-amm",
+    "--alpha-matting-method",
+    default="cf",
+    type=click.Choice(list(matting_engines)),
+    show_default=True,
+    help="alpha matting engine, guided is much faster than closed-form (cf)",
+)
 @click.option(
     "-om",
     "--only-mask",
@@ -75,26 +140,70 @@ from ..sessions import sessions_names
     nargs=4,
     help="Background color (R G B A) to replace the removed background with",
 )
+@click.option(
+    "-pr",
+    "--precision",
+    default="fp32",
+    type=click.Choice(list(precisions)),
+    show_default=True,
+    help="precision of the model, int8 loads the version created by `rembg quantize`",
+)
 @click.option("-x", "--extras", type=str)
-@click.argument(
-    "input", default=(None if sys.stdin.isatty() else "-"), type=click.File("rb")
+@click.option(
+    "-pf",
+    "--profile",
+    "profile_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="write the time spent in each stage as JSON to this file",
+)
+@click.option(
+    "-o",
+    "--output-template",
+    default=None,
+    type=str,
+    help="process every INPUT, writing it to this path, where {stem}, {name}, {suffix} and {parent} are replaced by those of the input, e.g. out/{stem}.png",
 )
-@click.argument(
-    "output",
-    default=(None if sys.stdin.isatty() else "-"),
-    type=click.File("wb", lazy=True),
+@click.option(
+    "-l",
+    "--input-list",
+    default=None,
+    type=click.File("r"),
+    help="file listing more inputs, one per line, - for stdin, used with --output-template",
+)
+@click.option(
+    "-w",
+    "--workers",
+    default=2,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="number of threads decoding and encoding the images while the model runs, used with --output-template",
 )
-def i_command(model: str, extras: str, input: IO, output: IO, **kwargs) -> None:
+@click.argument("paths", nargs=-1, metavar="[INPUT]... [OUTPUT]")
+def i_command(
+    model: str,
+    extras: str,
+    paths: Tuple[str, ...],
+    output_template: Optional[str],
+    input_list: Optional[IO],
+    workers: int,
+    profile_path: Optional[str],
+    **kwargs,
+) -> None:
     """
     Click command line interface function to process an input file based on the provided options.
 
     This function is the entry point for the CLI program. It reads an input file, applies image processing operations based on the provided options, and writes the output to a file.
+    With an output template, it processes any number of input files, and the files listed in `input_list`, with a single session, so that the model is loaded once, decoding the next images and encoding the previous ones while the model runs.
+    If a `rembg daemon` is running, and the time spent in each stage is not recorded, the input files are sent to the daemon, which processes them with its loaded model, until it fails to respond in time.
 
     Parameters:
         model (str): The name of the model to use for image processing.
         extras (str): Additional options in JSON format.
-        input: The input file to process.
-        output: The output file to write the processed image to.
+        paths (Tuple[str, ...]): The input file and the output file, or with an output template, the input files. "-" stands for stdin or stdout.
+        output_template (Optional[str]): The template of the output files of the input files.
+        input_list (Optional[IO]): A file listing more input files, one per line.
+        workers (int): The number of threads decoding and encoding the images.
+        profile_path (Optional[str]): The file to write the time spent in each stage to.
         **kwargs: Additional keyword arguments corresponding to the command line options.
 
     Returns:
@@ -105,4 +214,103 @@ def i_command(model: str, extras: str, input: IO, output: IO, **kwargs) -> None:
     except Exception:
         pass
 
-    output.write(remove(input.read(), session=new_session(model, **kwargs), **kwargs))
+    if output_template is None and input_list is None:
+        if len(paths) > 2:
+            raise click.UsageError(
+                "Use --output-template to process more than one input file."
+            )
+
+        # Without arguments, read stdin and write stdout when they are piped
+        default = None if sys.stdin.isatty() else "-"
+        input = paths[0] if len(paths) > 0 else default
+        output = paths[1] if len(paths) > 1 else default
+
+        if input is None:
+            raise click.UsageError("Missing argument 'INPUT'.")
+
+        if output is None:
+            raise click.UsageError("Missing argument 'OUTPUT'.")
+
+        pairs = [(input, output)]
+    else:
+        if output_template is None:
+            raise click.UsageError("--input-list requires --output-template.")
+
+        listed = [line.strip() for line in input_list or () if line.strip()]
+        inputs = expand_inputs([*paths, *listed])
+        pairs = [
+            (each_input, output_path(output_template, each_input))
+            for each_input in inputs
+        ]
+
+        if len({each_output for _, each_output in pairs}) < len(pairs):
+            raise click.UsageError(
+                "The output template gives several inputs the same output file."
+            )
+
+    profiler = Profiler() if profile_path is not None else None
+    client = DaemonClient.connect() if profiler is None else None
+    progress = tqdm(total=len(pairs), disable=output_template is None)
+
+    def read_inputs() -> Iterator[bytes]:
+        for each_input, _ in pairs:
+            try:
+                with click.open_file(each_input, "rb") as f:
+                    yield f.read()
+            except OSError as e:
+                raise click.FileError(each_input, e.strerror)
+
+    def remove_inputs() -> Iterator[Any]:
+        nonlocal client
+        inputs = read_inputs()
+
+        if client is not None:
+            for data in inputs:
+                try:
+                    yield client.remove(data, model, **kwargs)
+                except OSError as e:
+                    click.echo(
+                        f"The rembg daemon did not respond ({e}), processing locally",
+                        err=True,
+                    )
+                    client.close()
+                    client = None
+                    inputs = itertools.chain([data], inputs)
+                    break
+            else:
+                return
+
+        yield from remove_iter(
+            inputs,
+            session=new_session(model, **kwargs),
+            workers=workers,
+            profiler=profiler,
+            **kwargs,
+        )
+
+    results = remove_inputs()
+
+    try:
+        for each_input, each_output in pairs:
+            try:
+                result = cast(bytes, next(results))
+            except click.ClickException:
+                raise
+            except Exception as e:
+                raise click.ClickException(f"{each_input}: {e}")
+
+            if each_output != "-" and os.path.dirname(each_output):
+                os.makedirs(os.path.dirname(each_output), exist_ok=True)
+
+            with click.open_file(each_output, "wb") as f:
+                f.write(result)
+
+            progress.update()
+    finally:
+        progress.close()
+
+        if client is not None:
+            client.close()
+
+    if profiler is not None:
+        profiler.dump(cast(str, profile_path))
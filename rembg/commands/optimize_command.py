@@ -0,0 +1,83 @@
+import os
+import time
+from typing import Tuple
+
+import click
+
+from ..optimization import optimized_model_paths
+from ..pruning import pruned_model_path
+from ..quantization import precisions, quantized_model_path
+from ..session_factory import new_session
+from ..sessions import sessions, sessions_names
+
+
+@click.command(  # type: ignore
+    name="optimize",
+    help="cache the models optimized by onnxruntime, to load them faster",
+)
+@click.option(
+    "-m",
+    "--model",
+    "models",
+    multiple=True,
+    type=click.Choice(sessions_names),
+    show_choices=True,
+    help="model name, can be repeated (default: all the downloaded models)",
+)
+@click.option(
+    "-u",
+    "--undo",
+    is_flag=True,
+    help="delete the cached optimized models instead",
+)
+def optimize_command(models: Tuple[str, ...], undo: bool) -> None:
+    """
+    Command-line interface for caching the optimized models.
+
+    Sessions save the models optimized by onnxruntime the first time they load them, and load them from then on. This command loads each model once, to build the optimized models ahead of time, for instance when building an image, and reports how long the model took to load before and after.
+
+    Parameters:
+        models (Tuple[str, ...]): The names of the models to optimize. Models given by name are downloaded if they are missing.
+        undo (bool): Flag indicating whether to delete the cached optimized models instead.
+
+    Returns:
+        None
+    """
+    for model in models or sessions_names:
+        session_class = sessions[model]
+
+        if undo:
+            # The model files of every precision, as the ones of SAM depend on it
+            paths = sorted(
+                {
+                    path
+                    for precision in precisions
+                    for path in session_class.model_file_paths(precision=precision)
+                }
+            )
+
+            for path in paths:
+                for variant in (
+                    path,
+                    pruned_model_path(path),
+                    quantized_model_path(path),
+                ):
+                    for optimized in optimized_model_paths(variant):
+                        os.remove(optimized)
+                        click.echo(f"{model}: deleted {optimized}")
+            continue
+
+        paths = session_class.model_file_paths()
+
+        if not models and not (paths and all(os.path.exists(path) for path in paths)):
+            continue
+
+        start = time.perf_counter()
+        new_session(model)
+        first = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new_session(model)
+        cached = time.perf_counter() - start
+
+        click.echo(f"{model}: loaded in {first:.2f}s, then in {cached:.2f}s")
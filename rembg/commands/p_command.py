@@ -1,7 +1,9 @@
 import json
+import multiprocessing
 import pathlib
 import time
-from typing import cast
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Tuple, cast
 
 import click
 import filetype
@@ -9,9 +11,128 @@ from tqdm import tqdm
 from watchdog.events import FileSystemEvent, FileSystemEventHandler
 from watchdog.observers import Observer
 
-from ..bg import remove
-from ..session_factory import new_session
+from ..bg import matting_engines, remove
+from ..daemon import DaemonClient
+from ..profiling import Profiler
+from ..quantization import precisions
+from ..session_factory import (
+    available_cpus,
+    new_session,
+    session_class_of,
+    session_options,
+)
 from ..sessions import sessions_names
+from ..sessions.base import BaseSession
+
+# The session and the options of `remove` of a worker process of `rembg p`,
+# or the error that prevented creating the session
+worker_session: Optional[BaseSession] = None
+worker_kwargs: Dict[str, Any] = {}
+worker_error: Optional[str] = None
+
+
+def process_file(
+    each_input: pathlib.Path,
+    output: pathlib.Path,
+    remove_bytes: Callable[[bytes], bytes],
+    delete_input: bool = False,
+) -> Tuple[str, Optional[pathlib.Path]]:
+    """
+    Remove the background of an image of the input folder, unless it is not an image or its output exists.
+
+    Parameters:
+        each_input (pathlib.Path): The path of the image.
+        output (pathlib.Path): The output folder.
+        remove_bytes (Callable[[bytes], bytes]): The function removing the background of the encoded image.
+        delete_input (bool, optional): Flag indicating whether to delete the image once processed. Defaults to False.
+
+    Returns:
+        Tuple[str, Optional[pathlib.Path]]: "processed" or "skipped", and the output path of the image, if it is one.
+    """
+    mimetype = filetype.guess(each_input)
+
+    if mimetype is None or mimetype.mime.find("image") < 0:
+        return "skipped", None
+
+    each_output = (output / each_input.name).with_suffix(".png")
+    each_output.parents[0].mkdir(parents=True, exist_ok=True)
+    status = "skipped"
+
+    if not each_output.exists():
+        each_output.write_bytes(remove_bytes(each_input.read_bytes()))
+        status = "processed"
+
+    if delete_input:
+        each_input.unlink()
+
+    return status, each_output
+
+
+def init_worker(model: str, threads: int, counter: Any, kwargs: Dict[str, Any]) -> None:
+    """
+    Create the session of a worker process, with its share of the CPUs.
+
+    An error creating the session is kept to fail each image of the worker with, as the pool would otherwise start a new worker in its place, failing the same way, forever.
+
+    Parameters:
+        model (str): The name of the model.
+        threads (int): The number of intra-op threads of the session.
+        counter (Any): A shared counter numbering the workers, to pin each one's threads to its own cores.
+        kwargs (Dict[str, Any]): The options of `remove`.
+
+    Returns:
+        None
+    """
+    global worker_session, worker_kwargs, worker_error
+
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+
+    cpus = available_cpus()
+    cores = cpus[index * threads : (index + 1) * threads]
+    worker_kwargs = kwargs
+
+    try:
+        worker_session = session_class_of(model)(
+            model,
+            session_options(model, threads, cores if len(cores) == threads else None),
+            **kwargs,
+        )
+    except Exception as e:
+        worker_error = str(e) or type(e).__name__
+
+
+def process_in_worker(
+    paths: Tuple[str, str, bool],
+) -> Tuple[str, str, Optional[str]]:
+    """
+    Process an image of the input folder in a worker process.
+
+    The paths are handed to the workers instead of the images, which the workers read and write themselves.
+
+    Parameters:
+        paths (Tuple[str, str, bool]): The path of the image, the output folder and whether to delete the image once processed.
+
+    Returns:
+        Tuple[str, str, Optional[str]]: The path of the image, "processed", "skipped" or "failed", and the error if it failed.
+    """
+    each_input, output, delete_input = paths
+
+    if worker_session is None:
+        return each_input, "failed", worker_error
+
+    def remove_bytes(data: bytes) -> bytes:
+        return cast(bytes, remove(data, session=worker_session, **worker_kwargs))
+
+    try:
+        status, _ = process_file(
+            pathlib.Path(each_input), pathlib.Path(output), remove_bytes, delete_input
+        )
+    except Exception as e:
+        return each_input, "failed", str(e)
+
+    return each_input, status, None
 
 
 @click.command(  # type: ignore
@@ -58,6 +179,21 @@ from ..sessions import sessions_names
     show_default=True,
     help="erode size",
 )
+@click.option(
+    "-amp",
+    "--alpha-matting-max-megapixels",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="solve alpha matting on the image downscaled to this many megapixels",
+)
+@click.option(
+    "-amm",
+    "--alpha-matting-method",
+    default="cf",
+    type=click.Choice(list(matting_engines)),
+    show_default=True,
+    help="alpha matting engine, guided is much faster than closed-form (cf)",
+)
 @click.option(
     "-om",
     "--only-mask",
@@ -88,6 +224,14 @@ from ..sessions import sessions_names
     show_default=True,
     help="delete input file after processing",
 )
+@click.option(
+    "-j",
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="number of processes the images are split between, each with its own model and share of the CPUs",
+)
 @click.option(
     "-bgc",
     "--bgcolor",
@@ -96,7 +240,22 @@ from ..sessions import sessions_names
     nargs=4,
     help="Background color (R G B A) to replace the removed background with",
 )
+@click.option(
+    "-pr",
+    "--precision",
+    default="fp32",
+    type=click.Choice(list(precisions)),
+    show_default=True,
+    help="precision of the model, int8 loads the version created by `rembg quantize`",
+)
 @click.option("-x", "--extras", type=str)
+@click.option(
+    "-pf",
+    "--profile",
+    "profile_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="write the time spent in each stage as JSON to this file",
+)
 @click.argument(
     "input",
     type=click.Path(
@@ -124,6 +283,8 @@ def p_command(
     output: pathlib.Path,
     watch: bool,
     delete_input: bool,
+    workers: int,
+    profile_path: Optional[str],
     **kwargs,
 ) -> None:
     """
@@ -133,7 +294,9 @@ def p_command(
     It provides various options for configuration, such as choosing the model, enabling alpha matting, setting trimap thresholds, erode size, etc.
     Additional options include outputting only the mask and post-processing the mask.
     The program can also watch the input folder for changes and automatically process new images.
+    With more than one worker, the images found in the folder are split between that many processes, each with its own session and an equal share of the CPUs.
     The resulting images with the background removed are saved in the specified output folder.
+    If a `rembg daemon` is running, and the time spent in each stage is not recorded, the images are sent to the daemon, which processes them with its loaded model, until it fails to respond in time.
 
     Parameters:
         model (str): The name of the model to use for background removal.
@@ -142,6 +305,8 @@ def p_command(
         output (pathlib.Path): The path to the output folder.
         watch (bool): Whether to watch the input folder for changes.
         delete_input (bool): Whether to delete the input file after processing.
+        workers (int): The number of processes the images are split between.
+        profile_path (Optional[str]): The file to write the time spent in each stage to.
         **kwargs: Additional keyword arguments.
 
     Returns:
@@ -152,45 +317,88 @@ def p_command(
     except Exception:
         pass
 
-    session = new_session(model, **kwargs)
+    if workers > 1 and profile_path is not None:
+        raise click.UsageError("--profile cannot be used with --workers.")
 
-    def process(each_input: pathlib.Path) -> None:
-        try:
-            mimetype = filetype.guess(each_input)
-            if mimetype is None:
-                return
-            if mimetype.mime.find("image") < 0:
-                return
-
-            each_output = (output / each_input.name).with_suffix(".png")
-            each_output.parents[0].mkdir(parents=True, exist_ok=True)
-
-            if not each_output.exists():
-                each_output.write_bytes(
-                    cast(
-                        bytes,
-                        remove(each_input.read_bytes(), session=session, **kwargs),
-                    )
-                )
+    profiler = Profiler() if profile_path is not None else None
+    client = DaemonClient.connect() if profiler is None and workers == 1 else None
+    session: Optional[BaseSession] = None
 
-                if watch:
-                    print(
-                        f"processed: {each_input.absolute()} -> {each_output.absolute()}"
-                    )
+    def remove_bytes(data: bytes) -> bytes:
+        nonlocal client, session
+
+        if client is not None:
+            try:
+                return client.remove(data, model, **kwargs)
+            except OSError as e:
+                print(f"The rembg daemon did not respond ({e}), processing locally")
+                client.close()
+                client = None
+
+        if session is None:
+            session = new_session(model, **kwargs)
 
-            if delete_input:
-                each_input.unlink()
+        return cast(bytes, remove(data, session=session, profiler=profiler, **kwargs))
 
+    def process(each_input: pathlib.Path) -> str:
+        try:
+            status, each_output = process_file(
+                each_input, output, remove_bytes, delete_input
+            )
         except Exception as e:
             print(e)
+            return "failed"
 
-    inputs = list(input.glob("**/*"))
-    if not watch:
-        inputs_tqdm = tqdm(inputs)
+        if watch and status == "processed":
+            print(
+                f"processed: {each_input.absolute()} -> {cast(pathlib.Path, each_output).absolute()}"
+            )
+
+        return status
+
+    inputs = [
+        each_input for each_input in input.glob("**/*") if not each_input.is_dir()
+    ]
+    counts: Counter = Counter()
+    start = time.perf_counter()
 
-    for each_input in inputs_tqdm:
-        if not each_input.is_dir():
-            process(each_input)
+    if workers > 1:
+        # Downloaded once, and checked before any worker starts
+        try:
+            session_class_of(model).resolve_model_paths(**kwargs)
+        except Exception as e:
+            raise click.ClickException(f"{model}: {e}")
+
+        context = multiprocessing.get_context("spawn")
+        threads = max(1, len(available_cpus()) // workers)
+        tasks = [(str(each_input), str(output), delete_input) for each_input in inputs]
+
+        with context.Pool(
+            workers,
+            initializer=init_worker,
+            initargs=(model, threads, context.Value("i", 0), kwargs),
+        ) as pool, tqdm(total=len(tasks), disable=watch) as progress:
+            for each_input, status, error in pool.imap_unordered(
+                process_in_worker,
+                tasks,
+                chunksize=max(1, min(32, len(tasks) // (workers * 4))),
+            ):
+                counts[status] += 1
+                progress.update()
+
+                if error is not None:
+                    progress.write(f"{each_input}: {error}")
+    else:
+        for each_input in tqdm(inputs, disable=watch):
+            counts[process(each_input)] += 1
+
+    if not watch:
+        elapsed = time.perf_counter() - start
+        click.echo(
+            f"{counts['processed']} processed, {counts['skipped']} skipped, {counts['failed']} failed"
+            f" in {elapsed:.1f}s ({counts['processed'] / elapsed if elapsed > 0 else 0:.1f} images/s)",
+            err=True,
+        )
 
     if watch:
         should_watch = True
@@ -224,3 +432,9 @@ def p_command(
         finally:
             observer.stop()
             observer.join()
+
+    if client is not None:
+        client.close()
+
+    if profiler is not None:
+        profiler.dump(cast(str, profile_path))
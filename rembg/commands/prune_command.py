@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+import time
+from typing import List, Optional, Tuple
+
+import click
+import numpy as np
+import onnxruntime as ort
+
+from ..pruning import prune_model, pruned_model_path
+from ..sessions import sessions, sessions_names
+from ..sessions.generic import GenericSession
+from .bench_command import peak_rss
+
+
+def input_shape(model: str, session: ort.InferenceSession) -> Tuple[int, ...]:
+    """
+    Get the shape of an input of a model, for one image.
+
+    Parameters:
+        model (str): The name of the model.
+        session (ort.InferenceSession): The session of the model.
+
+    Returns:
+        Tuple[int, ...]: The shape of the input.
+    """
+    session_class = sessions[model]
+
+    if issubclass(session_class, GenericSession):
+        width, height = session_class.spec.size
+        return (1, 3, height, width)
+
+    shape = session.get_inputs()[0].shape
+    return tuple(d if isinstance(d, int) and d > 0 else 1 for d in shape)
+
+
+def measure_model(
+    model: str, path: str, outputs: Optional[List[str]], repeat: int
+) -> Tuple[float, Optional[int]]:
+    """
+    Measure the latency and the memory of a model file, fetching some of its outputs.
+
+    This runs in a process of its own, so that the peak resident set size is the one of this model alone.
+
+    Parameters:
+        model (str): The name of the model.
+        path (str): The path of the model file.
+        outputs (Optional[List[str]]): The names of the outputs to fetch, or None for all of them.
+        repeat (int): The number of timed runs.
+
+    Returns:
+        Tuple[float, Optional[int]]: The mean latency in seconds and the peak resident set size in bytes.
+    """
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    inputs = {
+        input_name: np.random.rand(*input_shape(model, session)).astype(np.float32)
+    }
+
+    session.run(outputs, inputs)
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        session.run(outputs, inputs)
+
+    return (time.perf_counter() - start) / repeat, peak_rss()
+
+
+@click.command(  # type: ignore
+    name="prune",
+    help="drop the outputs the models do not use from their files",
+)
+@click.option(
+    "-m",
+    "--model",
+    "models",
+    multiple=True,
+    type=click.Choice(sessions_names),
+    show_choices=True,
+    help="model name, can be repeated (default: all the downloaded models)",
+)
+@click.option(
+    "-b",
+    "--bench",
+    is_flag=True,
+    help="compare the latency and the memory of the models before and after pruning",
+)
+@click.option(
+    "-r",
+    "--repeat",
+    default=3,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="number of timed runs per model, when benchmarking",
+)
+@click.option(
+    "-u",
+    "--undo",
+    is_flag=True,
+    help="delete the pruned models instead",
+)
+def prune_command(
+    models: Tuple[str, ...], bench: bool, repeat: int, undo: bool
+) -> None:
+    """
+    Command-line interface for pruning the models.
+
+    The u2net family of models compute side outputs that only served their training, and that are fetched and thrown away with every image. For each downloaded model, this command writes next to it a copy without the outputs its session does not use, nor the nodes only they depend on, which the sessions load instead of the model from then on. The downloaded model is kept, as its checksum is verified before it is used.
+
+    With `bench`, each model is run, in a process of its own, fetching all its outputs as before, fetching only the used ones, and pruned, to report the latency and the peak memory of each.
+
+    Parameters:
+        models (Tuple[str, ...]): The names of the models to prune.
+        bench (bool): Flag indicating whether to benchmark the models before and after pruning.
+        repeat (int): The number of timed runs per model, when benchmarking.
+        undo (bool): Flag indicating whether to delete the pruned models instead.
+
+    Returns:
+        None
+    """
+    if not undo:
+        try:
+            import onnx
+        except ImportError:
+            raise click.ClickException(
+                "pruning models requires the onnx package, install it with `pip install onnx`"
+            )
+
+    context = multiprocessing.get_context("spawn")
+
+    for model in models or sessions_names:
+        session_class = sessions[model]
+        path = os.path.join(session_class.u2net_home(), f"{model}.onnx")
+        pruned_path = pruned_model_path(path)
+
+        if undo:
+            if os.path.exists(pruned_path):
+                os.remove(pruned_path)
+                click.echo(f"{model}: deleted {pruned_path}")
+            continue
+
+        indices = session_class.output_indices()
+
+        if not os.path.exists(path):
+            if models:
+                click.echo(f"{model}: skipped, not downloaded", err=True)
+            continue
+
+        if indices is None:
+            click.echo(f"{model}: skipped, all its outputs are used")
+            continue
+
+        onnx_model = onnx.load(path)
+        outputs = [onnx_model.graph.output[i].name for i in indices]
+
+        if len(outputs) == len(onnx_model.graph.output):
+            click.echo(f"{model}: skipped, no unused outputs")
+            continue
+
+        removed = prune_model(onnx_model, outputs)
+        onnx.save(onnx_model, pruned_path)
+        del onnx_model
+
+        click.echo(
+            f"{model}: kept {', '.join(outputs)}, removed {removed} nodes"
+            f", {os.path.getsize(path) / 1024 / 1024:.1f}MB"
+            f" -> {os.path.getsize(pruned_path) / 1024 / 1024:.1f}MB"
+        )
+
+        if not bench:
+            continue
+
+        for label, variant_path, fetched in (
+            ("all outputs", path, None),
+            ("used outputs", path, outputs),
+            ("pruned", pruned_path, None),
+        ):
+            with context.Pool(1) as pool:
+                latency, rss = pool.apply(
+                    measure_model, (model, variant_path, fetched, repeat)
+                )
+
+            click.echo(
+                f"  {label:<14} {latency * 1000:9.1f}ms"
+                + (f" peak rss {rss / 1024 / 1024:7.0f}MB" if rss is not None else "")
+            )
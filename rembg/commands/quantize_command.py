@@ -0,0 +1,153 @@
+import os
+import pathlib
+import time
+from typing import List, Tuple
+
+import click
+from PIL import Image
+from PIL.Image import Image as PILImage
+
+from ..bg import fix_image_orientation
+from ..pruning import find_pruned_model
+from ..quantization import mask_iou, quantize_model, quantized_model_path, record_inputs
+from ..session_factory import new_session
+from ..sessions import sessions, sessions_names
+from ..sessions.base import BaseSession
+
+
+def timed_predict(
+    session: BaseSession, imgs: List[PILImage]
+) -> Tuple[List[List[PILImage]], float]:
+    """
+    Predict the masks of some images, one at a time, after a warmup run.
+
+    Parameters:
+        session (BaseSession): The session.
+        imgs (List[PILImage]): The images.
+
+    Returns:
+        Tuple[List[List[PILImage]], float]: The masks of each image and the mean latency in seconds.
+    """
+    session.predict(imgs[0])
+    start = time.perf_counter()
+    masks = [session.predict(img) for img in imgs]
+
+    return masks, (time.perf_counter() - start) / len(imgs)
+
+
+@click.command(  # type: ignore
+    name="quantize",
+    help="create INT8 versions of the models, loaded with the int8 precision",
+)
+@click.option(
+    "-m",
+    "--model",
+    "models",
+    multiple=True,
+    type=click.Choice(sessions_names),
+    show_choices=True,
+    help="model name, can be repeated (default: all the downloaded models)",
+)
+@click.option(
+    "--mode",
+    default="dynamic",
+    type=click.Choice(["dynamic", "static"]),
+    show_default=True,
+    help="quantize the activations at run time, or once over the calibration images",
+)
+@click.option(
+    "-f",
+    "--fixtures",
+    default=os.path.join("tests", "fixtures"),
+    type=click.Path(path_type=pathlib.Path),
+    show_default=True,
+    help="folder of images to calibrate and evaluate the quantized models on",
+)
+@click.option(
+    "-u",
+    "--undo",
+    is_flag=True,
+    help="delete the quantized models instead",
+)
+def quantize_command(
+    models: Tuple[str, ...], mode: str, fixtures: pathlib.Path, undo: bool
+) -> None:
+    """
+    Command-line interface for quantizing the models.
+
+    For each downloaded model, this command writes next to it an INT8 version, which sessions load instead of the model with `precision="int8"`. Models that were pruned are quantized pruned. The quantized model is then run over the images of the fixtures folder, and the command reports its size, its latency and the intersection over union of its masks with the masks of the FP32 model, to decide for each model whether the loss of accuracy is worth the speedup.
+
+    Parameters:
+        models (Tuple[str, ...]): The names of the models to quantize.
+        mode (str): "dynamic" or "static" quantization.
+        fixtures (pathlib.Path): The folder of images to calibrate and evaluate the quantized models on.
+        undo (bool): Flag indicating whether to delete the quantized models instead.
+
+    Returns:
+        None
+    """
+    imgs = []
+
+    if not undo and fixtures.is_dir():
+        for image_path in sorted(fixtures.iterdir()):
+            if image_path.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"):
+                imgs.append(
+                    fix_image_orientation(Image.open(image_path)).convert("RGB")
+                )
+
+    if not undo and len(imgs) == 0:
+        raise click.UsageError("no images to calibrate and evaluate the models on")
+
+    for model in models or sessions_names:
+        path = os.path.join(sessions[model].u2net_home(), f"{model}.onnx")
+        quantized_path = quantized_model_path(path)
+
+        if undo:
+            if os.path.exists(quantized_path):
+                os.remove(quantized_path)
+                click.echo(f"{model}: deleted {quantized_path}")
+            continue
+
+        if model == "sam":
+            if models:
+                click.echo(
+                    f"{model}: skipped, its quantized release is loaded with the int8 precision",
+                    err=True,
+                )
+            continue
+
+        if not os.path.exists(path):
+            if models:
+                click.echo(f"{model}: skipped, not downloaded", err=True)
+            continue
+
+        session = new_session(model)
+
+        try:
+            quantize_model(
+                find_pruned_model(path),
+                quantized_path,
+                mode,
+                record_inputs(session, imgs) if mode == "static" else None,
+            )
+        except Exception as e:
+            click.echo(f"{model}: failed, {e}", err=True)
+            continue
+
+        masks, latency = timed_predict(session, imgs)
+        quantized_masks, quantized_latency = timed_predict(
+            new_session(model, precision="int8"), imgs
+        )
+        ious = [
+            mask_iou(mask, quantized_mask)
+            for image_masks, image_quantized_masks in zip(masks, quantized_masks)
+            for mask, quantized_mask in zip(image_masks, image_quantized_masks)
+        ]
+
+        click.echo(
+            f"{model}: {session.model_size() / 1024 / 1024:.1f}MB"
+            f" -> {os.path.getsize(quantized_path) / 1024 / 1024:.1f}MB"
+            f", {latency * 1000:.0f}ms -> {quantized_latency * 1000:.0f}ms"
+            f" ({latency / quantized_latency:.1f}x)"
+            f", IoU mean {sum(ious) / len(ious):.4f} min {min(ious):.4f}"
+        )
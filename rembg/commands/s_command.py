@@ -1,22 +1,22 @@
 import json
 import os
 import webbrowser
-from typing import Optional, Tuple, cast
+from typing import Any, Dict, List, Optional, Tuple, cast
 
 import aiohttp
 import click
 import gradio as gr
 import uvicorn
-from asyncer import asyncify
 from fastapi import Depends, FastAPI, File, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.responses import Response
 
 from .._version import get_versions
-from ..bg import remove
-from ..session_factory import new_session
+from ..bg import matting_engines, remove
+from ..profiling import Profiler
+from ..quantization import precisions
+from ..server import InferenceEngine
 from ..sessions import sessions_names
-from ..sessions.base import BaseSession
 
 
 @click.command(  # type: ignore
@@ -55,15 +55,91 @@ from ..sessions.base import BaseSession
     show_default=True,
     help="number of worker threads",
 )
-def s_command(port: int, host: str, log_level: str, threads: int) -> None:
+@click.option(
+    "-ms",
+    "--max_sessions",
+    default=None,
+    type=int,
+    show_default=True,
+    help="maximum number of models kept loaded",
+)
+@click.option(
+    "-si",
+    "--session_idle_timeout",
+    default=None,
+    type=float,
+    show_default=True,
+    help="seconds after which an unused model is unloaded",
+)
+@click.option(
+    "-bs",
+    "--batch_size",
+    default=1,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="maximum number of concurrent requests for a model run as one batch",
+)
+@click.option(
+    "-bw",
+    "--batch_wait",
+    default=10,
+    type=click.FloatRange(min=0),
+    show_default=True,
+    help="maximum milliseconds a request waits for its batch to fill up",
+)
+@click.option(
+    "-r",
+    "--replicas",
+    default=None,
+    type=click.IntRange(min=1),
+    help="number of replicas of each model run in parallel, each on its own cores (default: the tuned number, or 1)",
+)
+@click.option(
+    "-pf",
+    "--profile",
+    "profile_path",
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help="record the time spent in each stage, served by /api/metrics and written as JSON to this file on shutdown",
+)
+def s_command(
+    port: int,
+    host: str,
+    log_level: str,
+    threads: int,
+    max_sessions: Optional[int],
+    session_idle_timeout: Optional[float],
+    batch_size: int,
+    batch_wait: float,
+    replicas: Optional[int],
+    profile_path: Optional[str],
+) -> None:
     """
     Command-line interface for running the FastAPI web server.
 
     This function starts the FastAPI web server with the specified port and log level.
     If the number of worker threads is specified, it sets the thread limiter accordingly.
+    Models are loaded on their first request and kept in a session cache, which unloads
+    the least recently used ones beyond `max_sessions` and the ones unused for more than
+    `session_idle_timeout` seconds.
+    If `batch_size` is greater than 1, concurrent requests for the same model are
+    coalesced, for up to `batch_wait` milliseconds, into batches run as one inference.
+    If `replicas` is greater than 1, each model is loaded that many times, with the cores split between
+    the replicas, and concurrent requests run on the least busy one.
+    If `profile_path` is given, the time spent in each stage of the requests is served
+    by /api/metrics and written to that file when the server shuts down.
     """
-    sessions: dict[str, BaseSession] = {}
-    tags_metadata = [
+    engine = InferenceEngine(
+        models=(),
+        workers=threads if threads is not None else 40,
+        batch_size=batch_size,
+        batch_wait=batch_wait / 1000,
+        max_sessions=max_sessions,
+        max_idle=session_idle_timeout,
+        replicas=replicas,
+        profiler=(Profiler(keep_records=False) if profile_path is not None else None),
+    )
+    tags_metadata: List[Dict[str, Any]] = [
         {
             "name": "Background Removal",
             "description": "Endpoints that perform background removal with different image sources.",
@@ -72,6 +148,10 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
                 "url": "https://github.com/danielgatis/rembg",
             },
         },
+        {
+            "name": "Monitoring",
+            "description": "Endpoints that report the state of the server.",
+        },
     ]
     app = FastAPI(
         title="Rembg",
@@ -122,8 +202,23 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
             ae: int = Query(
                 default=10, ge=0, description="Alpha Matting (Erode Structure Size)"
             ),
+            amp: Optional[float] = Query(
+                default=None,
+                gt=0,
+                description="Alpha Matting (Maximum Megapixels)",
+            ),
+            amm: str = Query(
+                default="cf",
+                regex=r"(" + "|".join(matting_engines) + ")",
+                description="Alpha Matting (Method)",
+            ),
             om: bool = Query(default=False, description="Only Mask"),
             ppm: bool = Query(default=False, description="Post Process Mask"),
+            pr: str = Query(
+                default="fp32",
+                regex=r"(" + "|".join(precisions) + ")",
+                description="Precision of the model",
+            ),
             bgc: Optional[str] = Query(default=None, description="Background Color"),
             extras: Optional[str] = Query(
                 default=None, description="Extra parameters as JSON"
@@ -134,8 +229,11 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
             self.af = af
             self.ab = ab
             self.ae = ae
+            self.amp = amp
+            self.amm = amm
             self.om = om
             self.ppm = ppm
+            self.pr = pr
             self.extras = extras
             self.bgc = (
                 cast(Tuple[int, int, int, int], tuple(map(int, bgc.split(","))))
@@ -167,8 +265,23 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
             ae: int = Form(
                 default=10, ge=0, description="Alpha Matting (Erode Structure Size)"
             ),
+            amp: Optional[float] = Form(
+                default=None,
+                gt=0,
+                description="Alpha Matting (Maximum Megapixels)",
+            ),
+            amm: str = Form(
+                default="cf",
+                regex=r"(" + "|".join(matting_engines) + ")",
+                description="Alpha Matting (Method)",
+            ),
             om: bool = Form(default=False, description="Only Mask"),
             ppm: bool = Form(default=False, description="Post Process Mask"),
+            pr: str = Form(
+                default="fp32",
+                regex=r"(" + "|".join(precisions) + ")",
+                description="Precision of the model",
+            ),
             bgc: Optional[str] = Query(default=None, description="Background Color"),
             extras: Optional[str] = Query(
                 default=None, description="Extra parameters as JSON"
@@ -179,8 +292,11 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
             self.af = af
             self.ab = ab
             self.ae = ae
+            self.amp = amp
+            self.amm = amm
             self.om = om
             self.ppm = ppm
+            self.pr = pr
             self.extras = extras
             self.bgc = (
                 cast(Tuple[int, int, int, int], tuple(map(int, bgc.split(","))))
@@ -188,8 +304,8 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
                 else None
             )
 
-    def im_without_bg(content: bytes, commons: CommonQueryParams) -> Response:
-        kwargs = {}
+    def extras_kwargs(commons: CommonQueryParams) -> dict:
+        kwargs = {"precision": commons.pr}
 
         if commons.extras:
             try:
@@ -197,26 +313,29 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
             except Exception:
                 pass
 
+        return kwargs
+
+    async def im_without_bg(content: bytes, commons: CommonQueryParams) -> Response:
         return Response(
-            remove(
+            await engine.remove(
                 content,
-                session=sessions.setdefault(
-                    commons.model, new_session(commons.model, **kwargs)
-                ),
+                model=commons.model,
                 alpha_matting=commons.a,
                 alpha_matting_foreground_threshold=commons.af,
                 alpha_matting_background_threshold=commons.ab,
                 alpha_matting_erode_size=commons.ae,
+                alpha_matting_max_megapixels=commons.amp,
+                alpha_matting_method=commons.amm,
                 only_mask=commons.om,
                 post_process_mask=commons.ppm,
                 bgcolor=commons.bgc,
-                **kwargs,
+                **extras_kwargs(commons),
             ),
             media_type="image/png",
         )
 
     @app.on_event("startup")
-    def startup():
+    async def startup():
         try:
             webbrowser.open(f"http://localhost:{port}")
         except Exception:
@@ -228,6 +347,15 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
 
             RunVar("_default_thread_limiter").set(CapacityLimiter(threads))
 
+        await engine.start()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await engine.stop()
+
+        if engine.profiler is not None:
+            engine.profiler.dump(cast(str, profile_path))
+
     @app.get(
         path="/api/remove",
         tags=["Background Removal"],
@@ -243,7 +371,7 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
         async with aiohttp.ClientSession() as session:
             async with session.get(url) as response:
                 file = await response.read()
-                return await asyncify(im_without_bg)(file, commons)
+                return await im_without_bg(file, commons)
 
     @app.post(
         path="/api/remove",
@@ -258,7 +386,16 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
         ),
         commons: CommonQueryPostParams = Depends(),
     ):
-        return await asyncify(im_without_bg)(file, commons)  # type: ignore
+        return await im_without_bg(file, commons)  # type: ignore
+
+    @app.get(
+        path="/api/metrics",
+        tags=["Monitoring"],
+        summary="Metrics",
+        description="Reports the loaded models, the sizes of the batches run so far and, when profiling, the time spent in each stage.",
+    )
+    async def get_metrics():
+        return engine.stats()
 
     def gr_app(app):
         def inference(input_path, model, *args):
@@ -276,7 +413,7 @@ def s_command(port: int, host: str, log_level: str, threads: int) -> None:
 
             if cmd_args:
                 kwargs.update(json.loads(cmd_args))
-            kwargs["session"] = new_session(model, **kwargs)
+            kwargs["session"] = engine.sessions.get(model, **kwargs)
 
             with open(input_path, "rb") as i:
                 with open(output_path, "wb") as o:
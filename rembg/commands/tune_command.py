@@ -0,0 +1,127 @@
+import io
+import json
+from typing import Any, Dict, Optional
+
+import click
+from PIL import Image
+
+from ..sessions import sessions_names
+from ..tuning import (
+    available_cpus,
+    candidate_profiles,
+    measure_profile,
+    modes,
+    profiles_path,
+    save_profile,
+)
+from .bench_command import synthetic_image
+
+
+@click.command(  # type: ignore
+    name="tune",
+    help="find the fastest thread configuration of a model on this machine",
+)
+@click.option(
+    "-m",
+    "--model",
+    default="u2net",
+    type=click.Choice(sessions_names),
+    show_default=True,
+    show_choices=True,
+    help="model name",
+)
+@click.option(
+    "--mode",
+    default="latency",
+    type=click.Choice(list(modes)),
+    show_default=True,
+    help="minimize the latency of one request, or maximize the images per second of concurrent requests",
+)
+@click.option(
+    "-s",
+    "--size",
+    default=2.0,
+    type=click.FloatRange(min=0, min_open=True),
+    show_default=True,
+    help="size in megapixels of the synthetic image to run the model on",
+)
+@click.option(
+    "-r",
+    "--repeat",
+    default=5,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="number of timed runs per replica and configuration",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="report the best configuration without storing it",
+)
+@click.option("-x", "--extras", type=str)
+def tune_command(
+    model: str,
+    mode: str,
+    size: float,
+    repeat: int,
+    dry_run: bool,
+    extras: Optional[str],
+) -> None:
+    """
+    Command-line interface for tuning the thread configuration of a model.
+
+    The command benchmarks the model with combinations of intra-op and inter-op threads, sequential and parallel execution, and spinning threads or not. In the latency mode, a single replica of the model runs with up to all the CPUs; in the throughput mode, the CPUs are split between replicas running concurrently. The best configuration is stored in `tune.json`, in `U2NET_HOME`, where `new_session` reads it to create the sessions of the model, and the server its number of concurrent requests, unless `OMP_NUM_THREADS` is set.
+
+    Parameters:
+        model (str): The name of the model.
+        mode (str): "latency" or "throughput".
+        size (float): The size in megapixels of the synthetic image to run the model on.
+        repeat (int): The number of timed runs per replica and configuration.
+        dry_run (bool): Flag indicating whether to only report the best configuration.
+        extras (Optional[str]): Additional options in JSON format.
+
+    Returns:
+        None
+    """
+    kwargs: Dict[str, Any] = {}
+
+    if extras:
+        try:
+            kwargs.update(json.loads(extras))
+        except Exception:
+            raise click.BadParameter("extras must be a valid JSON string")
+
+    cpu_count = len(available_cpus())
+    img = Image.open(io.BytesIO(synthetic_image(size)[1])).convert("RGB")
+    key = "latency" if mode == "latency" else "throughput"
+    best: Optional[Dict[str, Any]] = None
+
+    for profile in candidate_profiles(mode, cpu_count):
+        profile.update(measure_profile(model, profile, img, repeat, **kwargs))
+
+        click.echo(
+            f"{profile['replicas']} x {profile['intra_op_num_threads']} threads"
+            f", {profile['execution_mode']}"
+            f", {'spinning' if profile['allow_spinning'] else 'not spinning'}"
+            f": {profile['latency'] * 1000:.1f}ms, {profile['throughput']:.2f} img/s"
+        )
+
+        if (
+            best is None
+            or (mode == "latency" and profile[key] < best[key])
+            or (mode == "throughput" and profile[key] > best[key])
+        ):
+            best = profile
+
+    assert best is not None
+    best.update({"mode": mode, "cpu_count": cpu_count})
+
+    click.echo(
+        f"{model}: best {mode} with {best['replicas']} x {best['intra_op_num_threads']} threads"
+        f", {best['execution_mode']}"
+        f", {'spinning' if best['allow_spinning'] else 'not spinning'}"
+    )
+
+    if not dry_run:
+        save_profile(model, best)
+        click.echo(f"Stored in {profiles_path()}")
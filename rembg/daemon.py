@@ -0,0 +1,296 @@
+import asyncio
+import json
+import os
+import socket
+import struct
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple, cast
+
+if TYPE_CHECKING:
+    from .server import InferenceEngine
+
+# Each message is the length of its JSON header and of its body, then the
+# header and the body. The body of a request is the input image as read from
+# its file, and the body of a response the output image, neither re-encoded.
+frame = struct.Struct("!II")
+
+# Seconds to wait for the daemon to accept a connection, which it does at once
+# unless it is stuck
+connect_timeout = 1.0
+
+
+class DaemonRunningError(RuntimeError):
+    """
+    Raised by `serve` when another daemon already listens on its socket.
+    """
+
+
+def socket_path() -> str:
+    """
+    Get the path of the Unix domain socket the daemon listens on.
+
+    Returns:
+        str: The path set by `REMBG_DAEMON_SOCKET`, or `daemon.sock` in `U2NET_HOME`.
+    """
+    if "REMBG_DAEMON_SOCKET" in os.environ:
+        return os.environ["REMBG_DAEMON_SOCKET"]
+
+    from .sessions.base import BaseSession
+
+    return os.path.join(BaseSession.u2net_home(), "daemon.sock")
+
+
+def request_timeout() -> float:
+    """
+    Get the number of seconds a client waits for the response to a request.
+
+    Returns:
+        float: The timeout set by `REMBG_DAEMON_TIMEOUT`, or 120 seconds, which covers the daemon loading a model on its first request.
+    """
+    return float(os.getenv("REMBG_DAEMON_TIMEOUT", 120))
+
+
+def pack(header: Dict[str, Any], body: bytes) -> bytes:
+    """
+    Frame a message.
+
+    Parameters:
+        header (Dict[str, Any]): The header of the message.
+        body (bytes): The body of the message.
+
+    Returns:
+        bytes: The length of the header and the body, and the header, without the body.
+    """
+    encoded = json.dumps(header).encode()
+
+    return frame.pack(len(encoded), len(body)) + encoded
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    """
+    Receive a number of bytes from a socket.
+
+    Parameters:
+        sock (socket.socket): The socket.
+        size (int): The number of bytes.
+
+    Raises:
+        ConnectionError: If the socket is closed before all the bytes are received.
+
+    Returns:
+        bytes: The bytes.
+    """
+    chunks = []
+
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+
+        if not chunk:
+            raise ConnectionError("The rembg daemon closed the connection")
+
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b"".join(chunks)
+
+
+class DaemonClient:
+    """
+    Send images to a running `rembg daemon`, which removes their backgrounds with its warm sessions.
+
+    Usage:
+
+        client = DaemonClient.connect()
+
+        if client is not None:
+            with client:
+                output = client.remove(data, "u2net", alpha_matting=True)
+
+    A daemon that does not respond in time raises an `OSError`, after which the client must be closed, and the images processed without the daemon.
+    """
+
+    def __init__(self, sock: socket.socket):
+        """
+        Initialize an instance of the DaemonClient class.
+
+        Parameters:
+            sock (socket.socket): The socket connected to the daemon.
+        """
+        self.sock = sock
+
+    @classmethod
+    def connect(
+        cls, path: Optional[str] = None, timeout: Optional[float] = None
+    ) -> Optional["DaemonClient"]:
+        """
+        Connect to the daemon, if one is running.
+
+        Parameters:
+            path (Optional[str], optional): The path of the socket of the daemon. Defaults to `socket_path()`.
+            timeout (Optional[float], optional): The number of seconds to wait for the response to each request. Defaults to `request_timeout()`.
+
+        Returns:
+            Optional[DaemonClient]: The client, or None if no daemon accepts connections on the socket.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(connect_timeout)
+
+        try:
+            sock.connect(path or socket_path())
+        except OSError:
+            sock.close()
+            return None
+
+        sock.settimeout(timeout if timeout is not None else request_timeout())
+
+        return cls(sock)
+
+    def remove(self, data: bytes, model: str = "u2net", **kwargs: Any) -> bytes:
+        """
+        Remove the background from an image with the daemon.
+
+        Parameters:
+            data (bytes): The encoded input image.
+            model (str, optional): The name of the model. Defaults to "u2net".
+            **kwargs: The keyword arguments of `remove`, which must be JSON serializable.
+
+        Raises:
+            RuntimeError: If the daemon failed to process the image.
+            OSError: If the daemon did not respond in time or closed the connection.
+
+        Returns:
+            bytes: The encoded output image.
+        """
+        if kwargs.get("model_path") is not None:
+            # Resolved by the daemon from its own working directory otherwise
+            kwargs = {
+                **kwargs,
+                "model_path": os.path.abspath(
+                    os.path.expanduser(str(kwargs["model_path"]))
+                ),
+            }
+
+        self.sock.sendall(pack({"model": model, "kwargs": kwargs}, data))
+        self.sock.sendall(data)
+
+        header_size, body_size = frame.unpack(recv_exactly(self.sock, frame.size))
+        header = json.loads(recv_exactly(self.sock, header_size))
+        body = recv_exactly(self.sock, body_size)
+
+        if header.get("error") is not None:
+            raise RuntimeError(f"The rembg daemon failed: {header['error']}")
+
+        return body
+
+    def close(self) -> None:
+        """
+        Close the connection to the daemon.
+        """
+        self.sock.close()
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+async def read_request(
+    reader: asyncio.StreamReader,
+) -> Optional[Tuple[Dict[str, Any], bytes]]:
+    """
+    Read a request from a client.
+
+    Parameters:
+        reader (asyncio.StreamReader): The stream of the client.
+
+    Returns:
+        Optional[Tuple[Dict[str, Any], bytes]]: The header and the body of the request, or None once the client closed the connection.
+    """
+    try:
+        header_size, body_size = frame.unpack(await reader.readexactly(frame.size))
+    except asyncio.IncompleteReadError:
+        return None
+
+    header = json.loads(await reader.readexactly(header_size))
+    body = await reader.readexactly(body_size)
+
+    return header, body
+
+
+async def serve(engine: "InferenceEngine", path: Optional[str] = None) -> None:
+    """
+    Serve the requests of `DaemonClient`s on a Unix domain socket until cancelled.
+
+    The engine is started first, so that the models it preloads are warm when the socket appears. Each connection can send any number of requests, processed one after the other, while the engine bounds the concurrent requests of all the connections. The socket is only accessible to the user running the daemon, and is removed when it stops.
+
+    Parameters:
+        engine (InferenceEngine): The engine removing the backgrounds.
+        path (Optional[str], optional): The path of the socket. Defaults to `socket_path()`.
+
+    Raises:
+        DaemonRunningError: If another daemon listens on the socket.
+
+    Returns:
+        None
+    """
+    path = path or socket_path()
+    client = DaemonClient.connect(path)
+
+    if client is not None:
+        client.close()
+        raise DaemonRunningError(f"A rembg daemon already listens on {path}")
+
+    if os.path.exists(path):
+        # Left behind by a daemon that did not stop cleanly
+        os.remove(path)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while (request := await read_request(reader)) is not None:
+                header, data = request
+                response: Dict[str, Any] = {"error": None}
+                output = b""
+
+                try:
+                    output = cast(
+                        bytes,
+                        await engine.remove(
+                            data,
+                            model=header.get("model"),
+                            force_return_bytes=True,
+                            **header.get("kwargs", {}),
+                        ),
+                    )
+                except Exception as e:
+                    response["error"] = str(e) or type(e).__name__
+
+                writer.write(pack(response, output))
+                writer.write(output)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    await engine.start()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.bind(path)
+        # Restricted before it listens, so that no other user can connect in
+        # between
+        os.chmod(path, 0o600)
+        server = await asyncio.start_unix_server(handle, sock=sock)
+    except BaseException:
+        sock.close()
+        raise
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+        await engine.stop()
@@ -0,0 +1,126 @@
+import os
+import shutil
+from typing import Any, List, Optional
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from tqdm import tqdm
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ResumableDownloader:
+    """
+    A pooch downloader that resumes interrupted downloads.
+
+    The file is downloaded to a `.part` file next to the model file rather than to the temporary file of pooch, which is deleted when a download fails, so that a download that is interrupted carries on where it stopped the next time, with an HTTP Range request. Servers that ignore the range send the whole file again, which then replaces the part file. Once complete, the part file is moved to the temporary file of pooch, which verifies its hash and moves it to the model file.
+    """
+
+    def __init__(
+        self,
+        part_path: str,
+        progressbar: bool = True,
+        timeout: float = 30,
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        """
+        Initialize an instance of the ResumableDownloader class.
+
+        Parameters:
+            part_path (str): The path of the part file.
+            progressbar (bool, optional): Flag indicating whether to show a progress bar. Defaults to True.
+            timeout (float, optional): The timeout of the connection, in seconds. Defaults to 30.
+            chunk_size (int, optional): The number of bytes read and written at once. Defaults to 1 MiB.
+        """
+        self.part_path = part_path
+        self.progressbar = progressbar
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+
+    def __call__(
+        self, url: str, output_file: Any, pooch: Any, check_only: bool = False
+    ) -> Optional[bool]:
+        """
+        Download a file, resuming its part file if there is one.
+
+        Parameters:
+            url (str): The URL of the file.
+            output_file (str): The path to move the downloaded file to.
+            pooch (pooch.Pooch): Unused, required by the interface of pooch downloaders.
+            check_only (bool, optional): Flag indicating whether to only check that the file is available. Defaults to False.
+
+        Returns:
+            Optional[bool]: Whether the file is available, if `check_only` is set.
+        """
+        if check_only:
+            try:
+                with urlopen(Request(url, method="HEAD"), timeout=self.timeout):
+                    return True
+            except (HTTPError, URLError):
+                return False
+
+        offset = (
+            os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+        )
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        try:
+            response = urlopen(Request(url, headers=headers), timeout=self.timeout)
+        except HTTPError as e:
+            # The part file already holds the whole file
+            if e.code != 416 or not offset:
+                raise
+
+            os.replace(self.part_path, output_file)
+            return None
+
+        with response:
+            if response.status != 206:
+                offset = 0
+
+            length = response.headers.get("Content-Length")
+            total = offset + int(length) if length is not None else None
+
+            with open(self.part_path, "ab" if offset else "wb") as f, tqdm(
+                total=total,
+                initial=offset,
+                unit="B",
+                unit_scale=True,
+                desc=os.path.basename(url),
+                disable=not self.progressbar,
+            ) as bar:
+                while True:
+                    chunk = response.read(self.chunk_size)
+
+                    if not chunk:
+                        break
+
+                    f.write(chunk)
+                    bar.update(len(chunk))
+
+        os.replace(self.part_path, output_file)
+        return None
+
+
+def concatenate(paths: List[str], output: str, chunk_size: int = CHUNK_SIZE) -> None:
+    """
+    Concatenate files into one, a chunk at a time, so that they are never held in memory.
+
+    The result is written to a `.part` file that is only moved to `output` once complete, so that an interrupted concatenation is not mistaken for a complete file.
+
+    Parameters:
+        paths (List[str]): The paths of the files to concatenate, in order.
+        output (str): The path of the file to write.
+        chunk_size (int, optional): The number of bytes copied at once. Defaults to 1 MiB.
+
+    Returns:
+        None
+    """
+    part_path = f"{output}.part"
+
+    with open(part_path, "wb") as out:
+        for path in paths:
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, out, chunk_size)
+
+    os.replace(part_path, output)
@@ -0,0 +1,197 @@
+import glob
+import hashlib
+import json
+import os
+from typing import Any, List, Optional
+
+import onnxruntime as ort
+
+
+def saved_optimization_level(
+    level: ort.GraphOptimizationLevel,
+) -> ort.GraphOptimizationLevel:
+    """
+    Get the optimization level the cached model of a session is optimized at.
+
+    The optimizations above the extended level change the layout of the tensors for the instruction set of the CPU, so a graph saved with them only runs on the machines it was optimized on. They are applied each time the cached model is loaded instead.
+
+    Parameters:
+        level (ort.GraphOptimizationLevel): The optimization level of the session.
+
+    Returns:
+        ort.GraphOptimizationLevel: The level, at most `ORT_ENABLE_EXTENDED`.
+    """
+    return min(level, ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED, key=int)
+
+
+def optimized_model_path(
+    path: str, sess_opts: ort.SessionOptions, providers: Optional[List[Any]] = None
+) -> str:
+    """
+    Get the path the model optimized by onnxruntime is cached at.
+
+    The optimizations onnxruntime applies depend on its version, on the optimization level and on the execution providers, so the name of the cached model is keyed by them. The levels saved as the same graph, see `saved_optimization_level`, share their cached model.
+
+    Parameters:
+        path (str): The path of the model file.
+        sess_opts (ort.SessionOptions): The session options.
+        providers (Optional[List[Any]], optional): The execution providers. Defaults to the ones onnxruntime picks.
+
+    Returns:
+        str: The path of the optimized model file, next to the model file.
+    """
+    level = saved_optimization_level(sess_opts.graph_optimization_level)
+    key = json.dumps([ort.__version__, str(level), providers], default=str)
+    root, ext = os.path.splitext(path)
+
+    return f"{root}.optimized-{hashlib.sha1(key.encode()).hexdigest()[:12]}{ext}"
+
+
+def optimized_model_paths(path: str) -> List[str]:
+    """
+    Get the paths of the optimized models cached for a model file, for any version and options, with the files of their initializers and the markers of the models that could not be saved.
+
+    Parameters:
+        path (str): The path of the model file.
+
+    Returns:
+        List[str]: The paths of the optimized model files.
+    """
+    root, _ = os.path.splitext(path)
+
+    return glob.glob(f"{glob.escape(root)}.optimized-*")
+
+
+def remove_files(paths: List[str]) -> None:
+    """
+    Remove files, ignoring the ones that do not exist or cannot be removed, such as the initializers of a cached model another process has mapped on Windows.
+
+    Parameters:
+        paths (List[str]): The paths of the files.
+
+    Returns:
+        None
+    """
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def inference_session(
+    path: str, sess_opts: ort.SessionOptions, providers: Optional[List[Any]] = None
+) -> ort.InferenceSession:
+    """
+    Create the onnxruntime session of a model, through the cache of optimized models.
+
+    onnxruntime optimizes the graph of a model each time it loads it, which takes seconds for the largest models. The first time a model is loaded, the optimized graph is saved next to it, and it is loaded from then on instead, as long as it is newer than the model file. The graph is saved at most at the extended level, which does not depend on the CPU, and the layout optimizations of the higher levels are applied when it is loaded. Its initializers are saved to a `.data` file next to it. Models are loaded as they are when their directory is not writable or their optimized graph could not be saved, when `sess_opts` disables the optimizations, or when `MODEL_OPTIMIZATION_CACHE_DISABLED` is set.
+
+    Parameters:
+        path (str): The path of the model file.
+        sess_opts (ort.SessionOptions): The session options, left as they were, but for the name of the file of the saved initializers.
+        providers (Optional[List[Any]], optional): The execution providers. Defaults to the ones onnxruntime picks.
+
+    Returns:
+        ort.InferenceSession: The session.
+    """
+    level = sess_opts.graph_optimization_level
+
+    if (
+        level == ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        or os.getenv("MODEL_OPTIMIZATION_CACHE_DISABLED") is not None
+    ):
+        return ort.InferenceSession(path, sess_options=sess_opts, providers=providers)
+
+    optimized = optimized_model_path(path, sess_opts, providers)
+    saved_level = saved_optimization_level(level)
+
+    if saved_level == level:
+        loaded_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    else:
+        loaded_level = level
+
+    def load(model_path: str, graph_level: ort.GraphOptimizationLevel):
+        sess_opts.graph_optimization_level = graph_level
+
+        try:
+            return ort.InferenceSession(
+                model_path, sess_options=sess_opts, providers=providers
+            )
+        finally:
+            sess_opts.graph_optimization_level = level
+
+    def is_newer(cached_path: str) -> bool:
+        try:
+            return os.path.getmtime(cached_path) >= os.path.getmtime(path)
+        except OSError:
+            return False
+
+    if is_newer(optimized):
+        try:
+            return load(optimized, loaded_level)
+        except Exception:
+            # An unreadable cached model is optimized again below
+            pass
+
+    failed = f"{optimized}.failed"
+    directory = os.path.dirname(os.path.abspath(optimized))
+
+    if is_newer(failed) or not os.access(directory, os.W_OK):
+        return ort.InferenceSession(path, sess_options=sess_opts, providers=providers)
+
+    # Saved under a temporary name first, so that other processes never load
+    # a model that is still being written. The initializers are saved to a
+    # file of their own, which the model refers to by name, so that models
+    # over the 2GB protobuf limit can be saved.
+    temporary = f"{optimized}.{os.getpid()}.tmp"
+    data = f"{os.path.basename(optimized)}.{os.getpid()}.data"
+    sess_opts.optimized_model_filepath = temporary
+    sess_opts.add_session_config_entry(
+        "session.optimized_model_external_initializers_file_name", data
+    )
+
+    try:
+        session = load(path, saved_level)
+    except Exception:
+        # The optimized model could not be saved, because its directory is
+        # full, or because onnxruntime cannot save the graph for the execution
+        # providers. It is not tried again on each load, until the model changes.
+        remove_files([temporary, os.path.join(directory, data)])
+        sess_opts.optimized_model_filepath = ""
+
+        try:
+            open(failed, "w").close()
+        except OSError:
+            pass
+
+        return ort.InferenceSession(path, sess_options=sess_opts, providers=providers)
+    finally:
+        sess_opts.optimized_model_filepath = ""
+
+    try:
+        os.replace(temporary, optimized)
+    except OSError:
+        remove_files([temporary, os.path.join(directory, data)])
+
+        if saved_level != level:
+            return ort.InferenceSession(
+                path, sess_options=sess_opts, providers=providers
+            )
+
+        return session
+
+    # The initializers of the cached models replaced by this one
+    remove_files(
+        [
+            stale
+            for stale in glob.glob(f"{glob.escape(optimized)}.*.data")
+            if os.path.basename(stale) != data
+        ]
+    )
+
+    if saved_level != level:
+        # The session of the saved graph misses the layout optimizations
+        return load(optimized, loaded_level)
+
+    return session
@@ -0,0 +1,119 @@
+from typing import Optional, Tuple
+
+import numpy as np
+from cv2 import (
+    BORDER_DEFAULT,
+    MORPH_ELLIPSE,
+    MORPH_OPEN,
+    THRESH_BINARY,
+    GaussianBlur,
+    getStructuringElement,
+    morphologyEx,
+    resize,
+    threshold,
+)
+from PIL import Image
+from PIL.Image import Image as PILImage
+
+from .preprocessing import interpolations
+
+kernel = getStructuringElement(MORPH_ELLIPSE, (3, 3))
+
+
+def normalize_prediction(pred: np.ndarray, sigmoid: bool = False) -> np.ndarray:
+    """
+    Turn the prediction of a model into a mask, at the resolution of the model.
+
+    Parameters:
+        pred (np.ndarray): The prediction, of shape (height, width) once squeezed.
+        sigmoid (bool, optional): Flag indicating whether to apply a sigmoid to the prediction, for models predicting logits. Defaults to False.
+
+    Returns:
+        np.ndarray: The mask, min-max normalized to uint8 values between 0 and 255.
+    """
+    pred = np.squeeze(pred).astype(np.float32, copy=False)
+
+    if sigmoid:
+        pred = 1 / (1 + np.exp(-pred))
+
+    ma = np.max(pred)
+    mi = np.min(pred)
+
+    if ma <= mi:
+        return np.zeros(pred.shape, dtype=np.uint8)
+
+    return ((pred - mi) / (ma - mi) * 255).astype(np.uint8)
+
+
+def smooth_mask(mask: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    """
+    Smooth a mask with the morphological opening and the blur of `post_process`.
+
+    Parameters:
+        mask (np.ndarray): The mask, as uint8 values.
+        scale (float, optional): The size of the mask relative to the image it is resized to. The sizes of the opening and the blur are scaled by it, so that they have the effect they would have on the mask resized to the image. Defaults to 1.0.
+
+    Returns:
+        np.ndarray: The smoothed mask, whose values are not thresholded yet.
+    """
+    if scale == 1.0:
+        mask = morphologyEx(mask, MORPH_OPEN, kernel)
+        return GaussianBlur(mask, (5, 5), sigmaX=2, sigmaY=2, borderType=BORDER_DEFAULT)
+
+    size = int(round(3 * scale)) | 1
+
+    if size > 1:
+        mask = morphologyEx(
+            mask, MORPH_OPEN, getStructuringElement(MORPH_ELLIPSE, (size, size))
+        )
+
+    return GaussianBlur(
+        mask, (0, 0), sigmaX=2 * scale, sigmaY=2 * scale, borderType=BORDER_DEFAULT
+    )
+
+
+def post_process(mask: np.ndarray) -> np.ndarray:
+    """
+    Post Process the mask for a smooth boundary by applying Morphological Operations
+    Research based on paper: https://www.sciencedirect.com/science/article/pii/S2352914821000757
+    args:
+        mask: Binary Numpy Mask
+    """
+    mask = smooth_mask(mask)
+    mask = np.where(mask < 127, 0, 255).astype(np.uint8)  # type: ignore
+    return mask
+
+
+def resize_mask(
+    mask: np.ndarray,
+    size: Tuple[int, int],
+    interpolation: Optional[str] = None,
+    binary: bool = False,
+) -> PILImage:
+    """
+    Resize a mask to the size of the input image.
+
+    Parameters:
+        mask (np.ndarray): The mask, as uint8 values.
+        size (Tuple[int, int]): The width and height of the input image.
+        interpolation (Optional[str], optional): The name of the OpenCV interpolation used to resize the mask, one of `interpolations`. Defaults to a PIL Lanczos resize.
+        binary (bool, optional): Flag indicating whether to threshold the resized mask back to 0 and 255, for post-processed masks. Defaults to False.
+
+    Returns:
+        PILImage: The resized mask.
+    """
+    if interpolation is None:
+        resized = Image.fromarray(mask, mode="L").resize(size, Image.Resampling.LANCZOS)
+
+        if binary:
+            resized = resized.point(lambda value: 0 if value < 127 else 255)
+
+        return resized
+
+    if (mask.shape[1], mask.shape[0]) != size:
+        mask = resize(mask, size, interpolation=interpolations[interpolation])
+
+    if binary:
+        _, mask = threshold(mask, 126, 255, THRESH_BINARY)
+
+    return Image.fromarray(mask, mode="L")
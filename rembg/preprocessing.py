@@ -0,0 +1,145 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from cv2 import (
+    INTER_AREA,
+    INTER_CUBIC,
+    INTER_LANCZOS4,
+    INTER_LINEAR,
+    INTER_NEAREST,
+    resize,
+)
+from PIL.Image import Image as PILImage
+
+interpolations: Dict[str, int] = {
+    "nearest": INTER_NEAREST,
+    "linear": INTER_LINEAR,
+    "cubic": INTER_CUBIC,
+    "area": INTER_AREA,
+    "lanczos": INTER_LANCZOS4,
+}
+
+
+class Preprocessor:
+    """
+    Resize and normalize images into the input tensors of the models.
+
+    Images are resized with OpenCV, with the `interpolation` given or, by default, with INTER_AREA when downscaling and INTER_CUBIC when upscaling. Images more than twice as large as the input of a model are first box reduced by PIL, which is cheaper than copying them out of PIL at full size. They are then normalized in a single float32 pass: as the pixels of an 8 bit image take at most 256 values, each channel is normalized by looking its values up in a table, written straight into an NCHW tensor.
+
+    The tensors returned by `normalize` are buffers reused by the next call from the same thread, so that no full-frame array is allocated per image. Callers that keep several tensors at once, to run them as a batch, pass their own `out` arrays.
+    """
+
+    def __init__(self, interpolation: Optional[str] = None):
+        """
+        Initialize an instance of the Preprocessor class.
+
+        Parameters:
+            interpolation (Optional[str], optional): The name of the interpolation used to resize the images, one of `interpolations`. Defaults to INTER_AREA when downscaling and INTER_CUBIC when upscaling.
+
+        Raises:
+            ValueError: If the interpolation is unknown.
+        """
+        if interpolation is not None and interpolation not in interpolations:
+            raise ValueError(
+                f"Unknown interpolation '{interpolation}', expected one of: {', '.join(interpolations)}"
+            )
+
+        self.interpolation = interpolation
+        self.local = threading.local()
+
+    def resize(self, img: PILImage, size: Tuple[int, int]) -> np.ndarray:
+        """
+        Resize an image to the input size of a model.
+
+        Parameters:
+            img (PILImage): The image.
+            size (Tuple[int, int]): The width and height to resize the image to.
+
+        Returns:
+            np.ndarray: The resized RGB image, as an array of shape (height, width, 3).
+        """
+        width, height = size
+        factor = min(img.width // width, img.height // height)
+
+        # Box reduce images much larger than the input in PIL first, copying a
+        # few times less pixels out of PIL, when the result is area resampled
+        if (
+            factor >= 2
+            and self.interpolation in (None, "area")
+            and img.mode in ("RGB", "RGBA", "L")
+        ):
+            img = img.reduce(factor)
+
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+        array = np.asarray(img)
+
+        if array.shape[1] == width and array.shape[0] == height:
+            return array
+
+        if self.interpolation is not None:
+            interpolation = interpolations[self.interpolation]
+        elif array.shape[1] >= width and array.shape[0] >= height:
+            interpolation = INTER_AREA
+        else:
+            interpolation = INTER_CUBIC
+
+        return resize(array, size, interpolation=interpolation)
+
+    def buffer(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        Get the float32 buffer of a shape owned by the current thread.
+
+        Parameters:
+            shape (Tuple[int, ...]): The shape of the buffer.
+
+        Returns:
+            np.ndarray: The buffer, whose content is undefined.
+        """
+        buffers = getattr(self.local, "buffers", None)
+
+        if buffers is None:
+            buffers = self.local.buffers = {}
+
+        if shape not in buffers:
+            buffers[shape] = np.empty(shape, dtype=np.float32)
+
+        return buffers[shape]
+
+    def normalize(
+        self,
+        img: PILImage,
+        mean: Tuple[float, float, float],
+        std: Tuple[float, float, float],
+        size: Tuple[int, int],
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Resize and normalize an image into the input tensor of a model.
+
+        The image is scaled by its maximum value, as the models were trained on, then each channel is normalized by its mean and standard deviation.
+
+        Parameters:
+            img (PILImage): The image.
+            mean (Tuple[float, float, float]): The mean of each channel.
+            std (Tuple[float, float, float]): The standard deviation of each channel.
+            size (Tuple[int, int]): The width and height of the input of the model.
+            out (Optional[np.ndarray], optional): A float32 array of shape (1, 3, height, width) to write the tensor to. Defaults to a buffer reused by the next call from the same thread.
+
+        Returns:
+            np.ndarray: The tensor, of shape (1, 3, height, width).
+        """
+        array = self.resize(img, size)
+
+        if out is None:
+            out = self.buffer((1, 3, size[1], size[0]))
+
+        values = np.arange(256, dtype=np.float64) / max(int(array.max()), 1e-6)
+
+        for channel in range(3):
+            table = ((values - mean[channel]) / std[channel]).astype(np.float32)
+            np.take(table, array[..., channel], out=out[0, channel])
+
+        return out
@@ -0,0 +1,206 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+active_profiler: ContextVar[Optional["Profiler"]] = ContextVar(
+    "active_profiler", default=None
+)
+
+
+class Profiler:
+    """
+    Record the wall-clock time, CPU time and peak allocation of the stages of background removal.
+
+    A profiler records the stages run while it is active, see `profile`. The CPU time is the time of the whole process, including the threads of onnxruntime, so it is only meaningful when a single image is processed at a time. The peak allocation is only recorded when `trace_memory` is set, as tracing the allocations slows every stage down; it covers the memory allocated through Python, numpy arrays included, but not the memory allocated by onnxruntime.
+    """
+
+    def __init__(
+        self,
+        on_stage: Optional[Callable[[Dict[str, Any]], None]] = None,
+        trace_memory: bool = False,
+        keep_records: bool = True,
+    ):
+        """
+        Initialize an instance of the Profiler class.
+
+        Parameters:
+            on_stage (Optional[Callable[[Dict[str, Any]], None]], optional): A function called with the record of each stage when it ends. Defaults to None.
+            trace_memory (bool, optional): Flag indicating whether to record the peak allocation of each stage. Defaults to False.
+            keep_records (bool, optional): Flag indicating whether to keep the record of each stage, or only their totals. Defaults to True.
+        """
+        self.on_stage = on_stage
+        self.trace_memory = trace_memory
+        self.keep_records = keep_records
+        self.records: List[Dict[str, Any]] = []
+        self.totals: Dict[Tuple[Optional[str], str], Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, session: Optional[str] = None) -> Iterator[None]:
+        """
+        Record a stage.
+
+        Parameters:
+            name (str): The name of the stage.
+            session (Optional[str], optional): The name of the model of the session running the stage. Defaults to None.
+        """
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+            tracemalloc.reset_peak()
+            memory_start, _ = tracemalloc.get_traced_memory()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        try:
+            yield
+        finally:
+            record: Dict[str, Any] = {
+                "stage": name,
+                "session": session,
+                "wall": time.perf_counter() - wall_start,
+                "cpu": time.process_time() - cpu_start,
+                "peak_memory": None,
+            }
+
+            if self.trace_memory:
+                _, memory_peak = tracemalloc.get_traced_memory()
+                record["peak_memory"] = max(memory_peak - memory_start, 0)
+
+            self.add(record)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """
+        Add the record of a stage.
+
+        Parameters:
+            record (Dict[str, Any]): The record.
+        """
+        with self.lock:
+            if self.keep_records:
+                self.records.append(record)
+
+            total = self.totals.setdefault(
+                (record["session"], record["stage"]),
+                {
+                    "stage": record["stage"],
+                    "session": record["session"],
+                    "count": 0,
+                    "wall": 0.0,
+                    "cpu": 0.0,
+                    "peak_memory": None,
+                },
+            )
+            total["count"] += 1
+            total["wall"] += record["wall"]
+            total["cpu"] += record["cpu"]
+
+            if record["peak_memory"] is not None:
+                total["peak_memory"] = max(
+                    total["peak_memory"] or 0, record["peak_memory"]
+                )
+
+        if self.on_stage is not None:
+            self.on_stage(record)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Get the totals of each stage, per session.
+
+        Returns:
+            List[Dict[str, Any]]: For each stage and session, the number of times it ran, its total and mean wall-clock and CPU times in seconds and its largest peak allocation in bytes.
+        """
+        with self.lock:
+            return [
+                dict(
+                    total,
+                    mean_wall=total["wall"] / total["count"],
+                    mean_cpu=total["cpu"] / total["count"],
+                )
+                for total in self.totals.values()
+            ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the summary and the records of the profiler.
+
+        Returns:
+            Dict[str, Any]: The summary and the records.
+        """
+        with self.lock:
+            records = list(self.records)
+
+        return {"summary": self.summary(), "records": records}
+
+    def dump(self, path: str) -> None:
+        """
+        Write the summary and the records of the profiler to a JSON file.
+
+        Parameters:
+            path (str): The path of the file.
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def reset(self) -> None:
+        """
+        Forget the stages recorded so far.
+        """
+        with self.lock:
+            self.records.clear()
+            self.totals.clear()
+
+
+@contextmanager
+def profile(profiler: Optional[Profiler] = None, **kwargs) -> Iterator[Profiler]:
+    """
+    Make a profiler active for the current context.
+
+    The stages run by `remove` and by the sessions inside the `with` block are recorded by the profiler:
+
+        with profile() as profiler:
+            remove(data)
+
+        print(profiler.summary())
+
+    Parameters:
+        profiler (Optional[Profiler], optional): The profiler. Defaults to a new profiler.
+        **kwargs: Keyword arguments of the Profiler class, used when creating a new profiler.
+
+    Returns:
+        Iterator[Profiler]: The active profiler.
+    """
+    if profiler is None:
+        profiler = Profiler(**kwargs)
+
+    token = active_profiler.set(profiler)
+
+    try:
+        yield profiler
+    finally:
+        active_profiler.reset(token)
+
+
+@contextmanager
+def stage(name: str, session: Optional[str] = None) -> Iterator[None]:
+    """
+    Record a stage with the active profiler, if any.
+
+    Parameters:
+        name (str): The name of the stage.
+        session (Optional[str], optional): The name of the model of the session running the stage. Defaults to None.
+    """
+    profiler = active_profiler.get()
+
+    if profiler is None:
+        yield
+        return
+
+    with profiler.stage(name, session):
+        yield
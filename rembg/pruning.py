@@ -0,0 +1,113 @@
+import os
+from typing import Any, List, Set
+
+
+def pruned_model_path(path: str) -> str:
+    """
+    Get the path the pruned copy of a model file is written to.
+
+    Parameters:
+        path (str): The path of the model file.
+
+    Returns:
+        str: The path of the pruned model file, next to the model file.
+    """
+    root, ext = os.path.splitext(path)
+
+    return f"{root}.pruned{ext}"
+
+
+def find_pruned_model(path: str) -> str:
+    """
+    Get the pruned copy of a model file, if there is one up to date.
+
+    The model file itself is kept, as its checksum is verified before it is used, and the pruned copy is only used while it is newer than the model file, so that a model downloaded again is not shadowed by a copy pruned from an older one.
+
+    Parameters:
+        path (str): The path of the model file.
+
+    Returns:
+        str: The path of the pruned model file, or the path of the model file.
+    """
+    pruned = pruned_model_path(path)
+
+    try:
+        if os.path.getmtime(pruned) >= os.path.getmtime(path):
+            return pruned
+    except OSError:
+        pass
+
+    return path
+
+
+def graph_inputs(node: Any) -> Set[str]:
+    """
+    Get the names of the values a node reads, including the ones read by its subgraphs.
+
+    Parameters:
+        node (onnx.NodeProto): The node.
+
+    Returns:
+        Set[str]: The names of the values.
+    """
+    names = set(node.input)
+
+    for attribute in node.attribute:
+        subgraphs = list(attribute.graphs)
+
+        if attribute.HasField("g"):
+            subgraphs.append(attribute.g)
+
+        for subgraph in subgraphs:
+            for subnode in subgraph.node:
+                names.update(graph_inputs(subnode))
+
+    return names
+
+
+def prune_model(model: Any, outputs: List[str]) -> int:
+    """
+    Remove the outputs of a model other than the given ones, and the nodes and weights only they use, so that they are not computed at all.
+
+    Parameters:
+        model (onnx.ModelProto): The model, modified in place.
+        outputs (List[str]): The names of the outputs to keep.
+
+    Returns:
+        int: The number of removed nodes.
+    """
+    graph = model.graph
+    needed = set(outputs)
+    kept = set()
+    weights = {initializer.name for initializer in graph.initializer}
+
+    for index in reversed(range(len(graph.node))):
+        node = graph.node[index]
+
+        if any(name in needed for name in node.output):
+            kept.add(index)
+            needed.update(graph_inputs(node))
+
+    removed = len(graph.node) - len(kept)
+
+    for index in reversed(range(len(graph.node))):
+        if index not in kept:
+            del graph.node[index]
+
+    # Models of older IR versions also list their weights as inputs
+    for index in reversed(range(len(graph.input))):
+        name = graph.input[index].name
+
+        if name in weights and name not in needed:
+            del graph.input[index]
+
+    for field, names in (
+        (graph.output, set(outputs)),
+        (graph.initializer, needed),
+        (graph.value_info, needed),
+    ):
+        for index in reversed(range(len(field))):
+            if field[index].name not in names:
+                del field[index]
+
+    return removed
@@ -0,0 +1,177 @@
+import os
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+import numpy as np
+from PIL.Image import Image as PILImage
+
+if TYPE_CHECKING:
+    from .sessions.base import BaseSession
+
+precisions = ("fp32", "int8")
+
+
+def quantized_model_path(path: str) -> str:
+    """
+    Get the path the INT8 version of a model file is written to.
+
+    Parameters:
+        path (str): The path of the model file.
+
+    Returns:
+        str: The path of the quantized model file, next to the model file.
+    """
+    root, ext = os.path.splitext(path)
+
+    return f"{root}.int8{ext}"
+
+
+def find_quantized_model(path: str) -> str:
+    """
+    Get the INT8 version of a model file.
+
+    Parameters:
+        path (str): The path of the model file.
+
+    Raises:
+        ValueError: If the model was not quantized.
+
+    Returns:
+        str: The path of the quantized model file.
+    """
+    quantized = quantized_model_path(path)
+
+    if not os.path.exists(quantized):
+        raise ValueError(
+            f"No INT8 version of {path}, create it with `rembg quantize` first"
+        )
+
+    return quantized
+
+
+class CalibrationReader:
+    """
+    Feed recorded model inputs to the static quantization of onnxruntime, which measures the range of the activations over them.
+    """
+
+    def __init__(self, inputs: List[Dict[str, np.ndarray]]):
+        """
+        Initialize an instance of the CalibrationReader class.
+
+        Parameters:
+            inputs (List[Dict[str, np.ndarray]]): The inputs of the model.
+        """
+        self.inputs = iter(inputs)
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Get the next input of the model.
+
+        Returns:
+            Optional[Dict[str, np.ndarray]]: The input, or None once all of them were read.
+        """
+        return next(self.inputs, None)
+
+
+def record_inputs(
+    session: "BaseSession", imgs: Iterable[PILImage]
+) -> List[Dict[str, np.ndarray]]:
+    """
+    Record the inputs a session feeds its model for some images, as preprocessed by the session itself.
+
+    Parameters:
+        session (BaseSession): The session.
+        imgs (Iterable[PILImage]): The images.
+
+    Returns:
+        List[Dict[str, np.ndarray]]: The inputs of the model, one per image.
+    """
+    inputs: List[Dict[str, np.ndarray]] = []
+    run_batch = session.run_batch
+
+    def record(batch: List[Dict[str, np.ndarray]]) -> List[List[np.ndarray]]:
+        # Copied, as sessions reuse their input buffers
+        inputs.extend({name: array.copy() for name, array in i.items()} for i in batch)
+        return run_batch(batch)
+
+    session.run_batch = record  # type: ignore
+
+    try:
+        for img in imgs:
+            session.predict(img)
+    finally:
+        del session.run_batch
+
+    return inputs
+
+
+def quantize_model(
+    path: str,
+    output: str,
+    mode: str = "dynamic",
+    inputs: Optional[List[Dict[str, np.ndarray]]] = None,
+) -> None:
+    """
+    Quantize the weights, and with static quantization the activations, of a model to INT8.
+
+    Dynamic quantization only needs the model, and computes the range of the activations at run time. Static quantization computes it once, over calibration inputs, which makes inference faster but the accuracy depends on how representative the inputs are.
+
+    Parameters:
+        path (str): The path of the model file.
+        output (str): The path to write the quantized model to.
+        mode (str, optional): "dynamic" or "static". Defaults to "dynamic".
+        inputs (Optional[List[Dict[str, np.ndarray]]], optional): The calibration inputs, required by static quantization. Defaults to None.
+
+    Raises:
+        ValueError: If the mode is unknown, or static quantization has no calibration inputs.
+
+    Returns:
+        None
+    """
+    from onnxruntime.quantization import (
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    if mode == "dynamic":
+        # The CPU kernels of the integer convolutions only take unsigned weights
+        quantize_dynamic(path, output, weight_type=QuantType.QUInt8)
+    elif mode == "static":
+        if not inputs:
+            raise ValueError("Static quantization requires calibration inputs")
+
+        quantize_static(
+            path,
+            output,
+            CalibrationReader(inputs),  # type: ignore
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+        )
+    else:
+        raise ValueError(
+            f"Unknown quantization mode '{mode}', expected 'dynamic' or 'static'"
+        )
+
+
+def mask_iou(a: PILImage, b: PILImage) -> float:
+    """
+    Compute the intersection over union of two masks, thresholded at half their range.
+
+    Parameters:
+        a (PILImage): The first mask.
+        b (PILImage): The second mask.
+
+    Returns:
+        float: The intersection over union, 1 if both masks are empty.
+    """
+    x = np.asarray(a) > 127
+    y = np.asarray(b) > 127
+    union = np.logical_or(x, y).sum()
+
+    if union == 0:
+        return 1.0
+
+    return float(np.logical_and(x, y).sum() / union)
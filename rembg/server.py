@@ -0,0 +1,366 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple, Union
+
+import numpy as np
+from PIL import Image
+from PIL.Image import Image as PILImage
+
+from .batching import MicroBatcher
+from .bg import apply_masks, load_image, remove
+from .profiling import Profiler, profile
+from .session_factory import SessionCache, session_key
+from .tuning import load_profile
+
+
+class InferenceEngine:
+    """
+    Run background removal on behalf of asynchronous web apps.
+
+    The engine keeps its sessions in a `SessionCache`, preloading and warming up the `models` when started so that the first real request is not a cold one. Inference runs in a bounded pool of `workers` threads, so the event loop, and with it health checks, stays responsive, and each model admits at most `concurrency` requests at a time. If `batch_size` is greater than 1, concurrent requests for the same model are coalesced into batches run as one inference.
+
+    Usage with FastAPI:
+
+        engine = InferenceEngine(models=["u2net"])
+
+        @app.on_event("startup")
+        async def startup():
+            await engine.start()
+
+        @app.on_event("shutdown")
+        async def shutdown():
+            await engine.stop()
+
+        @app.post("/remove")
+        async def remove_bg(file: bytes = File(...)):
+            return Response(await engine.remove(file), media_type="image/png")
+    """
+
+    def __init__(
+        self,
+        models: Iterable[str] = ("u2net",),
+        workers: int = 2,
+        concurrency: Optional[Union[int, Dict[str, int]]] = None,
+        batch_size: int = 1,
+        batch_wait: float = 0.01,
+        warmup: bool = True,
+        max_sessions: Optional[int] = None,
+        max_idle: Optional[float] = None,
+        profiler: Optional[Profiler] = None,
+        replicas: Optional[int] = None,
+    ):
+        """
+        Initialize an instance of the InferenceEngine class.
+
+        Parameters:
+            models (Iterable[str], optional): The models to preload when the engine starts. Defaults to ("u2net",).
+            workers (int, optional): The number of worker threads running inference. Defaults to 2.
+            concurrency (Optional[Union[int, Dict[str, int]]], optional): The maximum number of concurrent requests per model, or a mapping from model name to that number. Defaults to `workers`, or `batch_size` times `workers` when batching.
+            batch_size (int, optional): The maximum number of concurrent requests for a model run as one batch. Defaults to 1.
+            batch_wait (float, optional): The maximum number of seconds a request waits for its batch to fill up. Defaults to 0.01.
+            warmup (bool, optional): Flag indicating whether to run one inference per preloaded model when the engine starts. Defaults to True.
+            max_sessions (Optional[int], optional): The maximum number of loaded models. Defaults to no limit.
+            max_idle (Optional[float], optional): The number of seconds after which an unused model is unloaded. Defaults to no limit.
+            profiler (Optional[Profiler], optional): A profiler recording the time spent in each stage of the requests. Defaults to None.
+            replicas (Optional[int], optional): The number of replicas of each model, run in parallel by a `SessionPool` when greater than 1. Defaults to the replicas of the profile `rembg tune` stored for the model, or 1.
+        """
+        self.models = list(models)
+        self.workers = workers
+        self.concurrency = concurrency
+        self.warmup = warmup
+        self.profiler = profiler
+        self.replicas = replicas
+        self.sessions = SessionCache(max_sessions=max_sessions, max_idle=max_idle)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="rembg")
+        self.batcher = (
+            MicroBatcher(batch_size, batch_wait, self.executor)
+            if batch_size > 1
+            else None
+        )
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self.ready = False
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "InferenceEngine":
+        """
+        Create an engine configured by environment variables.
+
+        The variables are `REMBG_MODELS` (comma separated model names), `REMBG_WORKERS`, `REMBG_CONCURRENCY`, `REMBG_BATCH_SIZE`, `REMBG_BATCH_WAIT` (in milliseconds) and `REMBG_REPLICAS`. Keyword arguments take precedence over them.
+
+        Parameters:
+            **kwargs: Keyword arguments of the InferenceEngine class.
+
+        Returns:
+            InferenceEngine: The engine.
+        """
+        env: Dict[str, Any] = {}
+
+        if "REMBG_MODELS" in os.environ:
+            env["models"] = [
+                model.strip()
+                for model in os.environ["REMBG_MODELS"].split(",")
+                if model.strip()
+            ]
+
+        if "REMBG_WORKERS" in os.environ:
+            env["workers"] = int(os.environ["REMBG_WORKERS"])
+
+        if "REMBG_CONCURRENCY" in os.environ:
+            env["concurrency"] = int(os.environ["REMBG_CONCURRENCY"])
+
+        if "REMBG_BATCH_SIZE" in os.environ:
+            env["batch_size"] = int(os.environ["REMBG_BATCH_SIZE"])
+
+        if "REMBG_BATCH_WAIT" in os.environ:
+            env["batch_wait"] = float(os.environ["REMBG_BATCH_WAIT"]) / 1000
+
+        if "REMBG_REPLICAS" in os.environ:
+            env["replicas"] = int(os.environ["REMBG_REPLICAS"])
+
+        env.update(kwargs)
+        return cls(**env)
+
+    async def start(self) -> None:
+        """
+        Preload and warm up the sessions of the engine's models.
+        """
+        for model in self.models:
+            await self.run(self.preload, model)
+
+        if self.sessions.max_idle is not None:
+            task = asyncio.get_running_loop().create_task(self.evict_idle())
+            self.tasks.add(task)
+
+        self.ready = True
+
+    async def stop(self) -> None:
+        """
+        Stop the background tasks and the worker threads of the engine.
+        """
+        for task in self.tasks:
+            task.cancel()
+
+        self.ready = False
+        self.executor.shutdown(wait=False)
+
+    def preload(self, model: str, **kwargs) -> None:
+        """
+        Load the session of a model and, if enabled, run one inference with it.
+
+        Parameters:
+            model (str): The name of the model.
+            **kwargs: Additional keyword arguments.
+        """
+        session = self.sessions.get(model, **self.session_kwargs(model, kwargs))
+
+        if self.warmup:
+            session.predict(Image.new("RGB", (64, 64)), **kwargs)
+
+    def session_kwargs(self, model: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add the number of replicas of a model to the keyword arguments of its session, unless they set it.
+
+        Parameters:
+            model (str): The name of the model.
+            kwargs (Dict[str, Any]): The keyword arguments.
+
+        Returns:
+            Dict[str, Any]: The keyword arguments, with the number of replicas.
+        """
+        if "replicas" in kwargs:
+            return kwargs
+
+        replicas = self.replicas
+
+        if replicas is None:
+            profile = load_profile(model)
+            replicas = profile["replicas"] if profile is not None else 1
+
+        return {**kwargs, "replicas": replicas}
+
+    async def evict_idle(self) -> None:
+        """
+        Periodically unload the sessions unused for longer than the idle timeout.
+        """
+        while True:
+            await asyncio.sleep(min(self.sessions.max_idle or 60, 60))
+            self.sessions.evict_idle()
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a function in the engine's worker threads.
+
+        Parameters:
+            fn (Callable): The function.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            Any: The result of the function.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, partial(fn, *args, **kwargs)
+        )
+
+    def profiled(self, fn: Callable) -> Callable:
+        """
+        Wrap a function so that its stages are recorded by the engine's profiler, if any.
+
+        Parameters:
+            fn (Callable): The function.
+
+        Returns:
+            Callable: The wrapped function.
+        """
+        profiler = self.profiler
+
+        if profiler is None:
+            return fn
+
+        def run(*args, **kwargs):
+            with profile(profiler):
+                return fn(*args, **kwargs)
+
+        return run
+
+    def semaphore(self, model: str) -> asyncio.Semaphore:
+        """
+        Get the semaphore bounding the concurrent requests of a model.
+
+        Unless the concurrency is set, models tuned by `rembg tune` admit as many concurrent requests as their profile has replicas.
+
+        Parameters:
+            model (str): The name of the model.
+
+        Returns:
+            asyncio.Semaphore: The semaphore.
+        """
+        if model not in self.semaphores:
+            profile = load_profile(model)
+
+            if isinstance(self.concurrency, dict):
+                limit = self.concurrency.get(model, self.workers)
+            elif self.concurrency is not None:
+                limit = self.concurrency
+            elif self.batcher is not None:
+                limit = self.batcher.max_batch_size * self.workers
+            elif profile is not None:
+                limit = min(profile["replicas"], self.workers)
+            else:
+                limit = self.workers
+
+            self.semaphores[model] = asyncio.Semaphore(limit)
+
+        return self.semaphores[model]
+
+    async def remove(
+        self,
+        data: Union[bytes, PILImage, np.ndarray],
+        model: Optional[str] = None,
+        alpha_matting: bool = False,
+        alpha_matting_foreground_threshold: int = 240,
+        alpha_matting_background_threshold: int = 10,
+        alpha_matting_erode_size: int = 10,
+        alpha_matting_max_megapixels: Optional[float] = None,
+        alpha_matting_method: str = "cf",
+        only_mask: bool = False,
+        post_process_mask: bool = False,
+        bgcolor: Optional[Tuple[int, int, int, int]] = None,
+        force_return_bytes: bool = False,
+        **kwargs: Any,
+    ) -> Union[bytes, PILImage, np.ndarray]:
+        """
+        Remove the background from an input image without blocking the event loop.
+
+        Parameters:
+            data (Union[bytes, PILImage, np.ndarray]): The input image data.
+            model (Optional[str], optional): The name of the model. Defaults to the first of the engine's models, or "u2net".
+            alpha_matting (bool, optional): Flag indicating whether to use alpha matting. Defaults to False.
+            alpha_matting_foreground_threshold (int, optional): Foreground threshold for alpha matting. Defaults to 240.
+            alpha_matting_background_threshold (int, optional): Background threshold for alpha matting. Defaults to 10.
+            alpha_matting_erode_size (int, optional): Erosion size for alpha matting. Defaults to 10.
+            alpha_matting_max_megapixels (Optional[float], optional): The size in millions of pixels above which alpha matting is solved at a reduced resolution. Defaults to None.
+            alpha_matting_method (str, optional): The name of the alpha matting engine. Defaults to "cf".
+            only_mask (bool, optional): Flag indicating whether to return only the binary masks. Defaults to False.
+            post_process_mask (bool, optional): Flag indicating whether to post-process the masks. Defaults to False.
+            bgcolor (Optional[Tuple[int, int, int, int]], optional): Background color for the cutout image. Defaults to None.
+            force_return_bytes (bool, optional): Flag indicating whether to return the cutout image as bytes. Defaults to False.
+            **kwargs (Any): Additional keyword arguments, as the extras of `remove`.
+
+        Returns:
+            Union[bytes, PILImage, np.ndarray]: The cutout image with the background removed.
+        """
+        if model is None:
+            model = self.models[0] if len(self.models) > 0 else "u2net"
+
+        options: Dict[str, Any] = {
+            "alpha_matting": alpha_matting,
+            "alpha_matting_foreground_threshold": alpha_matting_foreground_threshold,
+            "alpha_matting_background_threshold": alpha_matting_background_threshold,
+            "alpha_matting_erode_size": alpha_matting_erode_size,
+            "alpha_matting_max_megapixels": alpha_matting_max_megapixels,
+            "alpha_matting_method": alpha_matting_method,
+            "only_mask": only_mask,
+            "post_process_mask": post_process_mask,
+            "bgcolor": bgcolor,
+        }
+
+        kwargs = self.session_kwargs(model, kwargs)
+
+        async with self.semaphore(model):
+            session = await self.run(self.sessions.get, model, **kwargs)
+
+            if self.batcher is None:
+                return await self.run(
+                    self.profiled(remove),
+                    data,
+                    session=session,
+                    force_return_bytes=force_return_bytes,
+                    **options,
+                    **kwargs,
+                )
+
+            putalpha = kwargs.pop("putalpha", False)
+            img, return_type = await self.run(
+                self.profiled(load_image), data, force_return_bytes
+            )
+            masks = await self.batcher.submit(
+                (
+                    session_key(model, **kwargs),
+                    json.dumps(kwargs, sort_keys=True, default=str),
+                    post_process_mask,
+                ),
+                img,
+                self.profiled(
+                    lambda imgs: session.predict_batch(
+                        imgs, post_process_mask=post_process_mask, **kwargs
+                    )
+                ),
+            )
+
+            return await self.run(
+                self.profiled(apply_masks),
+                img,
+                masks,
+                return_type,
+                putalpha=putalpha,
+                **options,
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the state of the engine.
+
+        Returns:
+            Dict[str, Any]: Whether the engine is ready, the number of loaded models, the sizes of the batches run so far and, if profiling, the time spent in each stage.
+        """
+        return {
+            "ready": self.ready,
+            "sessions": len(self.sessions),
+            "batching": self.batcher.stats() if self.batcher is not None else None,
+            "profile": (self.profiler.summary() if self.profiler is not None else None),
+        }
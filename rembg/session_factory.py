@@ -1,21 +1,101 @@
 import os
-from typing import Optional, Type
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
 
 import onnxruntime as ort
+from PIL.Image import Image as PILImage
 
-from .sessions import sessions_class
+from .sessions import sessions
 from .sessions.base import BaseSession
-from .sessions.u2net import U2netSession
+from .tuning import available_cpus, load_profile, pin_threads, profile_options
+
+# Keyword arguments that change which model a session loads, or how it runs
+# it. Two calls of `get_session` share a session only if they agree on all of
+# them.
+SESSION_KWARGS = (
+    "model_path",
+    "sam_model",
+    "sam_quant",
+    "interpolation",
+    "mask_interpolation",
+    "precision",
+    "replicas",
+    "threads",
+    "pin",
+)
+
+
+def session_options(
+    model_name: str, threads: Optional[int] = None, cores: Optional[List[int]] = None
+) -> ort.SessionOptions:
+    """
+    Create the session options of a model.
+
+    The options are created from the profile `rembg tune` stored for the model on this machine, if any. The intra-op threads of a profile with several replicas are the share of one replica, so a session created without `threads` gets the threads of all of them. If the 'OMP_NUM_THREADS' environment variable is set, the 'inter_op_num_threads' and 'intra_op_num_threads' options are set to its value, unless `threads` is given, which only replaces the intra-op threads of a profile.
+
+    Parameters:
+        model_name (str): The name of the model.
+        threads (Optional[int], optional): The number of intra-op threads. Defaults to the tuned or the default number.
+        cores (Optional[List[int]], optional): The CPUs to pin the intra-op threads to, one per thread. Defaults to no pinning.
+
+    Returns:
+        ort.SessionOptions: The session options.
+    """
+    profile = load_profile(model_name)
+    sess_opts = (
+        profile_options(profile) if profile is not None else ort.SessionOptions()
+    )
+
+    if profile is not None and threads is None:
+        sess_opts.intra_op_num_threads *= profile["replicas"]
+
+    if threads is not None:
+        sess_opts.intra_op_num_threads = threads
+
+        # The tuned inter-op threads and execution mode are kept
+        if profile is None:
+            sess_opts.inter_op_num_threads = 1
+    elif "OMP_NUM_THREADS" in os.environ:
+        threads = int(os.environ["OMP_NUM_THREADS"])
+        sess_opts.inter_op_num_threads = threads
+        sess_opts.intra_op_num_threads = threads
+
+    if cores is not None:
+        pin_threads(sess_opts, cores)
+
+    return sess_opts
+
+
+def session_class_of(model_name: str) -> Type[BaseSession]:
+    """
+    Get the session class of a model.
+
+    Parameters:
+        model_name (str): The name of the model.
+
+    Raises:
+        ValueError: If no session class with the given `model_name` is found.
+
+    Returns:
+        Type[BaseSession]: The session class.
+    """
+    try:
+        return sessions[model_name]
+    except KeyError:
+        raise ValueError(f"No session class found for model '{model_name}'")
 
 
 def new_session(model_name: str = "u2net", *args, **kwargs) -> BaseSession:
     """
     Create a new session object based on the specified model name.
 
-    This function searches for the session class based on the model name in the 'sessions_class' list.
-    It then creates an instance of the session class with the provided arguments.
-    The 'sess_opts' object is created using the 'ort.SessionOptions()' constructor.
-    If the 'OMP_NUM_THREADS' environment variable is set, the 'inter_op_num_threads' option of 'sess_opts' is set to its value.
+    This function looks up the session class of the model name in the 'sessions' registry.
+    It then creates an instance of the session class with the provided arguments and the options of `session_options`.
+    If the 'replicas' keyword argument is greater than 1, it creates a `SessionPool` of that many sessions instead, each loading the model. With "auto", the number of replicas is the one of the profile `rembg tune` stored for the model, for callers running concurrent predictions.
 
     Parameters:
         model_name (str): The name of the model.
@@ -28,21 +108,363 @@ def new_session(model_name: str = "u2net", *args, **kwargs) -> BaseSession:
     Returns:
         BaseSession: The created session object.
     """
-    session_class: Optional[Type[BaseSession]] = None
+    replicas = kwargs.pop("replicas", None) or 1
 
-    for sc in sessions_class:
-        if sc.name() == model_name:
-            session_class = sc
-            break
+    if replicas == "auto":
+        profile = load_profile(model_name)
+        replicas = profile["replicas"] if profile is not None else 1
 
-    if session_class is None:
-        raise ValueError(f"No session class found for model '{model_name}'")
+    if replicas > 1:
+        return SessionPool(model_name, replicas, *args, **kwargs)
 
-    sess_opts = ort.SessionOptions()
+    return session_class_of(model_name)(
+        model_name, session_options(model_name), *args, **kwargs
+    )
 
-    if "OMP_NUM_THREADS" in os.environ:
-        threads = int(os.environ["OMP_NUM_THREADS"])
-        sess_opts.inter_op_num_threads = threads
-        sess_opts.intra_op_num_threads = threads
 
-    return session_class(model_name, sess_opts, *args, **kwargs)
+class SessionPool(BaseSession):
+    """
+    Replicas of the session of a model, running concurrent predictions in parallel.
+
+    A single session with all the cores as intra-op threads scales poorly beyond a few cores for these convolutional networks. The pool splits the CPUs between its replicas instead: each gets `threads` intra-op threads, pinned to its own cores, and each `predict` runs on the least busy replica, so that concurrent calls, from the threads of a server for instance, run side by side on disjoint cores. Each replica loads the model, so the memory grows with their number.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        replicas: int,
+        *args,
+        threads: Optional[int] = None,
+        pin: bool = True,
+        **kwargs,
+    ):
+        """
+        Initialize an instance of the SessionPool class.
+
+        Parameters:
+            model_name (str): The name of the model.
+            replicas (int): The number of replicas.
+            *args: Additional positional arguments of the sessions.
+            threads (Optional[int], optional): The number of intra-op threads of each replica. Defaults to an equal share of the CPUs.
+            pin (bool, optional): Flag indicating whether to pin the threads of each replica to its own cores, when there are enough of them. Defaults to True.
+            **kwargs: Additional keyword arguments of the sessions.
+        """
+        cpus = available_cpus()
+
+        if threads is None:
+            threads = max(1, len(cpus) // replicas)
+
+        session_class = session_class_of(model_name)
+        self.model_name = model_name
+        self.replicas: List[BaseSession] = []
+
+        for i in range(replicas):
+            cores = cpus[i * threads : (i + 1) * threads]
+            self.replicas.append(
+                session_class(
+                    model_name,
+                    session_options(
+                        model_name,
+                        threads,
+                        cores if pin and len(cores) == threads else None,
+                    ),
+                    *args,
+                    **kwargs,
+                )
+            )
+
+        self.model_paths = self.replicas[0].model_paths
+        self.busy = [0] * replicas
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def replica(self) -> Iterator[BaseSession]:
+        """
+        Hold the least busy replica for a prediction.
+
+        Returns:
+            Iterator[BaseSession]: The replica.
+        """
+        with self.lock:
+            index = min(range(len(self.replicas)), key=self.busy.__getitem__)
+            self.busy[index] += 1
+
+        try:
+            yield self.replicas[index]
+        finally:
+            with self.lock:
+                self.busy[index] -= 1
+
+    def predict(self, img: PILImage, *args, **kwargs) -> List[PILImage]:
+        """
+        Predict the masks of an image on the least busy replica.
+
+        Parameters:
+            img (PILImage): The input image.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            List[PILImage]: The list of masks.
+        """
+        with self.replica() as session:
+            return session.predict(img, *args, **kwargs)
+
+    def predict_batch(
+        self, imgs: List[PILImage], *args, **kwargs
+    ) -> List[List[PILImage]]:
+        """
+        Predict the masks of a list of images on the least busy replica.
+
+        Parameters:
+            imgs (List[PILImage]): The input images.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            List[List[PILImage]]: The list of masks for each input image.
+        """
+        with self.replica() as session:
+            return session.predict_batch(imgs, *args, **kwargs)
+
+    def model_size(self) -> int:
+        """
+        Get the size of the model files loaded by all the replicas.
+
+        Returns:
+            int: The size in bytes of the model files times the number of replicas.
+        """
+        return sum(session.model_size() for session in self.replicas)
+
+
+def session_key(model_name: str, **kwargs) -> Tuple[Any, ...]:
+    """
+    Build the key identifying the session a model name and keyword arguments resolve to.
+
+    Only the keyword arguments in `SESSION_KWARGS` are part of the key, as the others do not change the model a session loads or how it runs it.
+
+    Parameters:
+        model_name (str): The name of the model.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        Tuple[Any, ...]: The session key.
+    """
+    key: Tuple[Any, ...] = (model_name,)
+
+    for name in SESSION_KWARGS:
+        value = kwargs.get(name)
+        if value is None:
+            continue
+
+        if name == "model_path":
+            value = os.path.abspath(os.path.expanduser(str(value)))
+
+        key += ((name, value),)
+
+    return key
+
+
+class SessionCache:
+    """
+    A thread-safe, bounded, least recently used cache of sessions.
+
+    Sessions are evicted, least recently used first, when the cache holds more than `max_sessions` sessions or when the size of their model files exceeds `max_memory` bytes. The session just requested is never evicted. Sessions unused for more than `max_idle` seconds are evicted by `evict_idle`, which `get` also calls.
+
+    Sessions are created lazily and once: concurrent requests for a session that is still loading wait for that load instead of starting their own, while sessions of other models load in parallel.
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        max_memory: Optional[int] = None,
+        max_idle: Optional[float] = None,
+    ):
+        """
+        Initialize an instance of the SessionCache class.
+
+        Parameters:
+            max_sessions (Optional[int], optional): The maximum number of cached sessions. Defaults to no limit.
+            max_memory (Optional[int], optional): The maximum size in bytes of the model files of the cached sessions. Defaults to no limit.
+            max_idle (Optional[float], optional): The number of seconds after which an unused session is evicted. Defaults to no limit.
+        """
+        self.max_sessions = max_sessions
+        self.max_memory = max_memory
+        self.max_idle = max_idle
+        self.sessions: "OrderedDict[Tuple[Any, ...], BaseSession]" = OrderedDict()
+        self.last_used: Dict[Tuple[Any, ...], float] = {}
+        self.loading: Dict[Tuple[Any, ...], Future] = {}
+        self.lock = threading.RLock()
+
+    def get(self, model_name: str = "u2net", *args, **kwargs) -> BaseSession:
+        """
+        Get the cached session for a model, creating it with `new_session` on a miss.
+
+        Parameters:
+            model_name (str): The name of the model.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            BaseSession: The cached session.
+        """
+        key = session_key(model_name, **kwargs)
+
+        with self.lock:
+            self.evict_idle()
+            session = self.sessions.get(key)
+
+            if session is not None:
+                self.sessions.move_to_end(key)
+                self.last_used[key] = time.monotonic()
+                return session
+
+            future = self.loading.get(key)
+            is_loader = future is None
+
+            if future is None:
+                future = Future()
+                self.loading[key] = future
+
+        if not is_loader:
+            return future.result()
+
+        try:
+            session = new_session(model_name, *args, **kwargs)
+        except BaseException as e:
+            with self.lock:
+                del self.loading[key]
+
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            del self.loading[key]
+            self.sessions[key] = session
+            self.last_used[key] = time.monotonic()
+            self.shrink()
+
+        future.set_result(session)
+        return session
+
+    def evict(self, model_name: str, **kwargs) -> bool:
+        """
+        Remove the session of a model from the cache.
+
+        Parameters:
+            model_name (str): The name of the model.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            bool: True if a session was removed.
+        """
+        key = session_key(model_name, **kwargs)
+
+        with self.lock:
+            self.last_used.pop(key, None)
+            return self.sessions.pop(key, None) is not None
+
+    def evict_idle(self) -> int:
+        """
+        Remove the sessions unused for more than `max_idle` seconds from the cache.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        if self.max_idle is None:
+            return 0
+
+        deadline = time.monotonic() - self.max_idle
+
+        with self.lock:
+            idle = [key for key in self.sessions if self.last_used[key] < deadline]
+
+            for key in idle:
+                del self.sessions[key]
+                del self.last_used[key]
+
+            return len(idle)
+
+    def clear(self) -> None:
+        """
+        Remove all the sessions from the cache.
+        """
+        with self.lock:
+            self.sessions.clear()
+            self.last_used.clear()
+
+    def memory(self) -> int:
+        """
+        Get the size of the model files of the cached sessions.
+
+        Returns:
+            int: The size in bytes.
+        """
+        with self.lock:
+            return sum(session.model_size() for session in self.sessions.values())
+
+    def shrink(self) -> None:
+        """
+        Evict the least recently used sessions until the cache fits its limits.
+        """
+        with self.lock:
+            while len(self.sessions) > 1 and (
+                (
+                    self.max_sessions is not None
+                    and len(self.sessions) > self.max_sessions
+                )
+                or (self.max_memory is not None and self.memory() > self.max_memory)
+            ):
+                key, _ = self.sessions.popitem(last=False)
+                del self.last_used[key]
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+
+session_cache = SessionCache(
+    max_sessions=int(os.getenv("REMBG_SESSION_CACHE_SIZE", "4")),
+    max_memory=(
+        int(float(os.environ["REMBG_SESSION_CACHE_MEMORY"]) * 1024 * 1024)
+        if "REMBG_SESSION_CACHE_MEMORY" in os.environ
+        else None
+    ),
+)
+
+
+def get_session(model_name: str = "u2net", *args, **kwargs) -> BaseSession:
+    """
+    Get a session from the process-wide session cache, creating it on the first call.
+
+    Unlike `new_session`, repeated calls with the same model name and model arguments return the same session, so a model is loaded once per process. The cache holds up to `REMBG_SESSION_CACHE_SIZE` sessions (4 by default) and, if `REMBG_SESSION_CACHE_MEMORY` is set, up to that many megabytes of model files.
+
+    Parameters:
+        model_name (str): The name of the model.
+        *args: Additional positional arguments.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        BaseSession: The cached session.
+    """
+    return session_cache.get(model_name, *args, **kwargs)
+
+
+def evict(model_name: str, **kwargs) -> bool:
+    """
+    Remove the session of a model from the process-wide session cache.
+
+    Parameters:
+        model_name (str): The name of the model.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        bool: True if a session was removed.
+    """
+    return session_cache.evict(model_name, **kwargs)
+
+
+def clear() -> None:
+    """
+    Remove all the sessions from the process-wide session cache.
+    """
+    session_cache.clear()
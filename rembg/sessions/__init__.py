@@ -1,86 +1,126 @@
 from __future__ import annotations
 
-from typing import Dict, List
+import importlib
+from typing import Any, Dict, Iterator, List, MutableMapping, Tuple
 
 from .base import BaseSession
+from .generic import GenericSession, ModelSpec
+
+# The session classes, by model name, as the module and the name of the class.
+# A module is imported only when its class is first used, as some of them pull
+# in heavy dependencies.
+session_classes: Dict[str, Tuple[str, str]] = {
+    "birefnet-general": ("birefnet_general", "BiRefNetSessionGeneral"),
+    "birefnet-general-lite": ("birefnet_general_lite", "BiRefNetSessionGeneralLite"),
+    "birefnet-portrait": ("birefnet_portrait", "BiRefNetSessionPortrait"),
+    "birefnet-dis": ("birefnet_dis", "BiRefNetSessionDIS"),
+    "birefnet-hrsod": ("birefnet_hrsod", "BiRefNetSessionHRSOD"),
+    "birefnet-cod": ("birefnet_cod", "BiRefNetSessionCOD"),
+    "birefnet-massive": ("birefnet_massive", "BiRefNetSessionMassive"),
+    "isnet-anime": ("dis_anime", "DisSession"),
+    "dis_custom": ("dis_custom", "DisCustomSession"),
+    "isnet-general-use": ("dis_general_use", "DisSession"),
+    "sam": ("sam", "SamSession"),
+    "silueta": ("silueta", "SiluetaSession"),
+    "u2net_cloth_seg": ("u2net_cloth_seg", "Unet2ClothSession"),
+    "u2net_custom": ("u2net_custom", "U2netCustomSession"),
+    "u2net_human_seg": ("u2net_human_seg", "U2netHumanSegSession"),
+    "u2net": ("u2net", "U2netSession"),
+    "u2netp": ("u2netp", "U2netpSession"),
+    "bria-rmbg": ("bria_rmbg", "BriaRmBgSession"),
+    "ben_custom": ("ben_custom", "BenCustomSession"),
+}
+
+# The names the session classes were exported under, when it is not their own
+aliases = {"DisSessionGeneralUse": "isnet-general-use"}
+
+
+class SessionRegistry(MutableMapping[str, type[BaseSession]]):
+    """
+    Map the model names to their session classes, importing the module of a class on first access.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an instance of the SessionRegistry class.
+        """
+        self.classes: Dict[str, type[BaseSession]] = {}
+        self.names: List[str] = list(session_classes)
+
+    def __getitem__(self, name: str) -> type[BaseSession]:
+        """
+        Get the session class of a model, importing its module if needed.
+
+        Parameters:
+            name (str): The name of the model.
+
+        Raises:
+            KeyError: If there is no session class for the model.
+
+        Returns:
+            type[BaseSession]: The session class.
+        """
+        if name not in self.classes:
+            if name not in self.names:
+                raise KeyError(name)
+
+            module_name, class_name = session_classes[name]
+            module = importlib.import_module(f".{module_name}", __name__)
+            self.classes[name] = getattr(module, class_name)
+
+        return self.classes[name]
+
+    def __setitem__(self, name: str, session_class: type[BaseSession]) -> None:
+        """
+        Register the session class of a model.
+
+        Parameters:
+            name (str): The name of the model.
+            session_class (type[BaseSession]): The session class.
+
+        Returns:
+            None
+        """
+        self.classes[name] = session_class
+
+        if name not in self.names:
+            self.names.append(name)
+
+    def __delitem__(self, name: str) -> None:
+        """
+        Unregister the session class of a model.
+
+        Parameters:
+            name (str): The name of the model.
+
+        Returns:
+            None
+        """
+        self.names.remove(name)
+        self.classes.pop(name, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.names))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+sessions: SessionRegistry = SessionRegistry()
 
-sessions: Dict[str, type[BaseSession]] = {}
-
-from .birefnet_general import BiRefNetSessionGeneral
-
-sessions[BiRefNetSessionGeneral.name()] = BiRefNetSessionGeneral
-
-from .birefnet_general_lite import BiRefNetSessionGeneralLite
-
-sessions[BiRefNetSessionGeneralLite.name()] = BiRefNetSessionGeneralLite
-
-from .birefnet_portrait import BiRefNetSessionPortrait
-
-sessions[BiRefNetSessionPortrait.name()] = BiRefNetSessionPortrait
-
-from .birefnet_dis import BiRefNetSessionDIS
-
-sessions[BiRefNetSessionDIS.name()] = BiRefNetSessionDIS
-
-from .birefnet_hrsod import BiRefNetSessionHRSOD
-
-sessions[BiRefNetSessionHRSOD.name()] = BiRefNetSessionHRSOD
-
-from .birefnet_cod import BiRefNetSessionCOD
-
-sessions[BiRefNetSessionCOD.name()] = BiRefNetSessionCOD
-
-from .birefnet_massive import BiRefNetSessionMassive
-
-sessions[BiRefNetSessionMassive.name()] = BiRefNetSessionMassive
-
-from .dis_anime import DisSession
-
-sessions[DisSession.name()] = DisSession
-
-from .dis_custom import DisCustomSession
-
-sessions[DisCustomSession.name()] = DisCustomSession
-
-from .dis_general_use import DisSession as DisSessionGeneralUse
-
-sessions[DisSessionGeneralUse.name()] = DisSessionGeneralUse
-
-from .sam import SamSession
-
-sessions[SamSession.name()] = SamSession
-
-from .silueta import SiluetaSession
-
-sessions[SiluetaSession.name()] = SiluetaSession
-
-from .u2net_cloth_seg import Unet2ClothSession
-
-sessions[Unet2ClothSession.name()] = Unet2ClothSession
-
-from .u2net_custom import U2netCustomSession
-
-sessions[U2netCustomSession.name()] = U2netCustomSession
-
-from .u2net_human_seg import U2netHumanSegSession
-
-sessions[U2netHumanSegSession.name()] = U2netHumanSegSession
-
-from .u2net import U2netSession
-
-sessions[U2netSession.name()] = U2netSession
-
-from .u2netp import U2netpSession
-
-sessions[U2netpSession.name()] = U2netpSession
+sessions_names = list(sessions.keys())
 
-from .bria_rmbg import BriaRmBgSession
 
-sessions[BriaRmBgSession.name()] = BriaRmBgSession
+def __getattr__(name: str) -> Any:
+    # The session classes, and the list of all of them, are imported on first access
+    if name == "sessions_class":
+        return list(sessions.values())
 
-from .ben_custom import BenCustomSession
+    if name in aliases:
+        return sessions[aliases[name]]
 
-sessions[BenCustomSession.name()] = BenCustomSession
+    for model_name, (_, class_name) in session_classes.items():
+        if class_name == name:
+            return sessions[model_name]
 
-sessions_names = list(sessions.keys())
-sessions_class = list(sessions.values())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
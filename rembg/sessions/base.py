@@ -1,11 +1,40 @@
 import os
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import onnxruntime as ort
-from PIL import Image
+from onnxruntime.capi.onnxruntime_pybind11_state import (
+    Fail,
+    InvalidArgument,
+    RuntimeException,
+)
 from PIL.Image import Image as PILImage
 
+from ..optimization import inference_session
+from ..postprocessing import normalize_prediction, resize_mask, smooth_mask
+from ..preprocessing import Preprocessor, interpolations
+from ..profiling import stage
+from ..pruning import find_pruned_model
+from ..quantization import find_quantized_model, precisions
+
+
+def is_batch_error(error: Exception) -> bool:
+    """
+    Check whether an error of onnxruntime comes from a model that cannot run on a batch of images.
+
+    Such models reject the size of the batch axis of the inputs, or fail to reshape a tensor of the batch in their graph.
+
+    Parameters:
+        error (Exception): The error raised by running the model.
+
+    Returns:
+        bool: True if the error is about the shape of the inputs or of the tensors of the graph.
+    """
+    if isinstance(error, InvalidArgument):
+        return True
+
+    return isinstance(error, (Fail, RuntimeException)) and "shape" in str(error).lower()
+
 
 class BaseSession:
     """This is a base class for managing a session with a machine learning model."""
@@ -13,6 +42,7 @@ class BaseSession:
     def __init__(self, model_name: str, sess_opts: ort.SessionOptions, *args, **kwargs):
         """Initialize an instance of the BaseSession class."""
         self.model_name = model_name
+        self.batching: Optional[bool] = None
 
         device_type = ort.get_device()
         if (
@@ -28,11 +58,32 @@ class BaseSession:
         else:
             providers = ["CPUExecutionProvider"]
 
-        self.inner_session = ort.InferenceSession(
-            str(self.__class__.download_models(*args, **kwargs)),
-            sess_options=sess_opts,
-            providers=providers,
+        self.precision = kwargs.get("precision") or "fp32"
+        self.model_paths = self.__class__.resolve_model_paths(*args, **kwargs)
+        self.inner_session = inference_session(
+            self.model_paths[0], sess_opts, providers
+        )
+        self.input_name = self.inner_session.get_inputs()[0].name
+
+        # Only fetch the outputs the session uses, unless the model was pruned
+        # down to them
+        outputs = self.inner_session.get_outputs()
+        indices = self.output_indices()
+        self.output_names: Optional[List[str]] = (
+            [outputs[i].name for i in indices]
+            if indices is not None and len(outputs) > len(indices)
+            else None
         )
+        self.preprocessor = Preprocessor(kwargs.get("interpolation"))
+        self.mask_interpolation = kwargs.get("mask_interpolation")
+
+        if (
+            self.mask_interpolation is not None
+            and self.mask_interpolation not in interpolations
+        ):
+            raise ValueError(
+                f"Unknown mask interpolation '{self.mask_interpolation}', expected one of: {', '.join(interpolations)}"
+            )
 
     def normalize(
         self,
@@ -41,29 +92,199 @@ class BaseSession:
         std: Tuple[float, float, float],
         size: Tuple[int, int],
         *args,
-        **kwargs
+        out: Optional[np.ndarray] = None,
+        **kwargs,
     ) -> Dict[str, np.ndarray]:
-        im = img.convert("RGB").resize(size, Image.Resampling.LANCZOS)
+        """
+        Resize and normalize an image into the input of the model.
 
-        im_ary = np.array(im)
-        im_ary = im_ary / max(np.max(im_ary), 1e-6)
+        Parameters:
+            img (PILImage): The input image.
+            mean (Tuple[float, float, float]): The mean of each channel.
+            std (Tuple[float, float, float]): The standard deviation of each channel.
+            size (Tuple[int, int]): The width and height of the input of the model.
+            out (Optional[np.ndarray], optional): A float32 array of shape (1, 3, height, width) to write the input to. Defaults to a buffer reused by the next call from the same thread.
 
-        tmpImg = np.zeros((im_ary.shape[0], im_ary.shape[1], 3))
-        tmpImg[:, :, 0] = (im_ary[:, :, 0] - mean[0]) / std[0]
-        tmpImg[:, :, 1] = (im_ary[:, :, 1] - mean[1]) / std[1]
-        tmpImg[:, :, 2] = (im_ary[:, :, 2] - mean[2]) / std[2]
+        Returns:
+            Dict[str, np.ndarray]: The input of the model.
+        """
+        with stage("normalize", self.model_name):
+            return {
+                self.input_name: self.preprocessor.normalize(
+                    img, mean, std, size, out=out
+                )
+            }
 
-        tmpImg = tmpImg.transpose((2, 0, 1))
+    def normalize_batch(
+        self,
+        imgs: List[PILImage],
+        mean: Tuple[float, float, float],
+        std: Tuple[float, float, float],
+        size: Tuple[int, int],
+        *args,
+        **kwargs,
+    ) -> List[Dict[str, np.ndarray]]:
+        """
+        Resize and normalize a list of images into inputs of the model, for `run_batch`.
+
+        A single image is normalized into the buffer reused by the current thread, while several images each get their own array, as they are all alive until the batch runs.
+
+        Parameters:
+            imgs (List[PILImage]): The input images.
+            mean (Tuple[float, float, float]): The mean of each channel.
+            std (Tuple[float, float, float]): The standard deviation of each channel.
+            size (Tuple[int, int]): The width and height of the input of the model.
+
+        Returns:
+            List[Dict[str, np.ndarray]]: The input of the model for each image.
+        """
+        if len(imgs) == 1:
+            return [self.normalize(imgs[0], mean, std, size)]
+
+        return [
+            self.normalize(
+                img,
+                mean,
+                std,
+                size,
+                out=np.empty((1, 3, size[1], size[0]), dtype=np.float32),
+            )
+            for img in imgs
+        ]
+
+    def prediction_mask(
+        self, img: PILImage, pred: np.ndarray, *args, sigmoid: bool = False, **kwargs
+    ) -> PILImage:
+        """
+        Turn the prediction of the model for an image into its mask.
+
+        Every operation on the mask runs at the resolution of the model and the mask is resized to the size of the image once, last. When `post_process_mask` is set, the mask is smoothed at the resolution of the model, by an opening and a blur scaled to have the effect they have on the image, and thresholded once resized. Post-processed masks are marked as such in their `info`, so that `remove` does not post-process them again.
 
-        return {
-            self.inner_session.get_inputs()[0]
-            .name: np.expand_dims(tmpImg, 0)
-            .astype(np.float32)
-        }
+        Parameters:
+            img (PILImage): The input image.
+            pred (np.ndarray): The prediction of the model for the image.
+            sigmoid (bool, optional): Flag indicating whether to apply a sigmoid to the prediction, for models predicting logits. Defaults to False.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            PILImage: The mask, of the size of the image.
+        """
+        mask = normalize_prediction(pred, sigmoid)
+        post_processed = bool(kwargs.get("post_process_mask", False))
+
+        if post_processed:
+            with stage("post_process", self.model_name):
+                mask = smooth_mask(
+                    mask, min(mask.shape[1] / img.width, mask.shape[0] / img.height)
+                )
+
+        with stage("mask_resize", self.model_name):
+            resized = resize_mask(
+                mask, img.size, self.mask_interpolation, binary=post_processed
+            )
+
+        resized.info["post_processed"] = post_processed
+
+        return resized
+
+    def model_size(self) -> int:
+        """
+        Get the size of the model files loaded by the session.
+
+        Returns:
+            int: The size in bytes of the model files, used to estimate the memory held by the session.
+        """
+        return sum(
+            os.path.getsize(path) for path in self.model_paths if os.path.exists(path)
+        )
+
+    def run_batch(self, inputs: List[Dict[str, np.ndarray]]) -> List[List[np.ndarray]]:
+        """
+        Run the inner session over a list of single-image inputs.
+
+        When the model accepts a dynamic batch axis, the inputs are stacked along it and
+        run once; otherwise, or if the batched run fails, each input is run on its own.
+        Batching is disabled for the next calls only when the model rejects the batch.
+        The outputs are split back so that each input gets its own list of outputs.
+
+        Parameters:
+            inputs (List[Dict[str, np.ndarray]]): The inputs, as returned by `normalize`.
+
+        Returns:
+            List[List[np.ndarray]]: The outputs of the model for each input.
+        """
+        with stage("inference", self.model_name):
+            if len(inputs) > 1 and self.supports_batching():
+                try:
+                    ort_outs = self.inner_session.run(
+                        self.output_names,
+                        {
+                            name: np.concatenate([i[name] for i in inputs], axis=0)
+                            for name in inputs[0]
+                        },
+                    )
+
+                    return [
+                        [o[i : i + 1] for o in ort_outs] for i in range(len(inputs))
+                    ]
+                except Exception as e:
+                    # Errors unrelated to the batch, such as running out of
+                    # memory, only fall back for this call
+                    if is_batch_error(e):
+                        self.batching = False
+
+            return [self.inner_session.run(self.output_names, i) for i in inputs]
+
+    def supports_batching(self) -> bool:
+        """
+        Check whether the model accepts more than one image per run.
+
+        Returns:
+            bool: True if the batch axis of the model inputs is dynamic.
+        """
+        if self.batching is None:
+            self.batching = all(
+                not isinstance(i.shape[0], int) or i.shape[0] < 0
+                for i in self.inner_session.get_inputs()
+            )
+
+        return self.batching
 
     def predict(self, img: PILImage, *args, **kwargs) -> List[PILImage]:
         raise NotImplementedError
 
+    def predict_batch(
+        self, imgs: List[PILImage], *args, **kwargs
+    ) -> List[List[PILImage]]:
+        """
+        Predict the masks for a list of images.
+
+        This generic implementation calls `predict` once per image. Sessions whose
+        models can take a batch override it to run a single inference for all images.
+
+        Parameters:
+            imgs (List[PILImage]): The input images.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            List[List[PILImage]]: The list of masks for each input image.
+        """
+        return [self.predict(img, *args, **kwargs) for img in imgs]
+
+    @classmethod
+    def output_indices(cls) -> Optional[List[int]]:
+        """
+        Get the indices of the outputs of the model the session uses.
+
+        `run_batch` only fetches these outputs, in this order, and `rembg prune` drops the other ones from the model file.
+
+        Returns:
+            Optional[List[int]]: The indices of the used outputs, or None if all of them are used.
+        """
+        return None
+
     @classmethod
     def checksum_disabled(cls, *args, **kwargs):
         return os.getenv("MODEL_CHECKSUM_DISABLED", None) is not None
@@ -80,6 +301,48 @@ class BaseSession:
     def download_models(cls, *args, **kwargs):
         raise NotImplementedError
 
+    @classmethod
+    def resolve_model_paths(cls, *args, **kwargs) -> List[str]:
+        """
+        Download the model files of the session, and get the paths of the files it loads, without loading them.
+
+        Raises:
+            ValueError: If the precision is unknown, or if the model file of the precision does not exist.
+
+        Returns:
+            List[str]: The paths of the model files the session loads.
+        """
+        precision = kwargs.get("precision") or "fp32"
+
+        if precision not in precisions:
+            raise ValueError(
+                f"Unknown precision '{precision}', expected one of: {', '.join(precisions)}"
+            )
+
+        model_path = str(cls.download_models(*args, **kwargs))
+
+        return [
+            (
+                find_quantized_model(model_path)
+                if precision == "int8"
+                else find_pruned_model(model_path)
+            )
+        ]
+
+    @classmethod
+    def model_file_paths(cls, *args, **kwargs) -> List[str]:
+        """
+        Get the paths of the model files `download_models` saves, without downloading them.
+
+        Returns:
+            List[str]: The paths of the model files, which may not exist.
+        """
+        return [
+            os.path.join(
+                cls.u2net_home(*args, **kwargs), f"{cls.name(*args, **kwargs)}.onnx"
+            )
+        ]
+
     @classmethod
     def name(cls, *args, **kwargs):
         raise NotImplementedError
@@ -1,8 +1,6 @@
-import os
+from dataclasses import replace
 
-import pooch
-
-from . import BiRefNetSessionGeneral
+from .birefnet_general import BiRefNetSessionGeneral
 
 
 class BiRefNetSessionDIS(BiRefNetSessionGeneral):
@@ -10,43 +8,9 @@ class BiRefNetSessionDIS(BiRefNetSessionGeneral):
     This class represents a BiRefNet-DIS session, which is a subclass of BiRefNetSessionGeneral.
     """
 
-    @classmethod
-    def download_models(cls, *args, **kwargs):
-        """
-        Downloads the BiRefNet-DIS model file from a specific URL and saves it.
-
-        Parameters:
-            *args: Additional positional arguments.
-            **kwargs: Additional keyword arguments.
-
-        Returns:
-            str: The path to the downloaded model file.
-        """
-        fname = f"{cls.name(*args, **kwargs)}.onnx"
-        pooch.retrieve(
-            "https://github.com/danielgatis/rembg/releases/download/v0.0.0/BiRefNet-DIS-epoch_590.onnx",
-            (
-                None
-                if cls.checksum_disabled(*args, **kwargs)
-                else "md5:2d4d44102b446f33a4ebb2e56c051f2b"
-            ),
-            fname=fname,
-            path=cls.u2net_home(*args, **kwargs),
-            progressbar=True,
-        )
-
-        return os.path.join(cls.u2net_home(*args, **kwargs), fname)
-
-    @classmethod
-    def name(cls, *args, **kwargs):
-        """
-        Returns the name of the BiRefNet-DIS session.
-
-        Parameters:
-            *args: Additional positional arguments.
-            **kwargs: Additional keyword arguments.
-
-        Returns:
-            str: The name of the session.
-        """
-        return "birefnet-dis"
+    spec = replace(
+        BiRefNetSessionGeneral.spec,
+        name="birefnet-dis",
+        url="https://github.com/danielgatis/rembg/releases/download/v0.0.0/BiRefNet-DIS-epoch_590.onnx",
+        checksum="md5:2d4d44102b446f33a4ebb2e56c051f2b",
+    )
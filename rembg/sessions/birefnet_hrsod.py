@@ -1,8 +1,6 @@
-import os
+from dataclasses import replace
 
-import pooch
-
-from . import BiRefNetSessionGeneral
+from .birefnet_general import BiRefNetSessionGeneral
 
 
 class BiRefNetSessionHRSOD(BiRefNetSessionGeneral):
@@ -10,43 +8,9 @@ class BiRefNetSessionHRSOD(BiRefNetSessionGeneral):
     This class represents a BiRefNet-HRSOD session, which is a subclass of BiRefNetSessionGeneral.
     """
 
-    @classmethod
-    def download_models(cls, *args, **kwargs):
-        """
-        Downloads the BiRefNet-HRSOD model file from a specific URL and saves it.
-
-        Parameters:
-            *args: Additional positional arguments.
-            **kwargs: Additional keyword arguments.
-
-        Returns:
-            str: The path to the downloaded model file.
-        """
-        fname = f"{cls.name(*args, **kwargs)}.onnx"
-        pooch.retrieve(
-            "https://github.com/danielgatis/rembg/releases/download/v0.0.0/BiRefNet-HRSOD_DHU-epoch_115.onnx",
-            (
-                None
-                if cls.checksum_disabled(*args, **kwargs)
-                else "md5:c017ade5de8a50ff0fd74d790d268dda"
-            ),
-            fname=fname,
-            path=cls.u2net_home(*args, **kwargs),
-            progressbar=True,
-        )
-
-        return os.path.join(cls.u2net_home(*args, **kwargs), fname)
-
-    @classmethod
-    def name(cls, *args, **kwargs):
-        """
-        Returns the name of the BiRefNet-HRSOD session.
-
-        Parameters:
-            *args: Additional positional arguments.
-            **kwargs: Additional keyword arguments.
-
-        Returns:
-            str: The name of the session.
-        """
-        return "birefnet-hrsod"
+    spec = replace(
+        BiRefNetSessionGeneral.spec,
+        name="birefnet-hrsod",
+        url="https://github.com/danielgatis/rembg/releases/download/v0.0.0/BiRefNet-HRSOD_DHU-epoch_115.onnx",
+        checksum="md5:c017ade5de8a50ff0fd74d790d268dda",
+    )
@@ -0,0 +1,185 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import onnxruntime as ort
+from PIL.Image import Image as PILImage
+
+from ..verification import retrieve
+from .base import BaseSession
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """
+    The description of a model predicting a single mask, from which `GenericSession` runs it.
+
+    Attributes:
+        name (str): The name of the model, also the name of its file in `U2NET_HOME`.
+        url (Optional[str]): The URL the model is downloaded from, or None for custom models loaded from `model_path`.
+        checksum (Optional[str]): The checksum of the model file, as "md5:..." or "sha256:...".
+        size (Tuple[int, int]): The width and height of the input of the model.
+        mean (Tuple[float, float, float]): The mean of each channel the input is normalized with.
+        std (Tuple[float, float, float]): The standard deviation of each channel the input is normalized with.
+        activation (Optional[str]): The activation applied to the prediction, "sigmoid" for models predicting logits, or None.
+        output_index (int): The index of the output of the model holding the mask.
+    """
+
+    name: str
+    url: Optional[str] = None
+    checksum: Optional[str] = None
+    size: Tuple[int, int] = (320, 320)
+    mean: Tuple[float, float, float] = (0.485, 0.456, 0.406)
+    std: Tuple[float, float, float] = (0.229, 0.224, 0.225)
+    activation: Optional[str] = None
+    output_index: int = 0
+
+
+class GenericSession(BaseSession):
+    """
+    A session running the model described by the `spec` of its class.
+
+    Every model that predicts a single mask is a subclass of this class with its own spec, so that batching, buffer reuse and mask resizing work the same for all of them.
+    """
+
+    spec: ModelSpec
+
+    def __init__(self, model_name: str, sess_opts: ort.SessionOptions, *args, **kwargs):
+        """
+        Initialize an instance of the GenericSession class.
+
+        Parameters:
+            model_name (str): The name of the model.
+            sess_opts (ort.SessionOptions): The session options.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Raises:
+            ValueError: If the model is a custom model and model_path is None.
+        """
+        if self.spec.url is None and kwargs.get("model_path") is None:
+            raise ValueError("model_path is required")
+
+        super().__init__(model_name, sess_opts, *args, **kwargs)
+
+    def predict(self, img: PILImage, *args, **kwargs) -> List[PILImage]:
+        """
+        Predicts the output masks for the input image using the inner session.
+
+        Parameters:
+            img (PILImage): The input image.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            List[PILImage]: The list of output masks.
+        """
+        return self.predict_batch([img], *args, **kwargs)[0]
+
+    def predict_batch(
+        self, imgs: List[PILImage], *args, **kwargs
+    ) -> List[List[PILImage]]:
+        """
+        Predicts the output masks for a list of input images in a single inference.
+
+        Parameters:
+            imgs (List[PILImage]): The input images.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            List[List[PILImage]]: The list of output masks for each input image.
+        """
+        spec = self.spec
+        ort_outs = self.run_batch(
+            self.normalize_batch(imgs, spec.mean, spec.std, spec.size)
+        )
+
+        return [
+            [
+                self.prediction_mask(
+                    img,
+                    ort_out[0][:, 0, :, :],
+                    *args,
+                    sigmoid=spec.activation == "sigmoid",
+                    **kwargs,
+                )
+            ]
+            for img, ort_out in zip(imgs, ort_outs)
+        ]
+
+    @classmethod
+    def output_indices(cls) -> Optional[List[int]]:
+        """
+        Returns the index of the output of the model holding the mask, the only one used.
+
+        Returns:
+            Optional[List[int]]: The index of the output of the spec.
+        """
+        return [cls.spec.output_index]
+
+    @classmethod
+    def download_models(cls, *args, **kwargs):
+        """
+        Downloads the model file from the URL of the spec and saves it, or returns the path of a custom model.
+
+        Parameters:
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Raises:
+            ValueError: If the model is a custom model and model_path is None.
+
+        Returns:
+            str: The path to the model file.
+        """
+        if cls.spec.url is None:
+            model_path = kwargs.get("model_path")
+            if model_path is None:
+                raise ValueError("model_path is required")
+
+            return os.path.abspath(os.path.expanduser(model_path))
+
+        return retrieve(
+            cls.spec.url,
+            None if cls.checksum_disabled(*args, **kwargs) else cls.spec.checksum,
+            f"{cls.name(*args, **kwargs)}.onnx",
+            cls.u2net_home(*args, **kwargs),
+            verify=kwargs.get("verify", False),
+        )
+
+    @classmethod
+    def model_file_paths(cls, *args, **kwargs) -> List[str]:
+        """
+        Returns the path of the model file, without downloading it.
+
+        Parameters:
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            List[str]: The path of the model file, or none for a custom model without model_path.
+        """
+        if cls.spec.url is None:
+            model_path = kwargs.get("model_path")
+
+            if model_path is None:
+                return []
+
+            return [os.path.abspath(os.path.expanduser(model_path))]
+
+        return super().model_file_paths(*args, **kwargs)
+
+    @classmethod
+    def name(cls, *args, **kwargs):
+        """
+        Returns the name of the model of the session.
+
+        Parameters:
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            str: The name of the session.
+        """
+        return cls.spec.name
@@ -1,15 +1,19 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from typing import List
 
 import cv2
 import numpy as np
 import onnxruntime as ort
-import pooch
 from jsonschema import validate
 from PIL import Image
 from PIL.Image import Image as PILImage
 
+from ..downloader import concatenate
+from ..optimization import inference_session
+from ..profiling import stage
+from ..verification import retrieve
 from .base import BaseSession
 
 
@@ -101,15 +105,10 @@ class SamSession(BaseSession):
         """
         self.model_name = model_name
 
-        paths = self.__class__.download_models(*args, **kwargs)
-        self.encoder = ort.InferenceSession(
-            str(paths[0]),
-            sess_options=sess_opts,
-        )
-        self.decoder = ort.InferenceSession(
-            str(paths[1]),
-            sess_options=sess_opts,
-        )
+        self.model_paths = self.__class__.resolve_model_paths(*args, **kwargs)
+        self.encoder = inference_session(self.model_paths[0], sess_opts)
+        self.decoder = inference_session(self.model_paths[1], sess_opts)
+        self.encoder_input_name = self.encoder.get_inputs()[0].name
 
     def predict(
         self,
@@ -159,38 +158,39 @@ class SamSession(BaseSession):
 
         target_size = 1024
         input_size = (684, 1024)
-        encoder_input_name = self.encoder.get_inputs()[0].name
-
-        img = img.convert("RGB")
-        cv_image = np.array(img)
-        original_size = cv_image.shape[:2]
-
-        scale_x = input_size[1] / cv_image.shape[1]
-        scale_y = input_size[0] / cv_image.shape[0]
-        scale = min(scale_x, scale_y)
 
-        transform_matrix = np.array(
-            [
-                [scale, 0, 0],
-                [0, scale, 0],
-                [0, 0, 1],
-            ]
-        )
+        with stage("normalize", self.model_name):
+            img = img.convert("RGB")
+            cv_image = np.array(img)
+            original_size = cv_image.shape[:2]
+
+            scale_x = input_size[1] / cv_image.shape[1]
+            scale_y = input_size[0] / cv_image.shape[0]
+            scale = min(scale_x, scale_y)
+
+            transform_matrix = np.array(
+                [
+                    [scale, 0, 0],
+                    [0, scale, 0],
+                    [0, 0, 1],
+                ]
+            )
 
-        cv_image = cv2.warpAffine(
-            cv_image,
-            transform_matrix[:2],
-            (input_size[1], input_size[0]),
-            flags=cv2.INTER_LINEAR,
-        )
+            cv_image = cv2.warpAffine(
+                cv_image,
+                transform_matrix[:2],
+                (input_size[1], input_size[0]),
+                flags=cv2.INTER_LINEAR,
+            )
 
         ## encoder
 
         encoder_inputs = {
-            encoder_input_name: cv_image.astype(np.float32),
+            self.encoder_input_name: cv_image.astype(np.float32),
         }
 
-        encoder_output = self.encoder.run(None, encoder_inputs)
+        with stage("inference", self.model_name):
+            encoder_output = self.encoder.run(None, encoder_inputs)
         image_embedding = encoder_output[0]
 
         embedding = {
@@ -234,9 +234,12 @@ class SamSession(BaseSession):
             "orig_im_size": np.array(input_size, dtype=np.float32),
         }
 
-        masks, _, _ = self.decoder.run(None, decoder_inputs)
-        inv_transform_matrix = np.linalg.inv(transform_matrix)
-        masks = transform_masks(masks, original_size, inv_transform_matrix)
+        with stage("inference", self.model_name):
+            masks, _, _ = self.decoder.run(None, decoder_inputs)
+
+        with stage("mask_resize", self.model_name):
+            inv_transform_matrix = np.linalg.inv(transform_matrix)
+            masks = transform_masks(masks, original_size, inv_transform_matrix)
 
         mask = np.zeros((masks.shape[2], masks.shape[3], 3), dtype=np.uint8)
         for m in masks[0, :, :, :]:
@@ -259,68 +262,81 @@ class SamSession(BaseSession):
         Returns:
             tuple: A tuple containing the file paths of the downloaded encoder and decoder models.
         """
-        model_name = kwargs.get("sam_model", "sam_vit_b_01ec64")
-        quant = kwargs.get("sam_quant", False)
-
-        fname_encoder = f"{model_name}.encoder.onnx"
-        fname_decoder = f"{model_name}.decoder.onnx"
-
-        if quant:
-            fname_encoder = f"{model_name}.encoder.quant.onnx"
-            fname_decoder = f"{model_name}.decoder.quant.onnx"
-
-        pooch.retrieve(
-            f"https://github.com/danielgatis/rembg/releases/download/v0.0.0/{fname_encoder}",
-            None,
-            fname=fname_encoder,
-            path=cls.u2net_home(*args, **kwargs),
-            progressbar=True,
-        )
-
-        pooch.retrieve(
-            f"https://github.com/danielgatis/rembg/releases/download/v0.0.0/{fname_decoder}",
-            None,
-            fname=fname_decoder,
-            path=cls.u2net_home(*args, **kwargs),
-            progressbar=True,
-        )
+        path_encoder, path_decoder = cls.model_file_paths(*args, **kwargs)
+        fname_encoder = os.path.basename(path_encoder)
+        fname_decoder = os.path.basename(path_decoder)
+        home = cls.u2net_home(*args, **kwargs)
+
+        for fname in (fname_encoder, fname_decoder):
+            retrieve(
+                f"https://github.com/danielgatis/rembg/releases/download/v0.0.0/{fname}",
+                None,
+                fname,
+                home,
+            )
 
         if fname_encoder == "sam_vit_h_4b8939.encoder.onnx" and not os.path.exists(
-            os.path.join(
-                cls.u2net_home(*args, **kwargs), "sam_vit_h_4b8939.encoder_data.bin"
-            )
+            os.path.join(home, "sam_vit_h_4b8939.encoder_data.bin")
         ):
-            content = bytearray()
-
-            for i in range(1, 4):
-                pooch.retrieve(
-                    f"https://github.com/danielgatis/rembg/releases/download/v0.0.0/sam_vit_h_4b8939.encoder_data.{i}.bin",
-                    None,
-                    fname=f"sam_vit_h_4b8939.encoder_data.{i}.bin",
-                    path=cls.u2net_home(*args, **kwargs),
-                    progressbar=True,
+            fnames = [f"sam_vit_h_4b8939.encoder_data.{i}.bin" for i in range(1, 4)]
+
+            with ThreadPoolExecutor(max_workers=len(fnames)) as executor:
+                fbins = list(
+                    executor.map(
+                        lambda fname: retrieve(
+                            f"https://github.com/danielgatis/rembg/releases/download/v0.0.0/{fname}",
+                            None,
+                            fname,
+                            home,
+                        ),
+                        fnames,
+                    )
                 )
 
-                fbin = os.path.join(
-                    cls.u2net_home(*args, **kwargs),
-                    f"sam_vit_h_4b8939.encoder_data.{i}.bin",
-                )
-                content.extend(open(fbin, "rb").read())
+            concatenate(fbins, os.path.join(home, "sam_vit_h_4b8939.encoder_data.bin"))
+
+            for fbin in fbins:
                 os.remove(fbin)
 
-            with open(
-                os.path.join(
-                    cls.u2net_home(*args, **kwargs),
-                    "sam_vit_h_4b8939.encoder_data.bin",
-                ),
-                "wb",
-            ) as fp:
-                fp.write(content)
-
-        return (
-            os.path.join(cls.u2net_home(*args, **kwargs), fname_encoder),
-            os.path.join(cls.u2net_home(*args, **kwargs), fname_decoder),
-        )
+        return (path_encoder, path_decoder)
+
+    @classmethod
+    def resolve_model_paths(cls, *args, **kwargs) -> List[str]:
+        """
+        Class method to download the encoder and decoder model files and return their paths, without loading them.
+
+        Parameters:
+            cls: The class object.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            List[str]: The paths of the encoder and decoder model files.
+        """
+        return [str(path) for path in cls.download_models(*args, **kwargs)]
+
+    @classmethod
+    def model_file_paths(cls, *args, **kwargs) -> List[str]:
+        """
+        Class method to return the paths of the encoder and decoder model files, without downloading them.
+
+        Parameters:
+            cls: The class object.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            List[str]: The paths of the encoder and decoder model files.
+        """
+        model_name = kwargs.get("sam_model", "sam_vit_b_01ec64")
+        quant = kwargs.get("sam_quant", False) or kwargs.get("precision") == "int8"
+        suffix = ".quant.onnx" if quant else ".onnx"
+        home = cls.u2net_home(*args, **kwargs)
+
+        return [
+            os.path.join(home, f"{model_name}.encoder{suffix}"),
+            os.path.join(home, f"{model_name}.decoder{suffix}"),
+        ]
 
     @classmethod
     def name(cls, *args, **kwargs):
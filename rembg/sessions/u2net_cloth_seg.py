@@ -1,12 +1,12 @@
-import os
-from typing import List
+from typing import List, Optional
 
 import numpy as np
-import pooch
 from PIL import Image
 from PIL.Image import Image as PILImage
 from scipy.special import log_softmax
 
+from ..profiling import stage
+from ..verification import retrieve
 from .base import BaseSession
 
 palette1 = [
@@ -56,6 +56,16 @@ palette3 = [
 
 
 class Unet2ClothSession(BaseSession):
+    @classmethod
+    def output_indices(cls) -> Optional[List[int]]:
+        """
+        Returns the index of the output of the model holding the cloth categories, the only one used.
+
+        Returns:
+            Optional[List[int]]: The index of the first output.
+        """
+        return [0]
+
     def predict(self, img: PILImage, *args, **kwargs) -> List[PILImage]:
         """
         Predict the cloth category of an image.
@@ -73,21 +83,56 @@ class Unet2ClothSession(BaseSession):
         Returns:
             List[PILImage]: A list of images representing the predicted masks.
         """
-        ort_outs = self.inner_session.run(
-            None,
-            self.normalize(
-                img, (0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (768, 768)
-            ),
+        return self.predict_batch([img], *args, **kwargs)[0]
+
+    def predict_batch(
+        self, imgs: List[PILImage], *args, **kwargs
+    ) -> List[List[PILImage]]:
+        """
+        Predict the cloth categories of a list of images in a single inference.
+
+        Parameters:
+            imgs (List[PILImage]): The input images.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            List[List[PILImage]]: The list of predicted masks for each input image.
+        """
+        ort_outs = self.run_batch(
+            self.normalize_batch(
+                imgs, (0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (768, 768)
+            )
         )
 
-        pred = ort_outs
-        pred = log_softmax(pred[0], 1)
+        return [
+            self.cloth_masks(img, ort_out, *args, **kwargs)
+            for img, ort_out in zip(imgs, ort_outs)
+        ]
+
+    def cloth_masks(
+        self, img: PILImage, ort_outs: List[np.ndarray], *args, **kwargs
+    ) -> List[PILImage]:
+        """
+        Build the cloth category masks of an image from the outputs of the model.
+
+        Parameters:
+            img (PILImage): The input image.
+            ort_outs (List[np.ndarray]): The outputs of the model for the image.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            List[PILImage]: A list of images representing the predicted masks.
+        """
+        pred = log_softmax(ort_outs[0], 1)
         pred = np.argmax(pred, axis=1, keepdims=True)
         pred = np.squeeze(pred, 0)
         pred = np.squeeze(pred, 0)
 
         mask = Image.fromarray(pred.astype("uint8"), mode="L")
-        mask = mask.resize(img.size, Image.Resampling.LANCZOS)
+        with stage("mask_resize", self.model_name):
+            mask = mask.resize(img.size, Image.Resampling.LANCZOS)
 
         masks = []
 
@@ -126,21 +171,18 @@ class Unet2ClothSession(BaseSession):
 
     @classmethod
     def download_models(cls, *args, **kwargs):
-        fname = f"{cls.name(*args, **kwargs)}.onnx"
-        pooch.retrieve(
+        return retrieve(
             "https://github.com/danielgatis/rembg/releases/download/v0.0.0/u2net_cloth_seg.onnx",
             (
                 None
                 if cls.checksum_disabled(*args, **kwargs)
                 else "md5:2434d1f3cb744e0e49386c906e5a08bb"
             ),
-            fname=fname,
-            path=cls.u2net_home(*args, **kwargs),
-            progressbar=True,
+            f"{cls.name(*args, **kwargs)}.onnx",
+            cls.u2net_home(*args, **kwargs),
+            verify=kwargs.get("verify", False),
         )
 
-        return os.path.join(cls.u2net_home(*args, **kwargs), fname)
-
     @classmethod
     def name(cls, *args, **kwargs):
         return "u2net_cloth_seg"
@@ -0,0 +1,247 @@
+import json
+import os
+import statistics
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import onnxruntime as ort
+from PIL.Image import Image as PILImage
+
+from .sessions import sessions
+from .sessions.base import BaseSession
+
+modes = ("latency", "throughput")
+
+execution_modes = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def available_cpus() -> List[int]:
+    """
+    Get the CPUs the process may run on.
+
+    Returns:
+        List[int]: The ids of the CPUs.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+
+    return list(range(os.cpu_count() or 1))
+
+
+def profiles_path() -> str:
+    """
+    Get the path of the file the tuned profiles are stored in.
+
+    Returns:
+        str: The path of `tune.json`, in `U2NET_HOME`.
+    """
+    return os.path.join(BaseSession.u2net_home(), "tune.json")
+
+
+def load_profiles() -> Dict[str, Dict[str, Any]]:
+    """
+    Load the tuned profiles of all the models.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The profiles, by model name.
+    """
+    try:
+        with open(profiles_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_profile(model_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Load the tuned profile of a model.
+
+    Profiles are only used when the process may run on as many CPUs as the one they were tuned in, so that a `U2NET_HOME` copied to another machine, or a process restricted to fewer CPUs, does not run the wrong number of threads.
+
+    Parameters:
+        model_name (str): The name of the model.
+
+    Returns:
+        Optional[Dict[str, Any]]: The profile, or None if the model was not tuned on this machine.
+    """
+    profile = load_profiles().get(model_name)
+
+    if profile is None or profile.get("cpu_count") != len(available_cpus()):
+        return None
+
+    return profile
+
+
+def save_profile(model_name: str, profile: Dict[str, Any]) -> None:
+    """
+    Store the tuned profile of a model, replacing its previous one.
+
+    Parameters:
+        model_name (str): The name of the model.
+        profile (Dict[str, Any]): The profile.
+
+    Returns:
+        None
+    """
+    profiles = load_profiles()
+    profiles[model_name] = profile
+    path = profiles_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(profiles, f, indent=2)
+
+    os.replace(f"{path}.tmp", path)
+
+
+def profile_options(profile: Dict[str, Any]) -> ort.SessionOptions:
+    """
+    Create the session options of a profile.
+
+    Parameters:
+        profile (Dict[str, Any]): The profile.
+
+    Returns:
+        ort.SessionOptions: The session options.
+    """
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = profile["intra_op_num_threads"]
+    sess_opts.inter_op_num_threads = profile["inter_op_num_threads"]
+    sess_opts.execution_mode = execution_modes[profile["execution_mode"]]
+    spinning = "1" if profile["allow_spinning"] else "0"
+    sess_opts.add_session_config_entry("session.intra_op.allow_spinning", spinning)
+    sess_opts.add_session_config_entry("session.inter_op.allow_spinning", spinning)
+
+    return sess_opts
+
+
+def pin_threads(sess_opts: ort.SessionOptions, cores: List[int]) -> None:
+    """
+    Pin the intra-op threads of a session to CPUs.
+
+    Parameters:
+        sess_opts (ort.SessionOptions): The session options.
+        cores (List[int]): The CPUs, one per intra-op thread.
+
+    Returns:
+        None
+    """
+    # onnxruntime runs one intra-op thread on the calling thread and numbers
+    # the CPUs of the others from 1
+    if len(cores) > 1:
+        sess_opts.add_session_config_entry(
+            "session.intra_op_thread_affinities",
+            ";".join(str(core + 1) for core in cores[1:]),
+        )
+
+
+def candidate_profiles(mode: str, cpu_count: int) -> List[Dict[str, Any]]:
+    """
+    List the profiles to benchmark for a tuning mode.
+
+    The latency mode runs a single replica and tries powers of two of threads up to the number of CPUs. The throughput mode splits the CPUs between a power of two of replicas, each with its share of threads.
+
+    Parameters:
+        mode (str): "latency" or "throughput".
+        cpu_count (int): The number of CPUs.
+
+    Returns:
+        List[Dict[str, Any]]: The profiles.
+    """
+    counts = sorted({2**i for i in range(cpu_count.bit_length())} | {cpu_count})
+
+    if mode == "latency":
+        layouts = [(1, threads) for threads in counts]
+    else:
+        layouts = [(replicas, max(1, cpu_count // replicas)) for replicas in counts]
+
+    profiles = []
+
+    for replicas, threads in layouts:
+        for execution_mode, inter_threads in (("sequential", 1), ("parallel", 2)):
+            if execution_mode == "parallel" and threads < 2:
+                continue
+
+            for allow_spinning in (True, False):
+                profiles.append(
+                    {
+                        "replicas": replicas,
+                        "intra_op_num_threads": threads,
+                        "inter_op_num_threads": inter_threads,
+                        "execution_mode": execution_mode,
+                        "allow_spinning": allow_spinning,
+                    }
+                )
+
+    return profiles
+
+
+def measure_profile(
+    model_name: str,
+    profile: Dict[str, Any],
+    img: PILImage,
+    repeat: int,
+    **kwargs: Any,
+) -> Dict[str, float]:
+    """
+    Benchmark a profile, running its replicas concurrently over an image.
+
+    The threads of each replica are pinned to its own CPUs, as `SessionPool` does.
+
+    Parameters:
+        model_name (str): The name of the model.
+        profile (Dict[str, Any]): The profile.
+        img (PILImage): The image.
+        repeat (int): The number of timed runs per replica.
+        **kwargs: Additional keyword arguments of the sessions.
+
+    Returns:
+        Dict[str, float]: The median latency in seconds and the throughput in images per second.
+    """
+    cpus = available_cpus()
+    threads = profile["intra_op_num_threads"]
+    replicas = []
+
+    for i in range(profile["replicas"]):
+        sess_opts = profile_options(profile)
+        cores = cpus[i * threads : (i + 1) * threads]
+
+        if len(cores) == threads:
+            pin_threads(sess_opts, cores)
+
+        replicas.append(sessions[model_name](model_name, sess_opts, **kwargs))
+
+    for session in replicas:
+        session.predict(img)
+
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def run(session: BaseSession) -> None:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            session.predict(img)
+            latency = time.perf_counter() - start
+
+            with lock:
+                latencies.append(latency)
+
+    threads = [threading.Thread(target=run, args=(session,)) for session in replicas]
+    start = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    wall = time.perf_counter() - start
+
+    return {
+        "latency": statistics.median(latencies),
+        "throughput": len(latencies) / wall,
+    }
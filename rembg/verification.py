@@ -0,0 +1,173 @@
+import json
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .downloader import ResumableDownloader
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+
+def stamp_path(path: str) -> str:
+    """
+    Get the path of the stamp recording that a model file was verified.
+
+    Parameters:
+        path (str): The path of the model file.
+
+    Returns:
+        str: The path of the stamp, next to the model file.
+    """
+    return f"{path}.verified"
+
+
+def file_key(path: str, known_hash: str) -> dict:
+    """
+    Get what a stamp is keyed by: the path, the size and the modification time of a model file, and the hash it was verified against.
+
+    Parameters:
+        path (str): The path of the model file.
+        known_hash (str): The expected hash of the model file.
+
+    Returns:
+        dict: The key.
+    """
+    stat = os.stat(path)
+
+    return {
+        "path": os.path.realpath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "hash": known_hash,
+    }
+
+
+def is_verified(path: str, known_hash: str) -> bool:
+    """
+    Check whether a model file was verified against a hash, and has not changed since.
+
+    Parameters:
+        path (str): The path of the model file.
+        known_hash (str): The expected hash of the model file.
+
+    Returns:
+        bool: True if the stamp of the model file matches it.
+    """
+    try:
+        with open(stamp_path(path)) as f:
+            return json.load(f) == file_key(path, known_hash)
+    except (OSError, ValueError):
+        return False
+
+
+def stamp(path: str, known_hash: str) -> None:
+    """
+    Record that a model file matches a hash.
+
+    The stamp is only an optimization, so it is not an error if it cannot be written, for instance in a read-only `U2NET_HOME`.
+
+    Parameters:
+        path (str): The path of the model file.
+        known_hash (str): The hash the model file matches.
+
+    Returns:
+        None
+    """
+    try:
+        with open(stamp_path(path), "w") as f:
+            json.dump(file_key(path, known_hash), f)
+    except OSError:
+        pass
+
+
+@contextmanager
+def download_lock(path: str) -> Iterator[None]:
+    """
+    Hold an exclusive lock on the download of a model file, shared by all the processes.
+
+    The processes and threads retrieving the same model otherwise write the same partial file, and the first one to finish renames it away from under the others. The lock is a `.lock` file next to the model file, locked with `flock` where it is available, and not taken where it is not, or where the file cannot be created.
+
+    Parameters:
+        path (str): The path of the model file.
+
+    Returns:
+        Iterator[None]: A context holding the lock.
+    """
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        lock_file = open(f"{path}.lock", "a") if fcntl is not None else None
+    except OSError:
+        lock_file = None
+
+    if lock_file is None:
+        yield
+        return
+
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def retrieve(
+    url: str,
+    known_hash: Optional[str],
+    fname: str,
+    path: str,
+    verify: bool = False,
+) -> str:
+    """
+    Download a model file if it is missing, resuming an interrupted download, and verify it against its hash once.
+
+    `pooch.retrieve` hashes the whole file each time it is called, which for the largest models takes seconds on every session creation. Here, once a file matches its hash, a stamp next to it records its size and modification time, and the file is not hashed again until it changes or `verify` is set.
+
+    Parameters:
+        url (str): The URL to download the model file from.
+        known_hash (Optional[str]): The expected hash of the model file, as "md5:..." or "sha256:...", or None to skip the verification.
+        fname (str): The name of the model file.
+        path (str): The directory of the model file.
+        verify (bool, optional): Flag indicating whether to hash the model file even if it was already verified. Defaults to False.
+
+    Returns:
+        str: The path of the model file.
+    """
+    full_path = os.path.join(path, fname)
+
+    if (
+        known_hash is not None
+        and not verify
+        and os.path.exists(full_path)
+        and is_verified(full_path, known_hash)
+    ):
+        return full_path
+
+    import pooch
+
+    with download_lock(full_path):
+        # Downloaded and verified by another process while waiting for the lock
+        if (
+            known_hash is not None
+            and not verify
+            and os.path.exists(full_path)
+            and is_verified(full_path, known_hash)
+        ):
+            return full_path
+
+        full_path = pooch.retrieve(
+            url,
+            known_hash,
+            fname=fname,
+            path=path,
+            downloader=ResumableDownloader(f"{full_path}.part"),
+        )
+
+        if known_hash is not None:
+            stamp(full_path, known_hash)
+
+    return full_path
@@ -3,7 +3,7 @@ from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from rembg import remove
+from rembg.server import InferenceEngine
 from PIL import Image
 import io
 import base64
@@ -14,6 +14,17 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# 推理引擎：启动时预加载并预热模型，推理在线程池中执行，不阻塞事件循环
+engine = InferenceEngine.from_env()
+
+@app.on_event("startup")
+async def startup():
+    await engine.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await engine.stop()
+
 # 添加CORS中间件支持跨域请求
 app.add_middleware(
     CORSMiddleware,
@@ -64,7 +75,7 @@ async def remove_background_file(file: UploadFile = File(...)):
         image_data = await file.read()
         
         # 使用rembg去除背景
-        output_data = remove(image_data)
+        output_data = await engine.remove(image_data)
         
         # 返回处理后的图片
         return Response(
@@ -112,7 +123,7 @@ async def remove_background_base64(request_data: dict):
             raise HTTPException(status_code=400, detail="无效的base64图片数据")
         
         # 使用rembg去除背景
-        output_data = remove(image_data)
+        output_data = await engine.remove(image_data)
         
         # 将结果编码为base64
         result_base64 = base64.b64encode(output_data).decode('utf-8')
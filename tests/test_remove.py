@@ -1,30 +1,29 @@
 from io import BytesIO
 from pathlib import Path
 
+import pytest
 from imagehash import phash as hash_img
 from PIL import Image
 
-from rembg import new_session, remove
+from rembg import new_session, remove, remove_batch
 
 here = Path(__file__).parent.resolve()
 
+
 def test_remove():
     kwargs = {
         "sam": {
-            "anime-girl-1" : {
-                "sam_prompt" :[{"type": "point", "data": [400, 165], "label": 1}],
+            "anime-girl-1": {
+                "sam_prompt": [{"type": "point", "data": [400, 165], "label": 1}],
             },
-
-            "car-1" : {
-                "sam_prompt" :[{"type": "point", "data": [250, 200], "label": 1}],
+            "car-1": {
+                "sam_prompt": [{"type": "point", "data": [250, 200], "label": 1}],
             },
-
-            "cloth-1" : {
-                "sam_prompt" :[{"type": "point", "data": [370, 495], "label": 1}],
+            "cloth-1": {
+                "sam_prompt": [{"type": "point", "data": [370, 495], "label": 1}],
             },
-
-            "plants-1" : {
-                "sam_prompt" :[{"type": "point", "data": [724, 740], "label": 1}],
+            "plants-1": {
+                "sam_prompt": [{"type": "point", "data": [724, 740], "label": 1}],
             },
         }
     }
@@ -44,13 +43,17 @@ def test_remove():
         "birefnet-dis",
         "birefnet-hrsod",
         "birefnet-cod",
-        "birefnet-massive"
+        "birefnet-massive",
     ]:
         for picture in ["anime-girl-1", "car-1", "cloth-1", "plants-1"]:
             image_path = Path(here / "fixtures" / f"{picture}.jpg")
             image = image_path.read_bytes()
 
-            actual = remove(image, session=new_session(model), **kwargs.get(model, {}).get(picture, {}))
+            actual = remove(
+                image,
+                session=new_session(model),
+                **kwargs.get(model, {}).get(picture, {}),
+            )
             actual_hash = hash_img(Image.open(BytesIO(actual)))
 
             expected_path = Path(here / "results" / f"{picture}.{model}.png")
@@ -70,3 +73,884 @@ def test_remove():
             print("---\n")
 
             assert actual_hash == expected_hash
+
+
+def test_remove_batch():
+    session = new_session("u2net")
+    images = [
+        Path(here / "fixtures" / f"{picture}.jpg").read_bytes()
+        for picture in ["anime-girl-1", "car-1", "cloth-1", "plants-1"]
+    ]
+
+    actual = remove_batch(images, session=session, batch_size=3)
+    expected = [remove(image, session=session) for image in images]
+
+    assert len(actual) == len(expected)
+
+    for a, e in zip(actual, expected):
+        assert hash_img(Image.open(BytesIO(a))) == hash_img(Image.open(BytesIO(e)))
+
+
+def test_remove_profile():
+    session = new_session("u2net")
+    image = Path(here / "fixtures" / "car-1.jpg").read_bytes()
+    records = []
+
+    remove(image, session=session, on_stage=records.append)
+
+    stages = [record["stage"] for record in records]
+    assert stages[:5] == [
+        "decode",
+        "orientation",
+        "normalize",
+        "inference",
+        "mask_resize",
+    ]
+    assert stages[-1] == "encode"
+    assert all(record["wall"] >= 0 for record in records)
+
+
+def test_remove_alpha_matting_methods():
+    session = new_session("u2net")
+    image = Path(here / "fixtures" / "car-1.jpg").read_bytes()
+
+    for method in ["cf", "guided"]:
+        actual = remove(
+            image,
+            session=session,
+            alpha_matting=True,
+            alpha_matting_method=method,
+            force_return_bytes=True,
+        )
+        cutout = Image.open(BytesIO(actual))
+
+        assert cutout.mode == "RGBA"
+        assert cutout.size == Image.open(BytesIO(image)).size
+
+
+def test_alpha_matting_cutout_approximates_whole_image():
+    import numpy as np
+    from cv2 import GaussianBlur
+    from pymatting.alpha.estimate_alpha_cf import estimate_alpha_cf
+    from pymatting.foreground.estimate_foreground_ml import estimate_foreground_ml
+
+    from rembg.bg import alpha_matting_cutout, matting_trimap
+
+    img = Image.open(here / "fixtures" / "car-1.jpg").convert("RGB").resize((400, 300))
+    y, x = np.ogrid[:300, :400]
+    mask = ((((x - 200) / 120) ** 2 + ((y - 160) / 90) ** 2) < 1).astype(np.uint8) * 255
+    mask[40:70, 40:80] = 255
+    mask = GaussianBlur(mask, (0, 0), 4)
+
+    cutout = (
+        np.asarray(alpha_matting_cutout(img, Image.fromarray(mask), 240, 10, 10))
+        / 255.0
+    )
+    trimap = matting_trimap(mask, 240, 10, 10)
+    alpha = np.clip(estimate_alpha_cf(np.asarray(img) / 255.0, trimap / 255.0), 0, 1)
+    foreground = np.clip(estimate_foreground_ml(np.asarray(img) / 255.0, alpha), 0, 1)
+
+    # Within rounding of the whole image alpha, and of its premultiplied colors
+    # on average, the foreground being ill-defined where the alpha is low
+    assert np.abs(cutout[..., 3] - alpha).max() <= 2 / 255
+    assert (
+        np.abs(cutout[..., :3] * cutout[..., 3:] - foreground * alpha[..., None]).mean()
+        <= 0.01
+    )
+
+
+def test_remove_post_process_mask():
+    image = Path(here / "fixtures" / "car-1.jpg").read_bytes()
+
+    for session in [
+        new_session("u2net"),
+        new_session("u2net", mask_interpolation="linear"),
+    ]:
+        actual = remove(image, session=session, only_mask=True, post_process_mask=True)
+        mask = Image.open(BytesIO(actual))
+
+        assert mask.size == Image.open(BytesIO(image)).size
+        assert set(mask.getdata()) <= {0, 255}
+
+
+def test_prune_model(tmp_path):
+    onnx = pytest.importorskip("onnx")
+    import numpy as np
+    import onnxruntime as ort
+
+    from rembg.pruning import prune_model
+    from rembg.sessions import sessions
+
+    path = sessions["u2net"].download_models()
+    model = onnx.load(path)
+    outputs = [model.graph.output[0].name]
+
+    assert prune_model(model, outputs) > 0
+
+    pruned_path = str(tmp_path / "u2net.pruned.onnx")
+    onnx.save(model, pruned_path)
+
+    original = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    pruned = ort.InferenceSession(pruned_path, providers=["CPUExecutionProvider"])
+    inputs = {
+        original.get_inputs()[0].name: np.random.rand(1, 3, 320, 320).astype(np.float32)
+    }
+
+    assert [output.name for output in pruned.get_outputs()] == outputs
+    assert np.array_equal(original.run(outputs, inputs)[0], pruned.run(None, inputs)[0])
+
+
+def test_run_batch_disables_batching_on_batch_errors():
+    onnx = pytest.importorskip("onnx")
+    import numpy as np
+    import onnxruntime as ort
+
+    from rembg.sessions.base import BaseSession
+
+    # Reshapes the batch to the shape of a single image
+    graph = onnx.helper.make_graph(
+        [onnx.helper.make_node("Reshape", ["x", "shape"], ["y"])],
+        "reshape",
+        [onnx.helper.make_tensor_value_info("x", onnx.TensorProto.FLOAT, ["n", 12])],
+        [onnx.helper.make_tensor_value_info("y", onnx.TensorProto.FLOAT, None)],
+        [onnx.helper.make_tensor("shape", onnx.TensorProto.INT64, [2], [1, 12])],
+    )
+    model = onnx.helper.make_model(
+        graph, opset_imports=[onnx.helper.make_opsetid("", 13)], ir_version=8
+    )
+    inner_session = ort.InferenceSession(
+        model.SerializeToString(), providers=["CPUExecutionProvider"]
+    )
+
+    class FailingOnce:
+        def __init__(self, error):
+            self.error = error
+
+        def run(self, *args):
+            error, self.error = self.error, None
+
+            if error is not None:
+                raise error
+
+            return inner_session.run(*args)
+
+        def get_inputs(self):
+            return inner_session.get_inputs()
+
+    session = BaseSession.__new__(BaseSession)
+    session.model_name = "reshape"
+    session.output_names = None
+    inputs = [{"x": np.full((1, 12), i, dtype=np.float32)} for i in range(2)]
+
+    session.batching = None
+    session.inner_session = FailingOnce(MemoryError())
+    session.run_batch(inputs)
+
+    assert session.batching is True
+
+    session.inner_session = inner_session
+    outputs = session.run_batch(inputs)
+
+    assert session.batching is False
+    assert [output[0].tolist() for output in outputs] == [[[0.0] * 12], [[1.0] * 12]]
+
+
+def test_retrieve_verifies_once(tmp_path, monkeypatch):
+    import pooch
+
+    from rembg import verification
+
+    model = tmp_path / "model.onnx"
+    model.write_bytes(b"model")
+    known_hash = "md5:" + pooch.file_hash(str(model), "md5")
+    url = "https://example.com/model.onnx"
+
+    assert verification.retrieve(url, known_hash, model.name, str(tmp_path)) == str(
+        model
+    )
+    assert verification.is_verified(str(model), known_hash)
+
+    def retrieve(*args, **kwargs):
+        raise AssertionError("verified models are not hashed again")
+
+    monkeypatch.setattr(pooch, "retrieve", retrieve)
+    verification.retrieve(url, known_hash, model.name, str(tmp_path))
+
+    with pytest.raises(AssertionError):
+        verification.retrieve(url, known_hash, model.name, str(tmp_path), verify=True)
+
+    model.write_bytes(b"changed")
+    assert not verification.is_verified(str(model), known_hash)
+
+
+def test_retrieve_resumes_downloads(tmp_path):
+    import threading
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    import pooch
+
+    from rembg import verification
+
+    served = tmp_path / "served"
+    served.mkdir()
+    content = bytes(range(256)) * 4096
+    (served / "model.onnx").write_bytes(content)
+    ranges = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            ranges.append(self.headers.get("Range"))
+
+            if self.headers.get("Range") is None:
+                return super().do_GET()
+
+            start = int(self.headers["Range"][len("bytes=") :].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Length", str(len(content) - start))
+            self.end_headers()
+            self.wfile.write(content[start:])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(Handler, directory=served))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        home = tmp_path / "home"
+        home.mkdir()
+        (home / "model.onnx.part").write_bytes(content[:1000])
+        url = f"http://127.0.0.1:{server.server_address[1]}/model.onnx"
+        known_hash = "md5:" + pooch.file_hash(str(served / "model.onnx"), "md5")
+
+        path = verification.retrieve(url, known_hash, "model.onnx", str(home))
+
+        assert Path(path).read_bytes() == content
+        assert ranges == ["bytes=1000-"]
+        assert not (home / "model.onnx.part").exists()
+
+        (home / "model.onnx").unlink()
+        verification.retrieve(url, known_hash, "model.onnx", str(home), verify=True)
+
+        assert ranges == ["bytes=1000-", None]
+        assert (home / "model.onnx").read_bytes() == content
+    finally:
+        server.shutdown()
+
+
+def test_retrieve_concurrently(tmp_path):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    import pooch
+
+    from rembg import verification
+
+    served = tmp_path / "served"
+    served.mkdir()
+    content = bytes(range(256)) * 4096
+    (served / "model.onnx").write_bytes(content)
+    requests = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            # Slow enough for the downloads to overlap
+            requests.append(self.headers.get("Range"))
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+
+            for start in range(0, len(content), len(content) // 8):
+                self.wfile.write(content[start : start + len(content) // 8])
+                time.sleep(0.02)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(Handler, directory=served))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        home = tmp_path / "home"
+        url = f"http://127.0.0.1:{server.server_address[1]}/model.onnx"
+        known_hash = "md5:" + pooch.file_hash(str(served / "model.onnx"), "md5")
+
+        with ThreadPoolExecutor(3) as executor:
+            paths = list(
+                executor.map(
+                    lambda _: verification.retrieve(
+                        url, known_hash, "model.onnx", str(home)
+                    ),
+                    range(3),
+                )
+            )
+    finally:
+        server.shutdown()
+
+    assert paths == [str(home / "model.onnx")] * 3
+    assert (home / "model.onnx").read_bytes() == content
+    assert len(requests) == 1
+
+
+def test_inference_session_caches_optimized_models(tmp_path):
+    import shutil
+
+    import numpy as np
+    import onnxruntime as ort
+
+    from rembg.optimization import (
+        inference_session,
+        optimized_model_path,
+        optimized_model_paths,
+    )
+    from rembg.sessions import sessions
+
+    path = str(tmp_path / "u2net.onnx")
+    shutil.copy(sessions["u2net"].download_models(), path)
+    session = inference_session(path, ort.SessionOptions())
+    inputs = {
+        session.get_inputs()[0].name: np.random.rand(1, 3, 320, 320).astype(np.float32)
+    }
+    cached_paths = optimized_model_paths(path)
+    extended = ort.SessionOptions()
+    extended.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+
+    # The layout optimizations of the CPU are not saved
+    assert cached_paths == [optimized_model_path(path, extended)]
+
+    cached = inference_session(path, ort.SessionOptions())
+
+    assert optimized_model_paths(path) == cached_paths
+    assert [output.name for output in cached.get_outputs()] == [
+        output.name for output in session.get_outputs()
+    ]
+    assert np.allclose(
+        session.run(None, inputs)[0], cached.run(None, inputs)[0], atol=1e-5
+    )
+
+
+def test_inference_session_saves_initializers_externally(tmp_path):
+    onnx = pytest.importorskip("onnx")
+    import os
+
+    import numpy as np
+    import onnxruntime as ort
+
+    from rembg.optimization import inference_session, optimized_model_path
+
+    weights = np.random.rand(64, 64).astype(np.float32)
+    graph = onnx.helper.make_graph(
+        [onnx.helper.make_node("MatMul", ["x", "w"], ["y"])],
+        "matmul",
+        [onnx.helper.make_tensor_value_info("x", onnx.TensorProto.FLOAT, [1, 64])],
+        [onnx.helper.make_tensor_value_info("y", onnx.TensorProto.FLOAT, [1, 64])],
+        [onnx.numpy_helper.from_array(weights, "w")],
+    )
+    path = str(tmp_path / "matmul.onnx")
+    onnx.save(
+        onnx.helper.make_model(
+            graph, opset_imports=[onnx.helper.make_opsetid("", 13)], ir_version=8
+        ),
+        path,
+    )
+    inputs = {"x": np.random.rand(1, 64).astype(np.float32)}
+
+    session = inference_session(path, ort.SessionOptions())
+    optimized = optimized_model_path(path, ort.SessionOptions())
+
+    # Over the 1KB above which onnxruntime saves initializers externally
+    assert os.path.exists(f"{optimized}.{os.getpid()}.data")
+    assert os.path.getsize(optimized) < weights.nbytes
+
+    cached = inference_session(path, ort.SessionOptions())
+
+    assert np.allclose(session.run(None, inputs)[0], cached.run(None, inputs)[0])
+
+
+def test_inference_session_without_writable_cache(tmp_path):
+    import os
+    import shutil
+
+    import onnxruntime as ort
+
+    from rembg.optimization import (
+        inference_session,
+        optimized_model_path,
+        optimized_model_paths,
+    )
+    from rembg.sessions import sessions
+
+    path = str(tmp_path / "u2net.onnx")
+    shutil.copy(sessions["u2net"].download_models(), path)
+    sess_opts = ort.SessionOptions()
+    optimized = optimized_model_path(path, sess_opts)
+    # Unlike the permissions of the directory, which do not stop root, a
+    # directory in the way of the optimized model stops everyone
+    temporary = f"{optimized}.{os.getpid()}.tmp"
+    os.mkdir(temporary)
+
+    session = inference_session(path, sess_opts)
+
+    assert session.get_inputs()[0].shape[1:] == [3, 320, 320]
+    assert sorted(optimized_model_paths(path)) == sorted(
+        [f"{optimized}.failed", temporary]
+    )
+    assert sess_opts.optimized_model_filepath == ""
+
+    # Not tried again until the model changes
+    os.rmdir(temporary)
+    inference_session(path, sess_opts)
+
+    assert optimized_model_paths(path) == [f"{optimized}.failed"]
+
+    os.utime(path, (os.path.getmtime(path) + 1,) * 2)
+    inference_session(path, sess_opts)
+
+    assert os.path.exists(optimized)
+
+
+def test_remove_int8_precision(tmp_path, monkeypatch):
+    pytest.importorskip("onnx")
+    import shutil
+
+    from rembg.quantization import mask_iou, quantize_model, quantized_model_path
+    from rembg.sessions import sessions
+
+    path = str(tmp_path / "u2net.onnx")
+    shutil.copy(sessions["u2net"].download_models(), path)
+    monkeypatch.setenv("U2NET_HOME", str(tmp_path))
+    monkeypatch.setenv("MODEL_CHECKSUM_DISABLED", "1")
+
+    with pytest.raises(ValueError):
+        new_session("u2net", precision="int8")
+
+    quantize_model(path, quantized_model_path(path))
+    image = Path(here / "fixtures" / "car-1.jpg").read_bytes()
+    masks = [
+        Image.open(
+            BytesIO(
+                remove(
+                    image,
+                    session=new_session("u2net", precision=precision),
+                    only_mask=True,
+                )
+            )
+        )
+        for precision in ["fp32", "int8"]
+    ]
+
+    assert mask_iou(*masks) > 0.9
+
+
+def test_new_session_uses_tuned_profile(tmp_path, monkeypatch):
+    import shutil
+
+    import onnxruntime as ort
+
+    from rembg.sessions import sessions
+    from rembg.tuning import (
+        available_cpus,
+        candidate_profiles,
+        load_profile,
+        save_profile,
+    )
+
+    shutil.copy(sessions["u2net"].download_models(), tmp_path / "u2net.onnx")
+    monkeypatch.setenv("U2NET_HOME", str(tmp_path))
+    monkeypatch.setenv("MODEL_CHECKSUM_DISABLED", "1")
+    monkeypatch.delenv("OMP_NUM_THREADS", raising=False)
+
+    profile = next(
+        profile
+        for profile in candidate_profiles("throughput", 4)
+        if profile["replicas"] > 1 and profile["execution_mode"] == "parallel"
+    )
+    profile.update({"mode": "throughput", "cpu_count": len(available_cpus())})
+    save_profile("u2net", profile)
+
+    assert load_profile("u2net") == profile
+    assert load_profile("u2netp") is None
+
+    # A single session gets the threads of all the replicas of the profile
+    options = new_session("u2net").inner_session.get_session_options()
+
+    assert (
+        options.intra_op_num_threads
+        == profile["intra_op_num_threads"] * profile["replicas"]
+    )
+
+    pool = new_session("u2net", replicas="auto")
+
+    assert len(pool.replicas) == profile["replicas"]
+
+    # The replicas keep the tuned inter-op threads and execution mode
+    for replica in pool.replicas:
+        options = replica.inner_session.get_session_options()
+
+        assert options.inter_op_num_threads == profile["inter_op_num_threads"]
+        assert options.execution_mode == ort.ExecutionMode.ORT_PARALLEL
+
+
+def test_micro_batcher_runs_the_first_function():
+    import asyncio
+
+    from rembg.batching import MicroBatcher
+
+    async def main():
+        batcher = MicroBatcher(max_batch_size=2, max_wait=60)
+
+        return await asyncio.gather(
+            batcher.submit("u2net", 1, lambda items: [("first", i) for i in items]),
+            batcher.submit("u2net", 2, lambda items: [("last", i) for i in items]),
+        )
+
+    assert asyncio.run(main()) == [("first", 1), ("first", 2)]
+
+
+def test_remove_session_pool():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from rembg.session_factory import SessionPool
+
+    pool = new_session("u2net", replicas=2)
+    image = Path(here / "fixtures" / "car-1.jpg").read_bytes()
+
+    assert isinstance(pool, SessionPool)
+    assert len(pool.replicas) == 2
+
+    with ThreadPoolExecutor(4) as executor:
+        actual = list(
+            executor.map(
+                lambda _: remove(image, session=pool, only_mask=True), range(4)
+            )
+        )
+
+    expected = remove(image, session=new_session("u2net"), only_mask=True)
+
+    assert all(mask == expected for mask in actual)
+    assert pool.busy == [0, 0]
+
+
+def test_session_key_includes_pool_options():
+    from rembg.session_factory import session_key
+
+    keys = {
+        session_key("u2net", replicas=2),
+        session_key("u2net", replicas=2, threads=1),
+        session_key("u2net", replicas=2, threads=2),
+        session_key("u2net", replicas=2, threads=2, pin=False),
+    }
+
+    assert len(keys) == 4
+    assert session_key("u2net", replicas=2, alpha_matting=True) == session_key(
+        "u2net", replicas=2
+    )
+
+
+def import_profile(script):
+    import subprocess
+    import sys
+
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stderr
+    lines = stderr.splitlines()
+    total = 0.0
+
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+
+        _, cumulative, name = line.split("|")
+
+        # Top level imports, whose cumulative times add up to the whole import time
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            total += int(cumulative) / 1e6
+
+    # The script prints the loaded modules last
+    return set(lines[-1].split()), total
+
+
+def test_cli_startup():
+    # The imports of `rembg i` must stay within this budget, in seconds
+    budget = 1.0
+    modules, total = import_profile(
+        "import sys\n"
+        "from rembg.cli import main\n"
+        "try:\n"
+        "    main(['i', '--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(' '.join(sys.modules), file=sys.stderr)\n"
+    )
+
+    assert "rembg.commands.i_command" in modules
+    assert "rembg.commands.s_command" not in modules
+    assert not modules & {"gradio", "fastapi", "uvicorn", "aiohttp"}
+    assert total < budget, f"`rembg i` imports took {total:.2f}s"
+
+
+def test_command_functions():
+    from rembg.cli import main
+    from rembg.commands import command_functions
+
+    assert [command.name for command in command_functions] == main.list_commands(None)
+
+
+def test_import_rembg():
+    from rembg.sessions import sessions, sessions_names
+
+    # `import rembg` must stay within these budgets, in seconds and modules
+    budget = 1.0
+    max_modules = 500
+    modules, total = import_profile(
+        "import sys\n"
+        "import rembg\n"
+        "print(' '.join(sys.modules), file=sys.stderr)\n"
+    )
+
+    assert not modules & {"pymatting", "numba", "scipy", "jsonschema", "pooch"}
+    assert not {
+        module for module in modules if module.startswith("rembg.sessions.")
+    } - {"rembg.sessions.base", "rembg.sessions.generic", "rembg.sessions.u2net"}
+    assert len(modules) < max_modules, f"`import rembg` loaded {len(modules)} modules"
+    assert total < budget, f"`import rembg` took {total:.2f}s"
+
+    for name in sessions_names:
+        assert sessions[name].name() == name
+
+
+def test_daemon_forwards_requests(tmp_path):
+    import asyncio
+    import os
+    import threading
+
+    from rembg.daemon import DaemonClient, DaemonRunningError, serve
+    from rembg.server import InferenceEngine
+
+    path = str(tmp_path / "daemon.sock")
+    umask = os.umask(0o022)
+    os.umask(umask)
+    image = Path(here / "fixtures" / "car-1.jpg").read_bytes()
+
+    assert DaemonClient.connect(path) is None
+
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(serve(InferenceEngine(models=["u2net"]), path))
+    thread = threading.Thread(
+        target=loop.run_until_complete,
+        args=(asyncio.gather(task, return_exceptions=True),),
+    )
+    thread.start()
+
+    try:
+        client = None
+
+        while client is None and thread.is_alive():
+            client = DaemonClient.connect(path)
+
+        assert client is not None
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        assert os.umask(umask) == umask
+
+        with pytest.raises(DaemonRunningError):
+            asyncio.run(serve(InferenceEngine(models=[]), path))
+
+        with client:
+            actual = [client.remove(image, "u2net", only_mask=True) for _ in range(2)]
+
+            with pytest.raises(RuntimeError):
+                client.remove(image, "u2net", precision="fp64")
+
+        expected = remove(image, session=new_session("u2net"), only_mask=True)
+
+        assert actual == [expected, expected]
+    finally:
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join()
+        loop.close()
+
+    assert not (tmp_path / "daemon.sock").exists()
+
+
+def test_daemon_timeout_falls_back(tmp_path, monkeypatch):
+    import socket
+
+    from click.testing import CliRunner
+
+    from rembg.cli import main
+
+    # Accepts connections but never responds
+    path = str(tmp_path / "daemon.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    monkeypatch.setenv("REMBG_DAEMON_SOCKET", path)
+    monkeypatch.setenv("REMBG_DAEMON_TIMEOUT", "0.5")
+
+    input = tmp_path / "car-1.jpg"
+    input.write_bytes((here / "fixtures" / "car-1.jpg").read_bytes())
+
+    try:
+        result = CliRunner().invoke(
+            main, ["i", "-om", str(input), str(tmp_path / "car-1.png")]
+        )
+    finally:
+        server.close()
+
+    assert result.exit_code == 0, result.output
+    assert "processing locally" in result.output
+    assert (tmp_path / "car-1.png").read_bytes() == remove(
+        input.read_bytes(), session=new_session("u2net"), only_mask=True
+    )
+
+
+def test_remove_iter():
+    from rembg import remove_iter
+
+    session = new_session("u2net")
+    images = [
+        Path(here / "fixtures" / f"{name}.jpg").read_bytes()
+        for name in ["car-1", "cloth-1", "plants-1"]
+    ]
+    expected = [remove(image, session=session, only_mask=True) for image in images]
+
+    assert (
+        list(remove_iter(images, session=session, only_mask=True, workers=2))
+        == expected
+    )
+
+    # The images before an invalid one are yielded before its error is raised
+    results = remove_iter(images[:2] + [b"not an image"] + images[2:], session=session)
+
+    assert [next(results), next(results)] == [
+        remove(image, session=session) for image in images[:2]
+    ]
+
+    with pytest.raises(Exception):
+        next(results)
+
+    # The profiler is only active while the images are processed, and not in
+    # the context of the caller between them
+    from rembg.profiling import Profiler, active_profiler
+
+    profiler = Profiler()
+    results = remove_iter(images, session=session, profiler=profiler)
+
+    for _ in images:
+        next(results)
+
+        assert active_profiler.get() is None
+
+    assert {record["stage"] for record in profiler.records} >= {
+        "decode",
+        "inference",
+        "encode",
+    }
+
+
+def test_p_command_workers(tmp_path):
+    from click.testing import CliRunner
+
+    from rembg.cli import main
+
+    input = tmp_path / "input"
+    input.mkdir()
+
+    for name in ["car-1", "cloth-1", "plants-1"]:
+        (input / f"{name}.jpg").write_bytes(
+            (here / "fixtures" / f"{name}.jpg").read_bytes()
+        )
+
+    (input / "notes.txt").write_text("not an image")
+
+    for workers in [1, 2]:
+        result = CliRunner().invoke(
+            main,
+            ["p", "-om", "-j", str(workers), str(input), str(tmp_path / str(workers))],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "3 processed, 1 skipped, 0 failed" in result.output
+
+    for name in ["car-1", "cloth-1", "plants-1"]:
+        assert (tmp_path / "1" / f"{name}.png").read_bytes() == (
+            tmp_path / "2" / f"{name}.png"
+        ).read_bytes()
+
+
+def test_optimize_command_undo(tmp_path, monkeypatch):
+    from click.testing import CliRunner
+
+    from rembg.cli import main
+
+    monkeypatch.setenv("U2NET_HOME", str(tmp_path))
+    cached = [
+        tmp_path / "u2net.optimized-0123456789ab.onnx",
+        tmp_path / "u2net.int8.optimized-0123456789ab.onnx",
+        tmp_path / "sam_vit_b_01ec64.encoder.optimized-0123456789ab.onnx",
+        tmp_path / "sam_vit_b_01ec64.decoder.quant.optimized-0123456789ab.onnx",
+    ]
+
+    for path in cached:
+        path.write_bytes(b"")
+
+    result = CliRunner().invoke(main, ["optimize", "-u", "-m", "u2net", "-m", "sam"])
+
+    assert result.exit_code == 0, result.output
+    assert not any(path.exists() for path in cached)
+
+
+def test_p_command_workers_without_session(tmp_path, monkeypatch):
+    import multiprocessing
+    import shutil
+
+    from click.testing import CliRunner
+
+    from rembg.cli import main
+    from rembg.commands import p_command
+    from rembg.sessions import sessions
+
+    input = tmp_path / "input"
+    input.mkdir()
+    (input / "car-1.jpg").write_bytes((here / "fixtures" / "car-1.jpg").read_bytes())
+    shutil.copy(sessions["u2net"].download_models(), tmp_path / "u2net.onnx")
+    # No INT8 version of the model to create the sessions with
+    monkeypatch.setenv("U2NET_HOME", str(tmp_path))
+    monkeypatch.setenv("MODEL_CHECKSUM_DISABLED", "1")
+
+    result = CliRunner().invoke(
+        main,
+        [
+            "p",
+            "-j",
+            "2",
+            "-x",
+            '{"precision": "int8"}',
+            str(input),
+            str(tmp_path / "out"),
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert "rembg quantize" in result.output
+
+    # A worker that fails to create its session fails its images
+    monkeypatch.setattr(p_command, "worker_session", None)
+    monkeypatch.setattr(p_command, "worker_error", None)
+    p_command.init_worker(
+        "u2net", 1, multiprocessing.Value("i", 0), {"precision": "int8"}
+    )
+
+    assert p_command.worker_session is None
+    assert (
+        p_command.process_in_worker((str(input / "car-1.jpg"), str(tmp_path), False))[1]
+        == "failed"
+    )